@@ -0,0 +1 @@
+"""Provides benchmarks of the summarization pipeline that run without a GPU or model downloads."""
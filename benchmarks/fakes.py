@@ -0,0 +1,119 @@
+"""Provides a deterministic fake LLM and a local tokenizer for benchmarking the pipeline."""
+import hashlib
+import re
+import threading
+import time
+
+from typing import Any, Iterator
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM as BaseLLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+
+FAKE_VOCABULARY = (
+    'whale', 'ship', 'captain', 'sea', 'voyage', 'crew', 'harpoon', 'ocean', 'storm', 'deck',
+    'sailor', 'chase', 'island', 'port', 'oil', 'mast', 'wind', 'boat', 'hunt', 'leviathan',
+)
+TOKEN_PATTERN = re.compile(r"\s*\w{1,6}|\s*[^\w\s]|\s+")
+
+class FakeSummaryLLM(BaseLLM):
+    """An LLM that answers every prompt with a fixed number of words, after a fixed latency.
+
+    The words are picked from a small vocabulary by hashing the prompt, so the same prompt always
+    gets the same response and different prompts get different ones.
+
+    Attributes:
+        summary_words (int): The number of words in each response.
+        latency (float): The seconds each call takes before it responds.
+    """
+
+    summary_words: int = 200
+    latency: float = 0.0
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _calls: int = PrivateAttr(default=0)
+    _busy_time: float = PrivateAttr(default=0.0)
+    _call_timings: dict = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake_summary'
+
+    def _call(self, prompt: str, stop: list[str]=None, run_manager: CallbackManagerForLLMRun=None, **kwargs: Any) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    def _stream(self, prompt: str, stop: list[str]=None, run_manager: CallbackManagerForLLMRun=None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        start = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        seed = hashlib.sha256(prompt.encode('utf-8')).digest()
+        words = [FAKE_VOCABULARY[seed[i % len(seed)] % len(FAKE_VOCABULARY)] for i in range(self.summary_words)]
+        busy_time = time.perf_counter() - start
+        with self._lock:
+            self._calls += 1
+            self._busy_time += busy_time
+        self._call_timings = {
+            'prompt_tokens': len(TOKEN_PATTERN.findall(prompt)),
+            'generated_tokens': self.summary_words,
+            'prompt_eval_time': 0.0,
+            'generation_time': busy_time,
+        }
+        for i, word in enumerate(words):
+            yield GenerationChunk(text=word if i == 0 else f" {word}")
+
+    def reset_call_timings(self) -> None:
+        """Forgets the timings of the previous call."""
+        self._call_timings = None
+
+    def read_call_timings(self) -> dict:
+        """Gets the token counts and time of the last call.
+
+        Returns:
+            dict: The prompt tokens, tokens generated, and seconds spent on each.
+        """
+        return self._call_timings
+
+    def stats(self) -> dict:
+        """Reports the calls made so far and the time spent inside them.
+
+        Returns:
+            dict: The number of calls, and the seconds spent in them.
+        """
+        with self._lock:
+            return {'calls': self._calls, 'busy_time': self._busy_time}
+
+class RegexTokenizer:
+    """A local tokenizer with the call interface of a fast Huggingface tokenizer, splitting words into pieces of up to 6 characters.
+
+    Attributes:
+        calls (int): The number of texts tokenized.
+        time (float): The seconds spent tokenizing.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.time = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, text: str, add_special_tokens: bool=False, return_attention_mask: bool=False, return_offsets_mapping: bool=False) -> dict:
+        start = time.perf_counter()
+        offsets = [match.span() for match in TOKEN_PATTERN.finditer(text)]
+        encoding = {'input_ids': list(range(len(offsets)))}
+        if return_offsets_mapping:
+            encoding['offset_mapping'] = offsets
+        with self._lock:
+            self.calls += 1
+            self.time += time.perf_counter() - start
+        return encoding
+
+    def tokenize(self, text: str) -> list:
+        """Splits a text into its tokens.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            list: The tokens.
+        """
+        return [text[start:end] for start, end in self(text, return_offsets_mapping=True)['offset_mapping']]
@@ -0,0 +1,294 @@
+"""Benchmarks summarize_document end to end on documents from 1 KB to a full book, with a fake LLM and tokenizer.
+
+Run from the repository root, with a config.yml in place:
+
+    python -m benchmarks.pipeline --json bench_output.txt
+    python -m benchmarks.pipeline --baseline bench_output.txt
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+from tyrell.llm import ChainPool
+from tyrell.llm.budgets import compute_token_budgets, TokenBudgets
+from tyrell.llm.context import PipelineContext
+from tyrell.llm.summarizer import summarize_document, REDUCE_STRATEGIES, REDUCE_RESUMMARIZE, SUMMARY_MODES, SUMMARY_MODE_REFINE
+from tyrell.core.builders import build_summarizer_chains
+from .fakes import FakeSummaryLLM, RegexTokenizer
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'moby10b.txt')
+CASES = (
+    ('1KB', 1024),
+    ('10KB', 10 * 1024),
+    ('100KB', 100 * 1024),
+    ('500KB', 500 * 1024),
+    ('book', None),
+)
+COUNT_METRICS = ('chunks', 'passes', 'llm_calls', 'tokenizer_calls')
+TIME_METRICS = ('chunking_time', 'tokenization_time', 'overhead')
+MEMORY_METRICS = ('peak_memory',)
+MIN_TIME_REGRESSION = 0.005
+MIN_MEMORY_REGRESSION = 1024 * 1024
+STREAM_PIECE_CHARS = 65536
+
+def load_corpus(path: str=CORPUS_PATH) -> str:
+    """Loads the reference corpus.
+
+    Args:
+        path (str): The path to the corpus.
+
+    Returns:
+        str: The corpus text.
+    """
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+def build_document(corpus: str, size: int) -> str:
+    """Cuts a document of about the given size from the start of the corpus, ending on a whole line.
+
+    Args:
+        corpus (str): The corpus text.
+        size (int): The size of the document in characters, or None for the whole corpus.
+
+    Returns:
+        str: The document.
+    """
+    if size is None or size >= len(corpus):
+        return corpus
+    end = corpus.rfind('\n', 0, size)
+    return corpus[:end if end > 0 else size]
+
+def run_case(document: str, args: argparse.Namespace, budgets: TokenBudgets, logger: logging.Logger) -> dict:
+    """Summarizes a document once with fresh fakes and measures the run.
+
+    Args:
+        document (str): The document to summarize.
+        args (argparse.Namespace): The benchmark options.
+        budgets (TokenBudgets): The token budgets to chunk and reduce with.
+        logger (logging.Logger): The logger to pass to the summarizer.
+
+    Returns:
+        dict: The measurements of the run.
+    """
+    tokenizer = RegexTokenizer()
+    llms = [FakeSummaryLLM(summary_words=args.summary_words, latency=args.latency) for _ in range(args.workers)]
+    chains = ChainPool([build_summarizer_chains(llm) for llm in llms], llms)
+
+    stages = {}
+    chunks = []
+    passes = set()
+
+    def on_progress(stage, progress):
+        stages.setdefault(stage, time.perf_counter())
+        if stage == 'chunked':
+            chunks.append(progress['chunks_total'])
+        if 'pass' in progress:
+            passes.add(progress['pass'])
+
+    context = PipelineContext(on_progress=on_progress)
+    start = time.perf_counter()
+    response = summarize_document(
+        iter_pieces(document) if args.stream else document,
+        chains,
+        tokenizer,
+        budgets.max_chunk_token_length(args.mode),
+        budgets.max_final_summary_context_tokens,
+        logger,
+        args.boundary_slack,
+        args.mode,
+        context,
+        args.reduce,
+    )
+    wall_time = time.perf_counter() - start
+
+    inference_time = sum(llm.stats()['busy_time'] for llm in llms)
+    usage = context.usage_report()
+    return {
+        'chunks': chunks[0],
+        'passes': len(passes) or 1,
+        'llm_calls': sum(llm.stats()['calls'] for llm in llms),
+        'llm_calls_by_chain': {name: chain_usage['calls'] for name, chain_usage in usage['chains'].items()},
+        'inference_methods': response.get('inference_methods', ['oneshot']),
+        'chunking_time': stages['chunked'] - stages['chunking'],
+        'tokenization_time': tokenizer.time,
+        'tokenizer_calls': tokenizer.calls,
+        'wall_time': wall_time,
+        'inference_time': inference_time,
+        'overhead': max(wall_time - inference_time / args.workers, 0.0),
+    }
+
+def iter_pieces(document: str):
+    """Feeds a document to the summarizer piece by piece, as an upload being read would.
+
+    Args:
+        document (str): The document.
+
+    Yields:
+        str: The pieces of the document.
+    """
+    for start in range(0, len(document), STREAM_PIECE_CHARS):
+        yield document[start:start + STREAM_PIECE_CHARS]
+
+def measure_peak_memory(document: str, args: argparse.Namespace, budgets: TokenBudgets, logger: logging.Logger) -> int:
+    """Summarizes a document once more under tracemalloc, which is too slow to time runs with.
+
+    Args:
+        document (str): The document to summarize.
+        args (argparse.Namespace): The benchmark options.
+        budgets (TokenBudgets): The token budgets to chunk and reduce with.
+        logger (logging.Logger): The logger to pass to the summarizer.
+
+    Returns:
+        int: The peak bytes allocated by the run.
+    """
+    tracemalloc.start()
+    try:
+        run_case(document, args, budgets, logger)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def run_benchmarks(args: argparse.Namespace) -> dict:
+    """Runs every selected case, keeping the fastest of the repeated runs of each.
+
+    Args:
+        args (argparse.Namespace): The benchmark options.
+
+    Returns:
+        dict: The measurements, keyed by case name.
+    """
+    logger = logging.getLogger('tyrell.benchmarks')
+    logger.setLevel(logging.WARNING)
+    budgets = compute_token_budgets(RegexTokenizer(), args.n_ctx, args.max_response_tokens, logger, args.max_chunk_tokens, args.max_final_tokens)
+    corpus = load_corpus(args.corpus)
+    results = {}
+    for name, size in CASES:
+        if args.cases and name not in args.cases:
+            continue
+        document = build_document(corpus, size)
+        runs = [run_case(document, args, budgets, logger) for _ in range(args.repeat)]
+        result = min(runs, key=lambda run: run['wall_time'])
+        for metric in TIME_METRICS:
+            result[metric] = min(run[metric] for run in runs)
+        result['document_size'] = len(document)
+        if not args.no_memory:
+            result['peak_memory'] = measure_peak_memory(document, args, budgets, logger)
+        results[name] = result
+    return results
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """Compares results with a baseline.
+
+    Counts regress on any increase. Times and memory regress when they grow by more than the
+    tolerance, and by more than a small absolute amount, so that noise on tiny cases is ignored.
+
+    Args:
+        results (dict): The measurements, keyed by case name.
+        baseline (dict): The baseline measurements, keyed by case name.
+        tolerance (float): The allowed relative increase of times and memory.
+
+    Returns:
+        list: A description of each regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in COUNT_METRICS + TIME_METRICS + MEMORY_METRICS:
+            if metric not in result or metric not in previous:
+                continue
+            old, new = previous[metric], result[metric]
+            if metric in COUNT_METRICS:
+                regressed = new > old
+            else:
+                floor = MIN_MEMORY_REGRESSION if metric in MEMORY_METRICS else MIN_TIME_REGRESSION
+                regressed = new > old * (1 + tolerance) and new - old > floor
+            if regressed:
+                regressions.append(f"{name}: {metric} rose from {old} to {new}")
+    return regressions
+
+def format_results(results: dict) -> str:
+    """Formats the measurements as a table.
+
+    Args:
+        results (dict): The measurements, keyed by case name.
+
+    Returns:
+        str: The table.
+    """
+    header = f"{'case':<8}{'size':>10}{'chunks':>8}{'passes':>8}{'calls':>7}{'chunk s':>10}{'tok s':>9}{'tok calls':>11}{'wall s':>9}{'overhead s':>12}{'peak MB':>9}"
+    lines = [header, '-' * len(header)]
+    for name, result in results.items():
+        peak = f"{result['peak_memory'] / (1024 * 1024):.1f}" if 'peak_memory' in result else '-'
+        lines.append(
+            f"{name:<8}{result['document_size']:>10}{result['chunks']:>8}{result['passes']:>8}{result['llm_calls']:>7}"
+            f"{result['chunking_time']:>10.4f}{result['tokenization_time']:>9.4f}{result['tokenizer_calls']:>11}"
+            f"{result['wall_time']:>9.3f}{result['overhead']:>12.4f}{peak:>9}"
+        )
+    return "\n".join(lines)
+
+def parse_args(argv: list) -> argparse.Namespace:
+    """Parses the benchmark options.
+
+    Args:
+        argv (list): The command line arguments.
+
+    Returns:
+        argparse.Namespace: The options.
+    """
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.pipeline', description=__doc__.splitlines()[0])
+    parser.add_argument('--case', dest='cases', action='append', choices=[name for name, _ in CASES], help='A case to run, all by default. May be repeated.')
+    parser.add_argument('--corpus', default=CORPUS_PATH, help='The reference corpus.')
+    parser.add_argument('--mode', default=SUMMARY_MODE_REFINE, choices=SUMMARY_MODES)
+    parser.add_argument('--reduce', default=REDUCE_RESUMMARIZE, choices=REDUCE_STRATEGIES)
+    parser.add_argument('--stream', action='store_true', help='Feed documents to the summarizer piece by piece, chunking them incrementally.')
+    parser.add_argument('--workers', type=int, default=1, help='The number of fake LLM workers.')
+    parser.add_argument('--latency', type=float, default=0.0, help='The seconds each fake LLM call takes.')
+    parser.add_argument('--summary-words', type=int, default=200, help='The number of words in each fake summary.')
+    parser.add_argument('--n-ctx', type=int, default=8192, help='The context of the fake model, which the token budgets are derived from.')
+    parser.add_argument('--max-response-tokens', type=int, default=2048, help='The response tokens reserved in each prompt.')
+    parser.add_argument('--max-chunk-tokens', type=int, help='A cap on the derived chunk budget.')
+    parser.add_argument('--max-final-tokens', type=int, help='A cap on the derived final summary context budget.')
+    parser.add_argument('--boundary-slack', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=3, help='The number of timed runs of each case.')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory run.')
+    parser.add_argument('--json', help='A file to write the measurements to.')
+    parser.add_argument('--baseline', help='A file of earlier measurements to compare with.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='The allowed relative increase of times and memory over the baseline.')
+    return parser.parse_args(argv)
+
+def main(argv: list=None) -> int:
+    """Runs the benchmarks, exiting non-zero if they regress from the baseline.
+
+    Args:
+        argv (list): The command line arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    results = run_benchmarks(args)
+    print(format_results(results))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,7 +3,7 @@ from langchain_community.llms import LlamaCpp
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 
-from tyrell.llm import get_summarize_oneshot, get_summarize_chunk, get_summarize_final, get_compress_result
+from tyrell.llm import get_summarize_oneshot, get_summarize_chunk, get_summarize_final, get_summarize_packed, get_compress_result
 
 def build_summarizer_chains(llm: LlamaCpp) -> list[LLMChain]:
     """Builds the LLM chains from the LLM.
@@ -23,7 +23,7 @@ def build_summarizer_chains(llm: LlamaCpp) -> list[LLMChain]:
     chains['summarize_oneshot'] = oneshot_prompt | llm
 
     chunk_prompt = PromptTemplate(
-        input_variables=["date", "chunk", "prev_summary", "cur_chunk_no", "total_chunk_no"],
+        input_variables=["date", "chunk", "prior_summary", "cur_chunk_no", "total_chunk_no"],
         template=get_summarize_chunk(),
     )
     chains['summarize_chunk'] = chunk_prompt | llm
@@ -40,4 +40,10 @@ def build_summarizer_chains(llm: LlamaCpp) -> list[LLMChain]:
     )
     chains['summarize_final'] = final_prompt | llm
 
+    packed_prompt = PromptTemplate(
+        input_variables=["date", "num_documents", "documents"],
+        template=get_summarize_packed(),
+    )
+    chains['summarize_packed'] = packed_prompt | llm
+
     return chains
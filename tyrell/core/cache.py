@@ -0,0 +1,136 @@
+"""Provides a persistent, size-bounded cache of summarization responses."""
+import json
+import sqlite3
+import threading
+
+from os import makedirs
+from os.path import dirname
+
+from .time import cur_timestamp
+
+class SummaryCache:
+    """Stores responses keyed by content hash, evicting the least recently used once over its size limit.
+
+    Args:
+        filepath (str): The path of the SQLite database backing the cache.
+        max_bytes (int): The maximum total size of the cached responses.
+
+    Attributes:
+        filepath (str): The path of the SQLite database backing the cache.
+        hits (int): The number of lookups that found a response since the cache was opened.
+        max_bytes (int): The maximum total size of the cached responses.
+        misses (int): The number of lookups that found nothing since the cache was opened.
+    """
+
+    TABLE = 'summaries'
+
+    def __init__(self, filepath: str, max_bytes: int) -> None:
+        self.filepath = filepath
+        self.hits = 0
+        self.max_bytes = max_bytes
+        self.misses = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict:
+        """Looks up a response, marking it as recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict: The cached response, or None if there is none.
+        """
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                f"SELECT response FROM {self.TABLE} WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            connection.execute(
+                f"UPDATE {self.TABLE} SET accessed_at = ? WHERE key = ?",
+                (cur_timestamp(), key)
+            )
+            connection.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, response: dict) -> None:
+        """Stores a response, evicting the least recently used responses if the cache grows too large.
+
+        Args:
+            key (str): The cache key.
+            response (dict): The response to store.
+        """
+        encoded = json.dumps(response)
+        now = cur_timestamp()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                f"INSERT OR REPLACE INTO {self.TABLE} (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded), now, now)
+            )
+            self._evict(connection)
+            connection.commit()
+
+    def stats(self) -> dict:
+        """Reports the cache counters.
+
+        Returns:
+            dict: The hit and miss counts.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the database on first use, creating it if needed.
+
+        Returns:
+            sqlite3.Connection: The database connection.
+        """
+        if self._connection is None:
+            makedirs(dirname(self.filepath), exist_ok=True)
+            self._connection = sqlite3.connect(self.filepath, check_same_thread=False)
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.TABLE}_accessed_at ON {self.TABLE} (accessed_at)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """Deletes the least recently used responses until the cache is within its size limit.
+
+        Args:
+            connection (sqlite3.Connection): The database connection.
+        """
+        total_size = connection.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.TABLE}").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        rows = connection.execute(f"SELECT key, size FROM {self.TABLE} ORDER BY accessed_at ASC")
+        evicted = []
+        for key, size in rows:
+            if total_size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total_size -= size
+        connection.executemany(f"DELETE FROM {self.TABLE} WHERE key = ?", evicted)
+
+class ChunkCache(SummaryCache):
+    """Stores the responses of individual LLM calls, keyed by chain, prompt inputs and model config.
+
+    Args:
+        filepath (str): The path of the SQLite database backing the cache.
+        max_bytes (int): The maximum total size of the cached responses.
+    """
+
+    TABLE = 'chunks'
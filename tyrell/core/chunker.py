@@ -1,41 +1,345 @@
-def chunk_document(tokenizer, document: str, max_token_length: int) -> list:
+"""Provides functions to split documents into chunks that fit the LLM context."""
+DEFAULT_BOUNDARY_SLACK_TOKENS = 256
+DEFAULT_WINDOW_CHARS = 65536
+BOUNDARY_CONTEXT_CHARS = 16
+SENTENCE_TERMINATORS = ('.', '!', '?', '."', '!"', '?"', ".'", "!'", "?'", '.)', '!)', '?)')
+
+BOUNDARY_NONE = 0
+BOUNDARY_WORD = 1
+BOUNDARY_SENTENCE = 2
+BOUNDARY_PARAGRAPH = 3
+
+class TokenizedText:
+    """
+    A text along with the character span of each of its tokens, so that it is only tokenized once.
+
+    Parameters:
+        text (str): The text.
+        offsets (list): The (start, end) character offsets of each token in the text.
+    """
+
+    def __init__(self, text: str, offsets: list) -> None:
+        self.offsets = offsets
+        self.text = text
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __str__(self) -> str:
+        return self.text
+
+def tokenize_text(tokenizer, text: str) -> TokenizedText:
+    """
+    Tokenizes a text, keeping the token offsets alongside it.
+
+    Parameters:
+        tokenizer (PreTrainedTokenizerFast): The tokenizer to use.
+        text (str): The text to tokenize.
+
+    Returns:
+        TokenizedText: The tokenized text.
+    """
+    return TokenizedText(text, tokenize_offsets(tokenizer, text))
+
+def join_tokenized(tokenizer, texts: list, separator: str) -> TokenizedText:
+    """
+    Joins tokenized texts, reusing their token offsets rather than tokenizing the result again.
+
+    Only the separator is tokenized. Tokens are not merged across the joins, so the token count
+    may differ slightly from that of tokenizing the joined text directly.
+
+    Parameters:
+        tokenizer (PreTrainedTokenizerFast): The tokenizer to tokenize the separator with.
+        texts (list): The tokenized texts.
+        separator (str): The separator to join them with.
+
+    Returns:
+        TokenizedText: The joined text.
+    """
+    separator_offsets = tokenize_offsets(tokenizer, separator) if separator else []
+    parts, offsets, position = [], [], 0
+    for i, text in enumerate(texts):
+        if i > 0:
+            parts.append(separator)
+            offsets.extend((start + position, end + position) for start, end in separator_offsets)
+            position += len(separator)
+        parts.append(text.text)
+        offsets.extend((start + position, end + position) for start, end in text.offsets)
+        position += len(text.text)
+    return TokenizedText("".join(parts), offsets)
+
+def count_tokens(texts: list) -> int:
+    """
+    Counts the tokens of tokenized texts.
+
+    Parameters:
+        texts (list): The tokenized texts.
+
+    Returns:
+        int: The total number of tokens.
+    """
+    return sum(len(text) for text in texts)
+
+def truncate_tokenized(text: TokenizedText, max_tokens: int) -> TokenizedText:
+    """
+    Truncates a tokenized text to at most a number of tokens.
+
+    Parameters:
+        text (TokenizedText): The tokenized text.
+        max_tokens (int): The maximum number of tokens to keep.
+
+    Returns:
+        TokenizedText: The text itself if it fits, otherwise its first max_tokens tokens.
+    """
+    if len(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return TokenizedText("", [])
+    return TokenizedText(text.text[:text.offsets[max_tokens - 1][1]], text.offsets[:max_tokens])
+
+def chunk_document(tokenizer, document: str, max_token_length: int, boundary_slack: int=DEFAULT_BOUNDARY_SLACK_TOKENS) -> list:
     """
     Splits a document into chunks where each chunk does not exceed the max token length.
 
+    Chunks are sized by token count and sliced from the original text, preferring to end on a
+    paragraph or sentence boundary within boundary_slack tokens of the ideal chunk end.
+
     Parameters:
+        tokenizer (PreTrainedTokenizerFast): The tokenizer to count tokens with.
         document (str): The input document as a string.
         max_token_length (int): The maximum token length for each chunk.
-        model_file (str): The path to the SentencePiece model file (.gguf).
+        boundary_slack (int): The number of tokens either side of the ideal chunk end to search for a boundary.
 
     Returns:
         list: A list of document chunks as strings.
     """
-    # Tokenize the document using SentencePiece
-    tokens = tokenizer.tokenize(document)
-    num_tokens = len(tokens)
+    if not document.strip():
+        return []
+    return chunk_tokenized(tokenize_text(tokenizer, document), max_token_length, boundary_slack)
 
-    optimal_token_length = find_nearest_equal_token_size(num_tokens, max_token_length)
+def iter_chunks(tokenizer, texts, max_token_length: int, boundary_slack: int=DEFAULT_BOUNDARY_SLACK_TOKENS, window_chars: int=DEFAULT_WINDOW_CHARS):
+    """
+    Splits a document read piece by piece into chunks, yielding each chunk as soon as it is known.
 
-    chunks = []
-    current_chunk = []
-    current_length = 0
+    The text is tokenized a window of about window_chars characters at a time, cut after the last
+    newline or space of the window. Once the tokenized text holds more than two chunks' worth of
+    tokens, the first chunk is cut at the strongest boundary within boundary_slack tokens before
+    its end. The remaining tail is split into chunks of equal length as chunk_offsets does. Only
+    one chunk of lookahead and one window are held, rather than the tokens of the whole document.
+
+    Tokens are not merged across the window cuts, so the token count may differ slightly from
+    that of tokenizing the whole document at once.
+
+    Parameters:
+        tokenizer (PreTrainedTokenizerFast): The tokenizer to count tokens with.
+        texts (Iterable): The pieces of the document, as strings.
+        max_token_length (int): The maximum token length for each chunk.
+        boundary_slack (int): The number of tokens before the end of a chunk to search for a boundary.
+        window_chars (int): The number of characters to tokenize at a time.
+
+    Yields:
+        str: The document chunks.
+    """
+    text, offsets, tokenized_chars = "", [], 0
+    for piece in texts:
+        text += piece
+        while len(text) - tokenized_chars >= window_chars:
+            window_end = find_window_end(text, tokenized_chars, window_chars)
+            if window_end is None:
+                break
+            offsets.extend(shift_offsets(tokenize_offsets(tokenizer, text[tokenized_chars:window_end]), tokenized_chars))
+            tokenized_chars = window_end
+            start_token, start_char = 0, 0
+            while len(offsets) - start_token > 2 * max_token_length:
+                end_token = find_chunk_boundary(
+                    text,
+                    offsets,
+                    start_token + max_token_length,
+                    start_token + 1,
+                    start_token + max_token_length,
+                    boundary_slack
+                )
+                end_char = offsets[end_token][0]
+                chunk = text[start_char:end_char].strip()
+                if chunk:
+                    yield chunk
+                start_token, start_char = end_token, end_char
+            if start_token:
+                text, offsets = text[start_char:], shift_offsets(offsets[start_token:], -start_char)
+                tokenized_chars -= start_char
+
+    if tokenized_chars < len(text):
+        offsets.extend(shift_offsets(tokenize_offsets(tokenizer, text[tokenized_chars:]), tokenized_chars))
+    if text.strip():
+        yield from chunk_offsets(text, offsets, max_token_length, boundary_slack)
+
+def find_window_end(text: str, start: int, window_chars: int) -> int:
+    """
+    Finds where to cut the next window of text to tokenize, after its last newline or space.
+
+    Parameters:
+        text (str): The buffered text.
+        start (int): The index of the first character not yet tokenized.
+        window_chars (int): The number of characters to tokenize at a time.
+
+    Returns:
+        int: The index to cut the window at, or None to wait for more text. Text without any
+            newline or space is cut at its end once it grows to four windows.
+    """
+    newline = text.rfind('\n', start)
+    if newline >= start:
+        return newline + 1
+    space = text.rfind(' ', start)
+    if space > start:
+        return space
+    if len(text) - start >= 4 * window_chars:
+        return len(text)
+    return None
+
+def shift_offsets(offsets: list, shift: int) -> list:
+    """
+    Shifts token offsets by a number of characters.
 
-    for i, token in enumerate(tokens):
-        # If adding the current token would exceed the optimal token length, start a new chunk
-        if current_length + len(token) > optimal_token_length:
-            chunks.append(tidy_sentencepiece_output(''.join(current_chunk)))
-            current_chunk = []
-            current_length = 0
+    Parameters:
+        offsets (list): The (start, end) character offsets of each token.
+        shift (int): The number of characters to shift them by.
+
+    Returns:
+        list: The shifted offsets.
+    """
+    return [(start + shift, end + shift) for start, end in offsets]
+
+def chunk_tokenized(document: TokenizedText, max_token_length: int, boundary_slack: int=DEFAULT_BOUNDARY_SLACK_TOKENS) -> list:
+    """
+    Splits an already tokenized document into chunks where each chunk does not exceed the max token length.
+
+    Parameters:
+        document (TokenizedText): The tokenized document.
+        max_token_length (int): The maximum token length for each chunk.
+        boundary_slack (int): The number of tokens either side of the ideal chunk end to search for a boundary.
+
+    Returns:
+        list: A list of document chunks as strings.
+    """
+    if not document.text.strip():
+        return []
+    return chunk_offsets(document.text, document.offsets, max_token_length, boundary_slack)
+
+def tokenize_offsets(tokenizer, text: str) -> list:
+    """
+    Tokenizes a text, returning the character span of each token.
 
-        current_chunk.append(token)
-        current_length += len(token)
+    Parameters:
+        tokenizer (PreTrainedTokenizerFast): The tokenizer to use.
+        text (str): The text to tokenize.
+
+    Returns:
+        list: The (start, end) character offsets of each token in the text.
+    """
+    encoding = tokenizer(
+        text,
+        add_special_tokens=False,
+        return_attention_mask=False,
+        return_offsets_mapping=True
+    )
+    return encoding['offset_mapping']
+
+def chunk_offsets(document: str, offsets: list, max_token_length: int, boundary_slack: int=DEFAULT_BOUNDARY_SLACK_TOKENS) -> list:
+    """
+    Splits a tokenized document into chunks where each chunk does not exceed the max token length.
+
+    Parameters:
+        document (str): The input document as a string.
+        offsets (list): The (start, end) character offsets of each token in the document.
+        max_token_length (int): The maximum token length for each chunk.
+        boundary_slack (int): The number of tokens either side of the ideal chunk end to search for a boundary.
+
+    Returns:
+        list: A list of document chunks as strings.
+    """
+    num_tokens = len(offsets)
+    if num_tokens == 0:
+        return []
 
-        # If this is the last token, add the current chunk
-        if i == num_tokens - 1:
-            chunks.append(tidy_sentencepiece_output(''.join(current_chunk)))
+    chunks = []
+    start_token = 0
+    start_char = 0
+    while num_tokens - start_token > max_token_length:
+        optimal_token_length = find_nearest_equal_token_size(num_tokens - start_token, max_token_length)
+        end_token = find_chunk_boundary(
+            document,
+            offsets,
+            start_token + optimal_token_length,
+            start_token + 1,
+            start_token + max_token_length,
+            boundary_slack
+        )
+        end_char = offsets[end_token][0]
+        append_chunk(chunks, document[start_char:end_char])
+        start_token, start_char = end_token, end_char
+    append_chunk(chunks, document[start_char:])
 
     return chunks
 
+def find_chunk_boundary(document: str, offsets: list, ideal_token: int, min_token: int, max_token: int, boundary_slack: int) -> int:
+    """
+    Finds the token a chunk should end before, snapping to the strongest nearby text boundary.
+
+    Parameters:
+        document (str): The input document as a string.
+        offsets (list): The (start, end) character offsets of each token in the document.
+        ideal_token (int): The index of the token the chunk would ideally end before.
+        min_token (int): The lowest index the chunk may end before.
+        max_token (int): The highest index the chunk may end before.
+        boundary_slack (int): The number of tokens either side of the ideal token to search.
+
+    Returns:
+        int: The index of the first token of the next chunk.
+    """
+    best_token, best_score, best_distance = ideal_token, BOUNDARY_NONE, 0
+    for token in range(max(min_token, ideal_token - boundary_slack), min(max_token, ideal_token + boundary_slack) + 1):
+        score = boundary_score(document, offsets[token][0])
+        distance = abs(token - ideal_token)
+        if score > best_score or (score == best_score and score > BOUNDARY_NONE and distance < best_distance):
+            best_token, best_score, best_distance = token, score, distance
+    return best_token
+
+def boundary_score(document: str, char_index: int) -> int:
+    """
+    Scores how natural a place to split the document a character index is.
+
+    Parameters:
+        document (str): The input document as a string.
+        char_index (int): The character index to split at.
+
+    Returns:
+        int: One of the BOUNDARY_* scores, higher is better.
+    """
+    before = document[max(0, char_index - BOUNDARY_CONTEXT_CHARS):char_index]
+    after = document[char_index:char_index + BOUNDARY_CONTEXT_CHARS]
+    text_before = before.rstrip()
+    gap = before[len(text_before):] + after[:len(after) - len(after.lstrip())]
+
+    if not gap:
+        return BOUNDARY_NONE
+    if gap.count('\n') >= 2:
+        return BOUNDARY_PARAGRAPH
+    if text_before.endswith(SENTENCE_TERMINATORS):
+        return BOUNDARY_SENTENCE
+    return BOUNDARY_WORD
+
+def append_chunk(chunks: list, chunk: str) -> None:
+    """
+    Appends a chunk to the list of chunks, skipping chunks that are only whitespace.
+
+    Parameters:
+        chunks (list): The list of chunks.
+        chunk (str): The chunk to append.
+    """
+    chunk = chunk.strip()
+    if chunk:
+        chunks.append(chunk)
+
 def find_nearest_equal_token_size(num_tokens: int, max_token_length: int) -> int:
     """
     This function finds the optimal number of tokens that will produce equal length chunks.
@@ -53,15 +357,3 @@ def find_nearest_equal_token_size(num_tokens: int, max_token_length: int) -> int
     # Calculate the number of chunks needed
     num_chunks = (num_tokens + max_token_length - 1) // max_token_length
     return num_tokens // num_chunks
-    
-def tidy_sentencepiece_output(output: str) -> str:
-    """
-    Cleans up the output of SentencePiece tokenization.
-
-    Parameters:
-        output (str): The SentencePiece tokenization output.
-
-    Returns:
-        str: The cleaned up output.
-    """
-    return output.replace('▁', ' ').replace('<0x0A>', '\n')
@@ -1,23 +1,119 @@
 """Provides access to the configuration file and its contents."""
 from os.path import join as path_join
 
-from .yaml import load_yaml
+from .settings import get_settings
 
-def get_config_as_dict() -> dict:
-    """Gets the configuration file as a dictionary.
+def get_api_llm_config() -> dict:
+    """Gets the LLM configuration from the configuration file.
 
     Returns:
-        dict: The configuration file as a dictionary.
+        dict: The LLM configuration.
     """
-    return load_yaml("config.yml")
+    return get_settings().api.llm.model.as_dict()
 
-def get_api_llm_config() -> dict:
-    """Gets the LLM configuration from the configuration file.
+def get_api_llm_idle_timeout() -> int:
+    """Gets the number of idle seconds before the resident LLM is evicted from the configuration file.
 
     Returns:
-        dict: The LLM configuration.
+        int: The idle timeout in seconds, 0 if the LLM should never be evicted.
+    """
+    return get_settings().api.llm.idle_timeout
+
+def get_api_llm_workers() -> int:
+    """Gets the number of resident LLM workers from the configuration file.
+
+    Returns:
+        int: The number of LLM workers.
+    """
+    return get_settings().api.llm.workers
+
+def get_api_llm_prefix_cache() -> bool:
+    """Gets whether to reuse the evaluated prefix of each prompt template from the configuration file.
+
+    Returns:
+        bool: Whether the prefix cache is enabled.
+    """
+    return get_settings().api.llm.prefix_cache
+
+def get_summarizer_mode() -> str:
+    """Gets the chunk summarization mode from the configuration file.
+
+    Returns:
+        str: The chunk summarization mode.
+    """
+    return get_settings().api.summarizer.mode
+
+def get_summarizer_reduce() -> str:
+    """Gets the strategy for reducing oversized chunk summaries from the configuration file.
+
+    Returns:
+        str: The reduce strategy.
+    """
+    return get_settings().api.summarizer.reduce
+
+def get_summarizer_tree_fan_in() -> int:
+    """Gets the maximum number of summaries merged by each call of the tree reduce strategy from the configuration file.
+
+    Returns:
+        int: The tree fan-in.
+    """
+    return get_settings().api.summarizer.tree_fan_in
+
+def get_summarizer_tree_max_depth() -> int:
+    """Gets the maximum number of levels of the tree reduce strategy from the configuration file.
+
+    Returns:
+        int: The maximum tree depth.
+    """
+    return get_settings().api.summarizer.tree_max_depth
+
+def get_job_queue_max_depth() -> int:
+    """Gets the maximum number of jobs waiting to run from the configuration file.
+
+    Returns:
+        int: The maximum job queue depth.
+    """
+    return get_settings().api.jobs.max_queue_depth
+
+def get_job_retention() -> int:
+    """Gets the number of seconds finished jobs are kept from the configuration file.
+
+    Returns:
+        int: The job retention in seconds.
+    """
+    return get_settings().api.jobs.retention
+
+def get_api_request_timeout() -> int:
+    """Gets the default number of seconds a summarize request may run before it is cancelled from the configuration file.
+
+    Returns:
+        int: The request timeout in seconds, or 0 for no timeout.
+    """
+    return get_settings().api.request_timeout
+
+def get_batch_max_documents() -> int:
+    """Gets the maximum number of documents in a batch request from the configuration file.
+
+    Returns:
+        int: The maximum number of documents in a batch.
     """
-    return get_config_as_dict()['api']['llm']['model']
+    return get_settings().api.batch.max_documents
+
+def get_batch_max_pack_documents() -> int:
+    """Gets the maximum number of short documents summarized together in one LLM call from the configuration file.
+
+    Returns:
+        int: The maximum number of documents in a pack.
+    """
+    return get_settings().api.batch.max_pack_documents
+
+def get_batch_pack_max_tokens() -> int:
+    """Gets the maximum total token length of a pack of short documents from the configuration file.
+
+    Returns:
+        int: The maximum token length of a pack.
+    """
+    return get_settings().api.batch.pack_max_tokens
 
 def get_client_user_agent() -> str:
     """Gets the HTTP user agent from the configuration file.
@@ -25,7 +121,15 @@ def get_client_user_agent() -> str:
     Returns:
         str: The HTTP user agent.
     """
-    return get_config_as_dict()['client']['user_agent']
+    return get_settings().client.user_agent
+
+def get_api_max_document_bytes() -> int:
+    """Gets the maximum size of an uploaded document, once decompressed, from the configuration file.
+
+    Returns:
+        int: The maximum size of a document, in bytes.
+    """
+    return get_settings().api.max_document_bytes
 
 def get_data_dir() -> str:
     """Gets the data directory from the configuration file.
@@ -33,7 +137,7 @@ def get_data_dir() -> str:
     Returns:
         str: The data directory.
     """
-    return get_config_as_dict()['api']['data_dir']
+    return get_settings().api.data_dir
 
 def get_api_port() -> int:
     """Gets the API port from the configuration file.
@@ -41,7 +145,7 @@ def get_api_port() -> int:
     Returns:
         int: The API port.
     """
-    return int(get_config_as_dict()['api']['port'])
+    return get_settings().api.port
 
 def get_api_host() -> str:
     """Gets the API hostname from the configuration file.
@@ -49,7 +153,7 @@ def get_api_host() -> str:
     Returns:
         str: The API host.
     """
-    return get_config_as_dict()['api']['host']
+    return get_settings().api.host
 
 def get_gpu_lockfile() -> str:
     """Gets the GPU lockfile from the configuration file.
@@ -58,24 +162,153 @@ def get_gpu_lockfile() -> str:
         str: The GPU lockfile.
     """
     data_dir = get_data_dir()
-    lockfile = get_config_as_dict()['api']['gpu_lock_file']
+    lockfile = get_settings().api.gpu_lock_file
     return path_join(data_dir, lockfile)
 
+def get_scheduler_slots() -> list:
+    """Gets the GPU/CPU slots of the scheduler from the configuration file.
+
+    If no slots are configured, a single slot using the GPU lockfile is returned.
+
+    Returns:
+        list: The slots, as (name, lockfile path) tuples. The lockfile path is None for in-process only slots.
+    """
+    slots = get_settings().api.scheduler.slots
+    if not slots:
+        return [('gpu', get_gpu_lockfile())]
+    data_dir = get_data_dir()
+    return [
+        (slot.name, path_join(data_dir, slot.lock_file) if slot.lock_file else None)
+        for slot in slots
+    ]
+
+def get_scheduler_max_queue_depth() -> int:
+    """Gets the maximum number of requests waiting for a slot from the configuration file.
+
+    Returns:
+        int: The maximum scheduler queue depth.
+    """
+    return get_settings().api.scheduler.max_queue_depth
+
+def get_scheduler_interactive_max_chars() -> int:
+    """Gets the longest document, in characters, scheduled as interactive by default from the configuration file.
+
+    Returns:
+        int: The interactive document length limit.
+    """
+    return get_settings().api.scheduler.interactive_max_chars
+
+def get_scheduler_min_retry_after() -> int:
+    """Gets the smallest retry hint, in seconds, given to rejected requests from the configuration file.
+
+    Returns:
+        int: The minimum retry hint in seconds.
+    """
+    return get_settings().api.scheduler.min_retry_after
+
+def get_summary_cache_enabled() -> bool:
+    """Gets whether summaries are cached from the configuration file.
+
+    Returns:
+        bool: Whether summaries are cached.
+    """
+    return get_settings().api.cache.enabled
+
+def get_summary_cache_filepath() -> str:
+    """Gets the path of the summary cache database.
+
+    Returns:
+        str: The summary cache database path.
+    """
+    return path_join(get_data_dir(), 'tyrell_cache', 'summaries.sqlite3')
+
+def get_response_store_filepath() -> str:
+    """Gets the path of the response store database.
+
+    Returns:
+        str: The response store database path.
+    """
+    return path_join(get_data_dir(), 'tyrell_responses', 'responses.sqlite3')
+
+def get_response_retention() -> int:
+    """Gets the number of seconds to keep stored responses from the configuration file.
+
+    Returns:
+        int: The response retention in seconds, or 0 to keep responses until the store is full.
+    """
+    return get_settings().api.responses.retention
+
+def get_response_max_bytes() -> int:
+    """Gets the maximum total size of stored responses from the configuration file.
+
+    Returns:
+        int: The maximum total size of stored responses, in bytes.
+    """
+    return get_settings().api.responses.max_bytes
+
+def get_response_compress() -> bool:
+    """Gets whether to compress stored responses from the configuration file.
+
+    Returns:
+        bool: Whether to compress stored responses.
+    """
+    return get_settings().api.responses.compress
+
+def get_summary_cache_max_bytes() -> int:
+    """Gets the maximum total size of cached summaries from the configuration file.
+
+    Returns:
+        int: The maximum summary cache size in bytes.
+    """
+    return get_settings().api.cache.max_bytes
+
+def get_chunk_cache_enabled() -> bool:
+    """Gets whether individual LLM call responses are cached from the configuration file.
+
+    Returns:
+        bool: Whether LLM call responses are cached.
+    """
+    return get_settings().api.cache.chunks_enabled
+
+def get_chunk_cache_filepath() -> str:
+    """Gets the path of the chunk cache database.
+
+    Returns:
+        str: The chunk cache database path.
+    """
+    return path_join(get_data_dir(), 'tyrell_cache', 'chunks.sqlite3')
+
+def get_chunk_cache_max_bytes() -> int:
+    """Gets the maximum total size of cached LLM call responses from the configuration file.
+
+    Returns:
+        int: The maximum chunk cache size in bytes.
+    """
+    return get_settings().api.cache.chunks_max_bytes
+
 def get_max_chunk_token_length() -> int:
-    """Gets the maximum number of inference chunks from the configuration file.
+    """Gets the configured cap on the token length of a chunk from the configuration file.
 
     Returns:
-        int: The maximum number of inference chunks.
+        int: The maximum chunk token length, or None to derive it from the model context.
     """
-    return int(get_config_as_dict()['api']['chunker']['max_chunk_token_length'])
+    return get_settings().api.chunker.max_chunk_token_length
+
+def get_chunk_boundary_slack_tokens() -> int:
+    """Gets the number of tokens around a chunk end to search for a paragraph or sentence boundary.
+
+    Returns:
+        int: The chunk boundary slack in tokens.
+    """
+    return get_settings().api.chunker.boundary_slack_tokens
 
 def get_max_final_summary_context_tokens() -> int:
-    """Gets the maximum number of final summary context tokens from the configuration file.
+    """Gets the configured cap on the final summary context tokens from the configuration file.
 
     Returns:
-        int: The maximum number of final summary context tokens.
+        int: The maximum number of final summary context tokens, or None to derive it from the model context.
     """
-    return int(get_config_as_dict()['api']['max_final_summary_context_tokens'])
+    return get_settings().api.max_final_summary_context_tokens
 
 def get_client_uri() -> str:
     """Gets the client URI from the configuration file.
@@ -83,7 +316,7 @@ def get_client_uri() -> str:
     Returns:
         str: The client URI.
     """
-    return get_config_as_dict()['client']['uri']
+    return get_settings().client.uri
 
 def get_client_timeout() -> int:
     """Gets the client timeout from the configuration file.
@@ -91,7 +324,15 @@ def get_client_timeout() -> int:
     Returns:
         int: The client timeout.
     """
-    return int(get_config_as_dict()['client']['timeout'])
+    return get_settings().client.timeout
+
+def get_client_compression() -> str:
+    """Gets the compression of document uploads from the configuration file.
+
+    Returns:
+        str: The compression, one of 'none', 'gzip' or 'zstd'.
+    """
+    return get_settings().client.compression
 
 def get_client_keypair() -> tuple:
     """Gets the client keypair from the configuration file.
@@ -99,7 +340,8 @@ def get_client_keypair() -> tuple:
     Returns:
         tuple: The client keypair.
     """
-    return get_config_as_dict()['client']['pub_key'], get_config_as_dict()['client']['priv_key']
+    client = get_settings().client
+    return client.pub_key, client.priv_key
 
 def get_api_path() -> str:
     """Gets the API path from the configuration file.
@@ -107,4 +349,4 @@ def get_api_path() -> str:
     Returns:
         str: The API path.
     """
-    return get_config_as_dict()['api']['path']
+    return get_settings().api.path
@@ -0,0 +1,25 @@
+"""Provides stable hashing of documents and configuration."""
+import hashlib
+import json
+
+def hash_text(text: str) -> str:
+    """Hashes a string.
+
+    Args:
+        text (str): The string to hash.
+
+    Returns:
+        str: The SHA-256 hex digest of the string.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def hash_dict(data: dict) -> str:
+    """Hashes a dictionary independently of its key order.
+
+    Args:
+        data (dict): The dictionary to hash.
+
+    Returns:
+        str: The SHA-256 hex digest of the dictionary.
+    """
+    return hash_text(json.dumps(data, sort_keys=True, default=str))
@@ -0,0 +1,267 @@
+"""Provides the typed, immutable application settings parsed from the configuration file."""
+import signal
+import threading
+
+from dataclasses import dataclass, fields, is_dataclass, MISSING
+from types import MappingProxyType
+from typing import Callable, get_args, get_origin
+
+from .chunker import DEFAULT_BOUNDARY_SLACK_TOKENS
+from .logger import get_logger
+from .yaml import load_yaml
+
+CONFIG_FILEPATH = "config.yml"
+
+@dataclass(frozen=True)
+class LlmModelSettings:
+    """The settings used to build the LLM.
+
+    The llama.cpp settings (repo to n_threads) only apply to the 'llama' type, and the endpoint
+    settings (endpoints to extra_body) only to the 'remote' type.
+    """
+    type: str
+    tokenizer_repo: str
+    max_response_tokens: int
+    repeat_penalty: float
+    temperature: float
+    top_k: int
+    min_p: float
+    top_p: float
+    repo: str = None
+    filename: str = None
+    n_batch: int = 512
+    n_ctx: int = 4096
+    rope_freq_base: float = 0.0
+    rope_freq_scale: float = 1.0
+    n_gpu_layers: int = 0
+    verbose: bool = False
+    n_threads: int = None
+    n_parallel: int = 1
+    endpoints: tuple[str, ...] = ()
+    model_name: str = None
+    api_key: str = None
+    max_connections: int = 8
+    request_timeout: int = 600
+    extra_body: MappingProxyType = None
+
+    def as_dict(self) -> dict:
+        """Gets the settings as a dictionary, with mutable copies of its lists and mappings.
+
+        Returns:
+            dict: The settings.
+        """
+        return {field.name: _thaw(getattr(self, field.name)) for field in fields(self)}
+
+@dataclass(frozen=True)
+class LlmSettings:
+    """The settings for the LLM and its residency."""
+    model: LlmModelSettings
+    idle_timeout: int = 0
+    workers: int = 1
+    prefix_cache: bool = True
+
+@dataclass(frozen=True)
+class ChunkerSettings:
+    """The settings for the document chunker."""
+    max_chunk_token_length: int = None
+    boundary_slack_tokens: int = DEFAULT_BOUNDARY_SLACK_TOKENS
+
+@dataclass(frozen=True)
+class SummarizerSettings:
+    """The settings for the summarization pipeline."""
+    mode: str = 'refine'
+    reduce: str = 'resummarize'
+    tree_fan_in: int = 8
+    tree_max_depth: int = 4
+
+@dataclass(frozen=True)
+class JobSettings:
+    """The settings for the asynchronous job queue."""
+    max_queue_depth: int = 100
+    retention: int = 86400
+
+@dataclass(frozen=True)
+class BatchSettings:
+    """The settings for batch summarization."""
+    max_documents: int = 1000
+    max_pack_documents: int = 4
+    pack_max_tokens: int = 4096
+
+@dataclass(frozen=True)
+class CacheSettings:
+    """The settings for the summary cache."""
+    enabled: bool = True
+    max_bytes: int = 1073741824
+    chunks_enabled: bool = True
+    chunks_max_bytes: int = 1073741824
+
+@dataclass(frozen=True)
+class ResponseSettings:
+    """The settings for the response store."""
+    retention: int = 2592000
+    max_bytes: int = 10737418240
+    compress: bool = True
+
+@dataclass(frozen=True)
+class SchedulerSlotSettings:
+    """The settings for a single GPU/CPU slot of the scheduler."""
+    name: str
+    lock_file: str = None
+
+@dataclass(frozen=True)
+class SchedulerSettings:
+    """The settings for the GPU scheduler."""
+    slots: tuple[SchedulerSlotSettings, ...] = ()
+    max_queue_depth: int = 32
+    interactive_max_chars: int = 50000
+    min_retry_after: int = 5
+
+@dataclass(frozen=True)
+class ApiSettings:
+    """The settings for the API server."""
+    host: str
+    port: int
+    path: str
+    llm: LlmSettings
+    chunker: ChunkerSettings
+    data_dir: str
+    gpu_lock_file: str
+    max_final_summary_context_tokens: int = None
+    request_timeout: int = 1800
+    max_document_bytes: int = 1073741824
+    summarizer: SummarizerSettings = SummarizerSettings()
+    jobs: JobSettings = JobSettings()
+    batch: BatchSettings = BatchSettings()
+    scheduler: SchedulerSettings = SchedulerSettings()
+    cache: CacheSettings = CacheSettings()
+    responses: ResponseSettings = ResponseSettings()
+
+@dataclass(frozen=True)
+class ClientSettings:
+    """The settings for the summarize client."""
+    timeout: int
+    uri: str
+    user_agent: str
+    pub_key: str
+    priv_key: str
+    compression: str = 'gzip'
+
+@dataclass(frozen=True)
+class Settings:
+    """The application settings."""
+    api: ApiSettings
+    client: ClientSettings
+
+_settings = None
+_settings_lock = threading.Lock()
+
+def get_settings() -> Settings:
+    """Gets the application settings, parsing the configuration file on first use.
+
+    Returns:
+        Settings: The application settings.
+    """
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _load_settings()
+    return _settings
+
+def reload_settings() -> Settings:
+    """Parses the configuration file again, replacing the cached settings.
+
+    Returns:
+        Settings: The new application settings.
+    """
+    with _settings_lock:
+        _load_settings()
+    return _settings
+
+def install_reload_signal_handler(on_reload: Callable[[Settings], None]=None) -> None:
+    """Reloads the settings whenever the process receives SIGHUP.
+
+    If the configuration file cannot be parsed, the error is logged and the previous settings are kept.
+
+    Args:
+        on_reload (Callable): A callback to run with the new settings after each reload.
+    """
+    def handler(signum, frame):
+        try:
+            settings = reload_settings()
+            if on_reload is not None:
+                on_reload(settings)
+        except Exception:
+            get_logger().exception("Failed to reload the settings from %s.", CONFIG_FILEPATH)
+    signal.signal(signal.SIGHUP, handler)
+
+def _load_settings() -> None:
+    """Parses the configuration file into the cached settings."""
+    global _settings
+    _settings = _build_section(Settings, load_yaml(CONFIG_FILEPATH), 'config')
+
+def _freeze(value: object) -> object:
+    """Converts the lists and mappings of a configuration value into tuples and read-only mappings.
+
+    Args:
+        value (object): The configuration value.
+
+    Returns:
+        object: The immutable value.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _thaw(value: object) -> object:
+    """Converts the tuples and read-only mappings of a settings value back into lists and dictionaries.
+
+    Args:
+        value (object): The settings value.
+
+    Returns:
+        object: The mutable copy of the value.
+    """
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+def _build_section(section_class: type, data: dict, name: str) -> object:
+    """Builds a settings section from its configuration dictionary.
+
+    Args:
+        section_class (type): The dataclass of the section.
+        data (dict): The configuration of the section.
+        name (str): The dotted name of the section, used in errors.
+
+    Returns:
+        object: The settings section.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Configuration section '{name}' is missing or invalid.")
+    values = {}
+    for field in fields(section_class):
+        field_name = f"{name}.{field.name}"
+        if field.name not in data:
+            if field.default is MISSING:
+                raise ValueError(f"Configuration value '{field_name}' is missing.")
+            continue
+        value = data[field.name]
+        if is_dataclass(field.type):
+            value = _build_section(field.type, value, field_name)
+        elif get_origin(field.type) is tuple and is_dataclass(get_args(field.type)[0]):
+            if not isinstance(value, list):
+                raise ValueError(f"Configuration value '{field_name}' must be a list.")
+            value = tuple(
+                _build_section(get_args(field.type)[0], item, f"{field_name}[{i}]")
+                for i, item in enumerate(value)
+            )
+        elif field.type in (int, float, str) and value is not None:
+            value = field.type(value)
+        else:
+            value = _freeze(value)
+        values[field.name] = value
+    return section_class(**values)
@@ -0,0 +1,469 @@
+"""Provides a persistent, queryable store of summarization responses, written in the background."""
+import json
+import queue
+import sqlite3
+import threading
+import zlib
+
+from logging import Logger
+from os import makedirs
+from os.path import dirname
+
+from .hashing import hash_dict
+from .time import cur_timestamp
+from .utils import gen_uuid
+
+ENCODING_JSON = 'json'
+ENCODING_ZLIB = 'zlib'
+WRITE_BATCH_SIZE = 64
+RETENTION_INTERVAL = 3600
+MAX_QUERY_LIMIT = 1000
+
+STATUS_COMPLETE = 'complete'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+
+ARCHIVE_COLUMNS = (
+    ('status', 'TEXT'),
+    ('cache_hit', 'INTEGER'),
+    ('mode', 'TEXT'),
+    ('model', 'TEXT'),
+    ('config_hash', 'TEXT'),
+    ('total_request_time', 'REAL'),
+    ('total_inference_time', 'REAL'),
+    ('llm_calls', 'INTEGER'),
+    ('prompt_tokens', 'INTEGER'),
+    ('generated_tokens', 'INTEGER'),
+)
+ARCHIVE_FILTERS = {
+    'document_hash': 'document_hash = ?',
+    'client': 'client = ?',
+    'model': 'model = ?',
+    'config_hash': 'config_hash = ?',
+    'mode': 'mode = ?',
+    'status': 'status = ?',
+    'cache_hit': 'cache_hit = ?',
+    'since': 'created_at >= ?',
+    'until': 'created_at < ?',
+}
+STATS_GROUPS = {
+    'model': 'model',
+    'config_hash': 'config_hash',
+    'mode': 'mode',
+    'client': 'client',
+    'status': 'status',
+    'day': "date(created_at, 'unixepoch')",
+}
+
+class ResponseStore:
+    """Stores responses under unique IDs, indexed by document hash and time.
+
+    Responses are queued and written by a background thread, in batches of one transaction each,
+    so that storing a response never waits on disk I/O. Responses are encoded as compact JSON,
+    compressed with zlib unless disabled. Responses older than the retention period are deleted,
+    and the oldest responses are deleted once the store grows past its size limit.
+
+    Alongside each response, the writer archives its client, model, status and timings in indexed
+    columns, and its final summary in a full text index where SQLite supports FTS5, so that
+    written responses can be queried and their timings aggregated without decoding them.
+
+    Args:
+        log (Logger): The logger for the store.
+        filepath (str): The path of the SQLite database backing the store.
+        retention (int): Seconds to keep responses, or 0 to keep them until the store is full.
+        max_bytes (int): The maximum total size of the stored responses.
+        compress (bool): Whether to compress the stored responses.
+
+    Attributes:
+        compress (bool): Whether to compress the stored responses.
+        filepath (str): The path of the SQLite database backing the store.
+        log (Logger): The logger for the store.
+        max_bytes (int): The maximum total size of the stored responses.
+        retention (int): Seconds to keep responses, or 0 to keep them until the store is full.
+        written (int): The number of responses written since the store was opened.
+    """
+
+    TABLE = 'responses'
+
+    def __init__(self, log: Logger, filepath: str, retention: int, max_bytes: int, compress: bool=True) -> None:
+        self.compress = compress
+        self.filepath = filepath
+        self.log = log
+        self.max_bytes = max_bytes
+        self.retention = retention
+        self.written = 0
+        self._connection = None
+        self._database_lock = threading.Lock()
+        self._full_text = False
+        self._last_expired_at = 0.0
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._queue = queue.Queue()
+        self._writer = None
+
+    def put(self, response: dict, document_hash: str=None, client: str=None, response_id: str=None, created_at: float=None) -> str:
+        """Queues a response to be written, returning its ID at once.
+
+        Fields may be added to the response once it has been queued, but its nested data must not be modified.
+
+        Args:
+            response (dict): The response data.
+            document_hash (str): The hash of the summarized document, to index the response by.
+            client (str): The client that requested the response.
+            response_id (str): The ID to store the response under, or None to generate one.
+            created_at (float): The timestamp the response was created, or None for now.
+
+        Returns:
+            str: The response ID.
+        """
+        response_id = response_id or gen_uuid()
+        entry = {
+            'id': response_id,
+            'created_at': created_at or cur_timestamp(),
+            'document_hash': document_hash,
+            'client': client,
+            'response': dict(response),
+        }
+        with self._lock:
+            self._pending[response_id] = entry
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_forever, name='tyrell-responses', daemon=True)
+                self._writer.start()
+        self._queue.put(entry)
+        return response_id
+
+    def get(self, response_id: str) -> dict:
+        """Looks up a response, whether or not it has been written yet.
+
+        Args:
+            response_id (str): The response ID.
+
+        Returns:
+            dict: The response data, or None if there is none.
+        """
+        with self._lock:
+            entry = self._pending.get(response_id)
+        if entry is not None:
+            return entry['response']
+        with self._database_lock:
+            row = self._connect().execute(
+                f"SELECT encoding, data FROM {self.TABLE} WHERE id = ?",
+                (response_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return decode_response(*row)
+
+    def query(self, filters: dict, text: str=None, limit: int=50, offset: int=0) -> list:
+        """Lists the written responses matching the filters, newest first.
+
+        Args:
+            filters (dict): The values to match, keyed by the names in ARCHIVE_FILTERS.
+            text (str): An FTS5 query the final summary must match, if any.
+            limit (int): The maximum number of responses to list, from 1 up to MAX_QUERY_LIMIT.
+            offset (int): The number of matching responses to skip.
+
+        Returns:
+            list: The archived fields and final summary of each response.
+
+        Raises:
+            ValueError: If a filter is unknown, the limit or offset is out of range, or the text query is invalid or unsupported.
+        """
+        # SQLite treats a negative LIMIT as no limit at all.
+        if limit < 1:
+            raise ValueError("limit must be at least 1.")
+        if offset < 0:
+            raise ValueError("offset must not be negative.")
+        with self._database_lock:
+            connection = self._connect()
+            where, values = self._build_where(filters, text)
+            summary = f"(SELECT summary FROM {self.TABLE}_fts WHERE rowid = {self.TABLE}.rowid)" if self._full_text else "NULL"
+            columns = ('id', 'created_at', 'document_hash', 'client') + tuple(name for name, _ in ARCHIVE_COLUMNS)
+            try:
+                rows = connection.execute(
+                    f"SELECT {', '.join(columns)}, {summary} FROM {self.TABLE}{where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                    values + [min(limit, MAX_QUERY_LIMIT), offset]
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                raise ValueError(f"Invalid query: {e}") from e
+        return [dict(zip(columns + ('summary',), row)) for row in rows]
+
+    def timing_stats(self, filters: dict, group_by: str=None) -> list:
+        """Aggregates the timings and token counts of the written responses matching the filters.
+
+        Args:
+            filters (dict): The values to match, keyed by the names in ARCHIVE_FILTERS.
+            group_by (str): The field to aggregate by, one of STATS_GROUPS, or None for a single total.
+
+        Returns:
+            list: The count, the average, minimum and maximum request and inference times, and the
+                total LLM calls and tokens of each group.
+
+        Raises:
+            ValueError: If a filter or grouping is unknown.
+        """
+        if group_by is not None and group_by not in STATS_GROUPS:
+            raise ValueError(f"Unknown grouping '{group_by}'.")
+        group = STATS_GROUPS[group_by] if group_by is not None else "NULL"
+        with self._database_lock:
+            where, values = self._build_where(filters)
+            rows = self._connect().execute(
+                f"SELECT {group}, COUNT(*), "
+                "AVG(total_request_time), MIN(total_request_time), MAX(total_request_time), "
+                "AVG(total_inference_time), MIN(total_inference_time), MAX(total_inference_time), "
+                "SUM(llm_calls), SUM(prompt_tokens), SUM(generated_tokens) "
+                f"FROM {self.TABLE}{where} GROUP BY 1 ORDER BY 1",
+                values
+            ).fetchall()
+        stats = []
+        for row in rows:
+            group_stats = {
+                "count": row[1],
+                "total_request_time": {"avg": row[2], "min": row[3], "max": row[4]},
+                "total_inference_time": {"avg": row[5], "min": row[6], "max": row[7]},
+                "llm_calls": row[8] or 0,
+                "prompt_tokens": row[9] or 0,
+                "generated_tokens": row[10] or 0,
+            }
+            if group_by is not None:
+                group_stats[group_by] = row[0]
+            stats.append(group_stats)
+        return stats
+
+    def flush(self) -> None:
+        """Waits until every queued response has been written."""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        """Reports the store counters.
+
+        Returns:
+            dict: The number of responses queued and written.
+        """
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "written": self.written,
+        }
+
+    def _write_forever(self) -> None:
+        """Writes queued responses in batches, forever."""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                self.log.exception("Failed to write %d responses.", len(batch))
+            with self._lock:
+                for entry in batch:
+                    self._pending.pop(entry['id'], None)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch: list) -> None:
+        """Encodes and writes a batch of responses in one transaction, then applies the retention policy.
+
+        Args:
+            batch (list): The queued responses.
+        """
+        rows = []
+        for entry in batch:
+            encoding, data = encode_response(entry['response'], self.compress)
+            archived, summary = describe_response(entry['response'])
+            rows.append(((
+                entry['id'],
+                entry['created_at'],
+                entry['document_hash'],
+                entry['client'],
+                encoding,
+                data,
+                len(data),
+            ) + tuple(archived[name] for name, _ in ARCHIVE_COLUMNS), summary))
+        columns = ('id', 'created_at', 'document_hash', 'client', 'encoding', 'data', 'size') + tuple(name for name, _ in ARCHIVE_COLUMNS)
+        with self._database_lock:
+            connection = self._connect()
+            try:
+                for row, summary in rows:
+                    cursor = connection.execute(
+                        f"INSERT INTO {self.TABLE} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        row
+                    )
+                    if self._full_text and summary:
+                        connection.execute(f"INSERT INTO {self.TABLE}_fts (rowid, summary) VALUES (?, ?)", (cursor.lastrowid, summary))
+                self._expire(connection)
+                connection.commit()
+            except sqlite3.Error:
+                connection.rollback()
+                raise
+            self.written += len(rows)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the database on first use, creating it if needed.
+
+        Returns:
+            sqlite3.Connection: The database connection.
+        """
+        if self._connection is None:
+            makedirs(dirname(self.filepath), exist_ok=True)
+            self._connection = sqlite3.connect(self.filepath, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+                "id TEXT PRIMARY KEY, created_at REAL NOT NULL, document_hash TEXT, client TEXT, "
+                "encoding TEXT NOT NULL, data BLOB NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.TABLE}_document_hash ON {self.TABLE} (document_hash, created_at)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.TABLE}_created_at ON {self.TABLE} (created_at)"
+            )
+            self._migrate(self._connection)
+            self._connection.commit()
+        return self._connection
+
+    def _migrate(self, connection: sqlite3.Connection) -> None:
+        """Adds the archive columns, their indexes and the full text index to the store if it predates them.
+
+        Args:
+            connection (sqlite3.Connection): The database connection.
+        """
+        existing = {row[1] for row in connection.execute(f"PRAGMA table_info({self.TABLE})")}
+        for name, column_type in ARCHIVE_COLUMNS:
+            if name not in existing:
+                connection.execute(f"ALTER TABLE {self.TABLE} ADD COLUMN {name} {column_type}")
+        for name in ('client', 'model', 'config_hash'):
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.TABLE}_{name} ON {self.TABLE} ({name}, created_at)"
+            )
+        try:
+            connection.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE}_fts USING fts5(summary)")
+            self._full_text = True
+        except sqlite3.OperationalError:
+            self.log.warning("SQLite lacks FTS5, so stored summaries cannot be searched by text.")
+
+    def _build_where(self, filters: dict, text: str=None) -> tuple:
+        """Builds the WHERE clause of an archive query.
+
+        Args:
+            filters (dict): The values to match, keyed by the names in ARCHIVE_FILTERS.
+            text (str): An FTS5 query the final summary must match, if any.
+
+        Returns:
+            tuple: The WHERE clause, empty if nothing is filtered, and its parameters.
+
+        Raises:
+            ValueError: If a filter is unknown, or a text query is given without FTS5.
+        """
+        conditions, values = [], []
+        for name, value in filters.items():
+            if name not in ARCHIVE_FILTERS:
+                raise ValueError(f"Unknown filter '{name}'.")
+            conditions.append(ARCHIVE_FILTERS[name])
+            values.append(value)
+        if text:
+            if not self._full_text:
+                raise ValueError("Text search is not available.")
+            conditions.append(f"rowid IN (SELECT rowid FROM {self.TABLE}_fts WHERE {self.TABLE}_fts MATCH ?)")
+            values.append(text)
+        return (f" WHERE {' AND '.join(conditions)}" if conditions else ""), values
+
+    def _expire(self, connection: sqlite3.Connection) -> None:
+        """Deletes responses past the retention period, then the oldest responses until the store is within its size limit.
+
+        Runs at most once per RETENTION_INTERVAL, as it scans the whole store.
+
+        Args:
+            connection (sqlite3.Connection): The database connection.
+        """
+        now = cur_timestamp()
+        if now - self._last_expired_at < RETENTION_INTERVAL:
+            return
+        self._last_expired_at = now
+        if self.retention:
+            if self._full_text:
+                connection.execute(
+                    f"DELETE FROM {self.TABLE}_fts WHERE rowid IN (SELECT rowid FROM {self.TABLE} WHERE created_at < ?)",
+                    (now - self.retention,)
+                )
+            connection.execute(f"DELETE FROM {self.TABLE} WHERE created_at < ?", (now - self.retention,))
+        total_size = connection.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.TABLE}").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        rows = connection.execute(f"SELECT rowid, size FROM {self.TABLE} ORDER BY created_at ASC").fetchall()
+        expired = []
+        for rowid, size in rows:
+            if total_size <= self.max_bytes:
+                break
+            expired.append((rowid,))
+            total_size -= size
+        if self._full_text:
+            connection.executemany(f"DELETE FROM {self.TABLE}_fts WHERE rowid = ?", expired)
+        connection.executemany(f"DELETE FROM {self.TABLE} WHERE rowid = ?", expired)
+
+def describe_response(response: dict) -> tuple:
+    """Extracts the fields of a response that are archived alongside it.
+
+    Args:
+        response (dict): The response data.
+
+    Returns:
+        tuple: The archived fields, keyed by the names in ARCHIVE_COLUMNS, and the final summary if there is one.
+    """
+    if 'cancelled' in response:
+        status = STATUS_CANCELLED
+    elif 'error' in response:
+        status = STATUS_FAILED
+    else:
+        status = STATUS_COMPLETE
+    llm_config = (response.get('llm') or {}).get('config') or {}
+    usage = (response.get('llm_usage') or {}).get('total') or {}
+    cache = response.get('cache') or {}
+    archived = {
+        'status': status,
+        'cache_hit': int(bool(cache.get('hit'))),
+        'mode': response.get('mode'),
+        'model': llm_config.get('filename') or llm_config.get('model_name') or llm_config.get('repo'),
+        'config_hash': hash_dict(llm_config) if llm_config else None,
+        'total_request_time': response.get('total_request_time'),
+        'total_inference_time': response.get('total_inference_time'),
+        'llm_calls': usage.get('calls'),
+        'prompt_tokens': usage.get('prompt_tokens'),
+        'generated_tokens': usage.get('generated_tokens'),
+    }
+    return archived, response.get('response') or response.get('summary')
+
+def encode_response(response: dict, compress: bool) -> tuple:
+    """Encodes a response as compact JSON, compressed if requested.
+
+    Args:
+        response (dict): The response data.
+        compress (bool): Whether to compress it.
+
+    Returns:
+        tuple: The encoding, and the encoded response.
+    """
+    data = json.dumps(response, separators=(',', ':'), default=str).encode('utf-8')
+    if compress:
+        return ENCODING_ZLIB, zlib.compress(data)
+    return ENCODING_JSON, data
+
+def decode_response(encoding: str, data: bytes) -> dict:
+    """Decodes a stored response.
+
+    Args:
+        encoding (str): The encoding of the response.
+        data (bytes): The encoded response.
+
+    Returns:
+        dict: The response data.
+    """
+    if encoding == ENCODING_ZLIB:
+        data = zlib.decompress(data)
+    return json.loads(data)
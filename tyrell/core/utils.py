@@ -1,11 +1,9 @@
 """Provides utility functions."""
 import gc
-import psutil
 import torch
 
 from bs4 import BeautifulSoup
 from io import TextIOWrapper
-from logging import Logger
 from secrets import token_hex
 
 def clear_gpu_memory() -> None:
@@ -32,16 +30,6 @@ def short_uuid(uuid) -> str:
     """
     return uuid[:8]
 
-def report_memory_use(log: Logger) -> None:
-    """Reports the memory use.
-
-    Args:
-        log (Logger): The logger to use for reporting.
-    """
-    process = psutil.Process()
-    memory_use = process.memory_info().rss / 1024 / 1024
-    log.info("Memory use: %s MB", memory_use)
-
 def open_file_read(file_path: str) -> TextIOWrapper:
     """Opens a file for reading.
 
@@ -10,9 +10,5 @@ def load_yaml(filepath: str) -> dict:
     Returns:
         dict: The YAML file as a dictionary.
     """
-    return yaml.safe_load(
-        open(
-            filepath,
-            encoding='utf-8'
-        )
-    )
+    with open(filepath, encoding='utf-8') as f:
+        return yaml.safe_load(f)
@@ -1,30 +1,64 @@
 """Provides the core API server for Tyrell."""
+import atexit
+import json
+import queue
 import requests
 import socket
 import sys
+import threading
 
-from filelock import FileLock
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from datetime import datetime
 from flask import current_app, Flask, g, request, Response
 from logging import Logger
-from os import makedirs
-from transformers import AutoTokenizer
+from typing import Iterator
 from waitress import serve as waitress_serve
 
 from tyrell.core import get_logger
-from tyrell.core.builders import build_summarizer_chains
 
-from tyrell.core.config import get_api_host, get_api_path, get_api_llm_config, get_api_port, get_gpu_lockfile, get_max_chunk_token_length, get_max_final_summary_context_tokens, get_data_dir
+from tyrell.core.config import get_api_host, get_api_request_timeout, get_api_path, get_api_llm_config, get_api_llm_idle_timeout, get_api_llm_workers, get_api_llm_prefix_cache, get_api_max_document_bytes, get_job_queue_max_depth, get_job_retention, get_summarizer_mode, get_summarizer_reduce, get_summarizer_tree_fan_in, get_summarizer_tree_max_depth, get_chunk_cache_enabled, get_chunk_cache_filepath, get_chunk_cache_max_bytes, get_summary_cache_enabled, get_summary_cache_filepath, get_summary_cache_max_bytes, get_api_port, get_batch_max_documents, get_batch_max_pack_documents, get_batch_pack_max_tokens, get_max_chunk_token_length, get_scheduler_interactive_max_chars, get_scheduler_max_queue_depth, get_scheduler_min_retry_after, get_scheduler_slots, get_chunk_boundary_slack_tokens, get_max_final_summary_context_tokens, get_response_compress, get_response_max_bytes, get_response_retention, get_response_store_filepath
 from tyrell.core import json_dumper
+from tyrell.core.settings import install_reload_signal_handler, reload_settings, Settings
 from tyrell.core.time import cur_timestamp, time_since
-from tyrell.core.utils import report_memory_use, clear_gpu_memory
-from tyrell.llm import LLM
-from tyrell.llm.summarizer import summarize_document
+from tyrell.core.cache import ChunkCache, SummaryCache
+from tyrell.core.chunker import tokenize_offsets, tokenize_text, TokenizedText
+from tyrell.core.hashing import hash_dict, hash_text
+from tyrell.core.store import ARCHIVE_FILTERS, ResponseStore
+from tyrell.core.utils import short_uuid
+from tyrell.interfaces.metrics import install_gauges, METRICS_CONTENT_TYPE, observe_llm_call, observe_summary, render_metrics
+from tyrell.interfaces.jobs import Job, JobQueue, JobQueueFull, JOB_STATUS_COMPLETE, JOB_STATUS_FAILED
+from tyrell.interfaces.scheduler import PRIORITIES, PRIORITY_BATCH, Scheduler, SchedulerFull, Slot
+from tyrell.interfaces.sse import EVENT_ERROR, EVENT_RESULT, EVENT_TOKEN, format_event, SSE_MIMETYPE
+from tyrell.interfaces.uploads import DocumentTooLarge, ENCODING_MIMETYPES, iter_document_text, MULTIPART_MIMETYPE, read_document, SpooledDocument, TEXT_MIMETYPE
+from tyrell.llm import ComponentRegistry, ModelManager, get_prompt_template_versions
+from tyrell.llm.batch import pack_documents, summarize_packed_documents
+from tyrell.llm.budgets import TokenBudgets
+from tyrell.llm.context import CANCEL_REASON_CLIENT_DISCONNECTED, CANCEL_REASON_DEADLINE_EXCEEDED, PipelineCancelled, PipelineContext
+from tyrell.llm.summarizer import summarize_document, REDUCE_STRATEGIES, SUMMARY_MODES
 
 CMD_STRING = 'api:start'
+CACHE_IGNORED_LLM_CONFIG = ('n_batch', 'n_gpu_layers', 'n_threads', 'verbose')
+REDACTED_LLM_CONFIG = ('api_key',)
+NDJSON_MIMETYPE = 'application/x-ndjson'
+CHANNEL_REQUEST_LOOKAHEAD = 5
 
 app = Flask(__name__)
 logger = get_logger()
-gpu_lock = FileLock(get_gpu_lockfile())
+scheduler = Scheduler(
+    logger,
+    [Slot(name, lock_file) for name, lock_file in get_scheduler_slots()],
+    get_scheduler_max_queue_depth(),
+    get_scheduler_interactive_max_chars(),
+    get_scheduler_min_retry_after()
+)
+model_manager = ModelManager(logger, get_api_llm_config(), get_api_llm_idle_timeout(), get_api_llm_workers())
+registry = ComponentRegistry(logger)
+model_manager.add_evict_listener(registry.invalidate_chains)
+summary_cache = SummaryCache(get_summary_cache_filepath(), get_summary_cache_max_bytes()) if get_summary_cache_enabled() else None
+chunk_cache = ChunkCache(get_chunk_cache_filepath(), get_chunk_cache_max_bytes()) if get_chunk_cache_enabled() else None
+response_store = ResponseStore(logger, get_response_store_filepath(), get_response_retention(), get_response_max_bytes(), get_response_compress())
+job_queue = JobQueue(logger, lambda job: run_job(job), get_job_queue_max_depth(), get_job_retention(), len(scheduler.slots), response_store)
+install_gauges(scheduler, job_queue)
 
 @app.before_request
 def before_request():
@@ -41,85 +75,922 @@ def health_check():
     """Health check endpoint."""
     response = {
         "status": "healthy",
-        "message": "Service is running"
+        "message": "Service is running",
+        "token_budgets": get_token_budgets().as_dict(),
     }
     return Response(json_dumper(response, pretty=False), status=200, mimetype='application/json')
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics endpoint."""
+    return Response(render_metrics(), status=200, content_type=METRICS_CONTENT_TYPE)
+
 @app.route(get_api_path(), methods=['POST'])
 def summarize():
     """Summarize a document."""
-    data = request.json
-    document = data.get('document')
-    debug = data.get('debug', False)
-
-    gpu_request_lock_start = cur_timestamp()
-    with gpu_lock:
-        clear_gpu_memory()
-        gpu_lock_wait_time = time_since(gpu_request_lock_start)
-        logger.info("GPU lock acquired after %s seconds.", gpu_lock_wait_time)
-
-        logger.info("Loading LLM...")
-        llm_config = get_api_llm_config()
-        llm_model_load_start = cur_timestamp()
-        llm = LLM(logger, llm_config).get()
-        llm_model_load_time = time_since(llm_model_load_start)
-
-        logger.info("Building LLM Chains...")
-        chain_build_start = cur_timestamp()
-        chains = build_summarizer_chains(llm)
-        chain_build_time = time_since(chain_build_start)
-
-        logger.info("Initializing Tokenizer...")
-        tokenizer_load_start = cur_timestamp()
-        tokenizer = AutoTokenizer.from_pretrained(llm_config['tokenizer_repo'])
-        tokenizer_load_time = time_since(tokenizer_load_start)
-
-        max_chunk_token_length = get_max_chunk_token_length()
-        max_final_summary_context_tokens = get_max_final_summary_context_tokens()
-        summary = summarize_document(
-            document,
-            chains,
-            tokenizer,
-            max_chunk_token_length,
-            max_final_summary_context_tokens,
-            logger
-        )
-        # unset the model to free up memory
-        llm = None
+    data, error_response = read_request_data()
+    if error_response is not None:
+        return error_response
+    options, error_response = parse_summarize_options(data, get_api_request_timeout())
+    if error_response is not None:
+        return error_response
+
+    context = PipelineContext(client_disconnected=get_client_disconnected())
+    try:
+        summary, _ = run_summarization(options, g.start, context)
+    except SchedulerFull as e:
+        return scheduler_full_response(e)
+    return summary_response(summary)
+
+@app.route(f"{get_api_path()}/batch", methods=['POST'])
+def summarize_batch():
+    """Summarize a batch of documents, streaming each result back as a line of NDJSON as it completes.
+
+    The documents are either a JSON body with a 'documents' array, an NDJSON body with one document
+    per line and the options in the query string, or a multipart form with each document as a
+    'document' file and the options in the query string. An NDJSON body may be compressed, as given
+    by its Content-Encoding, and a document file as given by its content type.
+    """
+    if request.mimetype == MULTIPART_MIMETYPE:
+        data = parse_query_options(request.args)
+        try:
+            # Packing needs the token length of each document, so the files are read as text.
+            items = [
+                {'id': upload.filename, 'document': read_document(upload.stream, ENCODING_MIMETYPES.get(upload.mimetype), get_api_max_document_bytes())}
+                for upload in request.files.getlist('document')
+            ]
+        except DocumentTooLarge as e:
+            return Response(json_dumper({'error': str(e)}, pretty=False), status=413, mimetype='application/json')
+        except ValueError as e:
+            return Response(json_dumper({'error': str(e)}, pretty=False), status=400, mimetype='application/json')
+    elif request.mimetype == NDJSON_MIMETYPE:
+        data = parse_query_options(request.args)
+        try:
+            body = read_document(request.stream, request.headers.get('Content-Encoding'), get_api_max_document_bytes())
+        except DocumentTooLarge as e:
+            return Response(json_dumper({'error': str(e)}, pretty=False), status=413, mimetype='application/json')
+        except ValueError as e:
+            return Response(json_dumper({'error': str(e)}, pretty=False), status=400, mimetype='application/json')
+        try:
+            # JSON strings may hold unescaped line separators other than '\n', which splitlines() would split on.
+            items = [json.loads(line) for line in (line.removesuffix('\r') for line in body.split('\n')) if line.strip()]
+        except ValueError:
+            return Response(json_dumper({'error': 'Invalid NDJSON body.'}, pretty=False), status=400, mimetype='application/json')
+    else:
+        data = dict(request.json)
+        items = data.pop('documents', None)
+
+    items, error = parse_batch_items(items)
+    if error is not None:
+        return Response(json_dumper({'error': error}, pretty=False), status=400, mimetype='application/json')
+    if len(items) > get_batch_max_documents():
+        return Response(json_dumper({'error': f"Batch exceeds {get_batch_max_documents()} documents."}, pretty=False), status=413, mimetype='application/json')
+
+    options, error_response = parse_summarize_options(data)
+    if error_response is not None:
+        return error_response
+    options.pop('document')
+    if data.get('priority') is None:
+        options['priority'] = PRIORITY_BATCH
+
+    try:
+        scheduler.admit()
+    except SchedulerFull as e:
+        return scheduler_full_response(e)
+
+    results = run_batch(items, options, g.start, get_client_disconnected())
+    return Response((json_dumper(result, pretty=False) + "\n" for result in results), status=200, content_type=f"{NDJSON_MIMETYPE}; charset=utf-8")
+
+@app.route(f"{get_api_path()}/stream", methods=['POST'])
+def summarize_stream():
+    """Summarize a document, streaming progress and the final summary tokens as Server-Sent Events.
+
+    Closing the stream cancels the summarization.
+    """
+    data, error_response = read_request_data()
+    if error_response is not None:
+        return error_response
+    options, error_response = parse_summarize_options(data, get_api_request_timeout())
+    if error_response is not None:
+        return error_response
+
+    events = queue.Queue()
+    context = PipelineContext(
+        on_progress=lambda event, progress: events.put((event, progress)),
+        on_token=lambda text: events.put((EVENT_TOKEN, {'text': text})),
+        client_disconnected=get_client_disconnected()
+    )
+    request_start = g.start
+
+    def run():
+        try:
+            summary, _ = run_summarization(options, request_start, context)
+            events.put((EVENT_RESULT, summary))
+        except SchedulerFull as e:
+            events.put((EVENT_ERROR, {'error': str(e), 'status': 429, 'retry_after': e.retry_after}))
+        except Exception as e:
+            logger.exception("Streaming summarization failed.")
+            events.put((EVENT_ERROR, {'error': str(e), 'status': 500}))
+        events.put(None)
+
+    def stream():
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    return
+                yield format_event(*event)
+        finally:
+            context.cancel(CANCEL_REASON_CLIENT_DISCONNECTED)
+
+    threading.Thread(target=run, name='tyrell-stream', daemon=True).start()
+    return Response(stream(), status=200, mimetype=SSE_MIMETYPE, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a document for summarization, returning a job ID to poll."""
+    data, error_response = read_request_data()
+    if error_response is not None:
+        return error_response
+    options, error_response = parse_summarize_options(data)
+    if error_response is not None:
+        return error_response
+
+    document = options.pop('document')
+    try:
+        job = job_queue.submit(document, options)
+    except JobQueueFull as e:
+        return Response(json_dumper({'error': str(e)}, pretty=False), status=429, mimetype='application/json')
+    return Response(json_dumper(job.to_dict(), pretty=False), status=202, mimetype='application/json', headers={'Location': f"/jobs/{job.id}"})
+
+@app.route('/jobs', methods=['GET'])
+def jobs_status():
+    """Reports the depth of the job queue."""
+    return Response(json_dumper(job_queue.status(), pretty=False), status=200, mimetype='application/json')
+
+@app.route('/scheduler', methods=['GET'])
+def scheduler_status():
+    """Reports the state of the scheduler slots and queue."""
+    return Response(json_dumper(scheduler.status(), pretty=False), status=200, mimetype='application/json')
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id: str):
+    """Reports the status and progress of a job, and its result once it has finished."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return Response(json_dumper({'error': 'Unknown job.'}, pretty=False), status=404, mimetype='application/json')
+    return Response(json_dumper(job.to_dict(), pretty=False), status=200, mimetype='application/json')
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id: str):
+    """Cancels a queued or running job."""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return Response(json_dumper({'error': 'Unknown job.'}, pretty=False), status=404, mimetype='application/json')
+    status = 409 if job.status in (JOB_STATUS_COMPLETE, JOB_STATUS_FAILED) else 202
+    return Response(json_dumper(job.to_dict(), pretty=False), status=status, mimetype='application/json')
+
+@app.route('/responses', methods=['GET'])
+def list_responses():
+    """Lists stored responses matching the query string filters, newest first."""
+    filters, error = parse_archive_filters(request.args)
+    if error is None:
+        try:
+            limit = int(request.args.get('limit', 50))
+            offset = int(request.args.get('offset', 0))
+            responses = response_store.query(filters, request.args.get('q'), limit, offset)
+        except ValueError as e:
+            error = str(e)
+    if error is not None:
+        return Response(json_dumper({'error': error}, pretty=False), status=400, mimetype='application/json')
+    return Response(json_dumper({'responses': responses}, pretty=False), status=200, mimetype='application/json')
+
+@app.route('/responses/stats', methods=['GET'])
+def response_stats():
+    """Aggregates the timings of stored responses matching the query string filters."""
+    filters, error = parse_archive_filters(request.args)
+    if error is None:
+        try:
+            stats = response_store.timing_stats(filters, request.args.get('group_by'))
+        except ValueError as e:
+            error = str(e)
+    if error is not None:
+        return Response(json_dumper({'error': error}, pretty=False), status=400, mimetype='application/json')
+    return Response(json_dumper({'stats': stats}, pretty=False), status=200, mimetype='application/json')
+
+@app.route('/responses/<response_id>', methods=['GET'])
+def get_response(response_id: str):
+    """Returns a stored response."""
+    response = response_store.get(response_id)
+    if response is None:
+        return Response(json_dumper({'error': 'Unknown response.'}, pretty=False), status=404, mimetype='application/json')
+    return Response(json_dumper(response, pretty=False), status=200, mimetype='application/json')
+
+def get_client_disconnected():
+    """Gets the check for whether the client of the current request has disconnected, if the server provides one.
+
+    Returns:
+        Callable: The check, or None.
+    """
+    return request.environ.get('waitress.client_disconnected')
+
+def read_request_data() -> tuple:
+    """Reads the body of a summarize request.
+
+    The body is either JSON with the document under 'document', a plain text document with the
+    options in the query string, or a multipart form with the document as a 'document' file and the
+    options in the other fields. A plain text body is read as it streams in, decompressing it as
+    given by its Content-Encoding, and a document file as given by its content type. Both are
+    spooled into a SpooledDocument rather than held as text, so that they are chunked piece by piece.
+
+    Returns:
+        tuple: The request data, and an error response if it could not be read.
+    """
+    try:
+        if request.mimetype == TEXT_MIMETYPE:
+            data = parse_query_options(request.args)
+            data['document'] = SpooledDocument(iter_document_text(request.stream, request.headers.get('Content-Encoding'), get_api_max_document_bytes()))
+        elif request.mimetype == MULTIPART_MIMETYPE:
+            data = parse_query_options(request.form)
+            upload = request.files.get('document')
+            if upload is not None:
+                data['document'] = SpooledDocument(iter_document_text(upload.stream, ENCODING_MIMETYPES.get(upload.mimetype), get_api_max_document_bytes()))
+        else:
+            data = request.json
+    except DocumentTooLarge as e:
+        return {}, Response(json_dumper({'error': str(e)}, pretty=False), status=413, mimetype='application/json')
+    except ValueError as e:
+        return {}, Response(json_dumper({'error': str(e)}, pretty=False), status=400, mimetype='application/json')
+    return data, None
+
+def get_document_text(document):
+    """Gets a document for the summarizer, reading a spooled upload back piece by piece.
+
+    Args:
+        document (str): The document, as text or a SpooledDocument upload.
+
+    Returns:
+        str: The text, or an iterator of the pieces of a spooled upload.
+    """
+    return document.iter_text() if isinstance(document, SpooledDocument) else document
+
+def get_document_hash(document) -> str:
+    """Gets the hash of a document, as hashed when a spooled upload was read.
+
+    Args:
+        document (str): The document, as text or a SpooledDocument upload.
+
+    Returns:
+        str: The hash of the text, or None if there is no document.
+    """
+    if isinstance(document, SpooledDocument):
+        return document.hash
+    return hash_text(document) if document is not None else None
+
+def release_document(document) -> None:
+    """Deletes the temporary file of a spooled upload once it has been summarized.
+
+    Args:
+        document (str): The document, as text or a SpooledDocument upload.
+    """
+    if isinstance(document, SpooledDocument):
+        document.close()
+
+def parse_query_options(args) -> dict:
+    """Parses summarization options given as strings, in a query string or form.
+
+    Args:
+        args (MultiDict): The query string or form fields.
+
+    Returns:
+        dict: The options, with the flags converted to booleans.
+    """
+    data = args.to_dict()
+    for flag in ('debug', 'bypass_cache'):
+        if flag in data:
+            data[flag] = data[flag].lower() in ('1', 'true', 'yes')
+    return data
+
+def parse_archive_filters(args) -> tuple:
+    """Parses the response archive filters from a query string.
+
+    Dates are either UNIX timestamps or ISO 8601 dates and times.
+
+    Args:
+        args (MultiDict): The query string.
+
+    Returns:
+        tuple: The filters, keyed by the names in ARCHIVE_FILTERS, and an error message if they were invalid.
+    """
+    filters = {}
+    for name in ARCHIVE_FILTERS:
+        value = args.get(name)
+        if value is None:
+            continue
+        if name in ('since', 'until'):
+            try:
+                value = float(value)
+            except ValueError:
+                try:
+                    value = datetime.fromisoformat(value).timestamp()
+                except ValueError:
+                    return filters, f"Invalid date '{value}'."
+        elif name == 'cache_hit':
+            value = int(value.lower() in ('1', 'true', 'yes'))
+        filters[name] = value
+    return filters, None
+
+def parse_summarize_options(data: dict, default_timeout: float=None) -> tuple:
+    """Parses the summarization options from a request body.
+
+    Args:
+        data (dict): The request body.
+        default_timeout (float): The seconds the request may run for if it does not say, or None for no limit.
+
+    Returns:
+        tuple: The options, and an error response if they were invalid.
+    """
+    options = {
+        'document': data.get('document'),
+        'debug': data.get('debug', False),
+        'mode': data.get('mode', get_summarizer_mode()),
+        'reduce': data.get('reduce', get_summarizer_reduce()),
+        'client': request.headers.get('x-pub-key') or data.get('client') or request.remote_addr,
+        'bypass_cache': bool(data.get('bypass_cache', False)),
+    }
+    if options['mode'] not in SUMMARY_MODES:
+        return options, Response(json_dumper({'error': f"Unknown mode '{options['mode']}'."}, pretty=False), status=400, mimetype='application/json')
+    if options['reduce'] not in REDUCE_STRATEGIES:
+        return options, Response(json_dumper({'error': f"Unknown reduce strategy '{options['reduce']}'."}, pretty=False), status=400, mimetype='application/json')
+    if data.get('priority') not in (None,) + PRIORITIES:
+        return options, Response(json_dumper({'error': f"Unknown priority '{data.get('priority')}'."}, pretty=False), status=400, mimetype='application/json')
+    options['priority'] = scheduler.classify(options['document'], data.get('priority'))
+    try:
+        options['timeout'] = float(data.get('timeout') or default_timeout or 0) or None
+    except (TypeError, ValueError):
+        options['timeout'] = -1
+    if options['timeout'] is not None and options['timeout'] < 0:
+        return options, Response(json_dumper({'error': f"Invalid timeout '{data.get('timeout')}'."}, pretty=False), status=400, mimetype='application/json')
+    return options, None
+
+def parse_batch_items(items: list) -> tuple:
+    """Parses the documents of a batch request.
+
+    Each document is either its text, or a dictionary with the text under 'document' and an optional
+    'id' to identify its result. Documents without an ID are identified by their index.
+
+    Args:
+        items (list): The documents of the request.
+
+    Returns:
+        tuple: The documents, each a dictionary with its ID and text, and an error message if they were invalid.
+    """
+    if not isinstance(items, list) or not items:
+        return [], "A batch requires a non-empty list of documents."
+    parsed = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'document': item}
+        if not isinstance(item, dict) or not isinstance(item.get('document'), str):
+            return [], f"Document {index} has no text."
+        parsed.append({'id': item.get('id', index), 'document': item['document']})
+    return parsed, None
+
+def run_job(job: Job) -> tuple:
+    """Runs a queued summarization job.
+
+    Args:
+        job (Job): The job.
+
+    Returns:
+        tuple: The response data, and its ID in the response store.
+    """
+    options = dict(job.options)
+    options['document'] = job.document
+    return run_summarization(options, job.submitted_at, job.context, admit=False)
+
+def run_summarization(options: dict, request_start: float, context: PipelineContext=None, admit: bool=True) -> tuple:
+    """Summarizes a document on the resident LLM and records the response.
+
+    Args:
+        options (dict): The summarization options, including the document.
+        request_start (float): The timestamp the request was received.
+        context (PipelineContext): The context to report progress to.
+        admit (bool): Whether to apply the scheduler's admission control.
+
+    Returns:
+        tuple: The response data, and its ID in the response store.
+
+    Raises:
+        SchedulerFull: If admission control is applied and the scheduler queue is full.
+    """
+    if context is None:
+        context = PipelineContext()
+
+    cache_key, cached_summary = lookup_summary_cache(options)
+    if cached_summary is not None:
+        logger.info("Responding with cached summary %s...", short_uuid(cache_key))
+        release_document(options['document'])
+        return finish_summarization(cached_summary, options, request_start, context, cache_key, True)
+
+    prepare_context(context, options, request_start)
+    context.report("waiting")
+    try:
+        with scheduler.acquire(options['client'], options['priority'], admit, context.check_cancelled) as (slot, gpu_lock_wait_time), model_manager.use() as (llms, llm_model_load_time):
+            llm_config, chains, tokenizer, timings = load_pipeline_components(llms)
+            budgets = get_token_budgets()
+            summary = summarize_document(
+                get_document_text(options['document']),
+                chains,
+                tokenizer,
+                budgets.max_chunk_token_length(options['mode']),
+                budgets.max_final_summary_context_tokens,
+                logger,
+                chunk_boundary_slack=get_chunk_boundary_slack_tokens(),
+                mode=options['mode'],
+                context=context,
+                reduce=options['reduce'],
+                tree_fan_in=get_summarizer_tree_fan_in(),
+                tree_max_depth=get_summarizer_tree_max_depth()
+            )
+    except PipelineCancelled as e:
+        logger.warning("Summarization cancelled (%s) at %s.", e.reason, e.progress)
+        return finish_summarization(build_cancelled_summary(e), options, request_start, context, None, False)
+    finally:
+        release_document(options['document'])
+
+    timings = {'gpu_lock_wait_time': gpu_lock_wait_time, 'llm_model_load_time': llm_model_load_time, **timings}
+    return record_summary(summary, options, request_start, context, cache_key, llm_config, len(llms), slot, timings)
+
+def run_batch(items: list, options: dict, request_start: float, client_disconnected=None) -> Iterator[dict]:
+    """Summarizes a batch of documents under a single slot and model residency, yielding each result as it completes.
+
+    Short documents are packed together into shared LLM calls where they fit. Packs and longer
+    documents run concurrently across the LLM workers. Closing the generator cancels the documents
+    still running.
+
+    Args:
+        items (list): The documents, each a dictionary with its ID and text.
+        options (dict): The summarization options shared by the documents.
+        request_start (float): The timestamp the request was received.
+        client_disconnected (Callable): Checks whether the client has gone away, if it can be checked.
 
+    Yields:
+        dict: The result of each document, in order of completion.
+    """
+    contexts = []
+    try:
+        yield from summarize_batch_items(items, options, request_start, client_disconnected, contexts)
+    finally:
+        for context in contexts:
+            context.cancel(CANCEL_REASON_CLIENT_DISCONNECTED)
+
+def summarize_batch_items(items: list, options: dict, request_start: float, client_disconnected, contexts: list) -> Iterator[dict]:
+    """Summarizes the documents of a batch, yielding each result as it completes.
+
+    Args:
+        items (list): The documents, each a dictionary with its ID and text.
+        options (dict): The summarization options shared by the documents.
+        request_start (float): The timestamp the request was received.
+        client_disconnected (Callable): Checks whether the client has gone away, if it can be checked.
+        contexts (list): Collects the context of each document, so the caller can cancel them.
+
+    Yields:
+        dict: The result of each document, in order of completion.
+    """
+    def new_context(item_options: dict) -> PipelineContext:
+        context = PipelineContext(client_disconnected=client_disconnected)
+        prepare_context(context, item_options, request_start)
+        contexts.append(context)
+        return context
+
+    pending = []
+    for index, item in enumerate(items):
+        item_options = dict(options, document=item['document'])
+        context = new_context(item_options)
+        if not item['document'].strip():
+            summary, _ = finish_summarization({'error': 'Empty document.'}, item_options, request_start, context, None, False)
+            yield build_batch_result(index, item, summary)
+            continue
+        cache_key, cached_summary = lookup_summary_cache(item_options)
+        if cached_summary is not None:
+            summary, _ = finish_summarization(cached_summary, item_options, request_start, context, cache_key, True)
+            yield build_batch_result(index, item, summary)
+            continue
+        pending.append((index, item, item_options, context, cache_key))
+    if not pending:
+        return
+
+    try:
+        with scheduler.acquire(options['client'], options['priority'], False, pending[0][3].check_cancelled) as (slot, gpu_lock_wait_time), model_manager.use() as (llms, llm_model_load_time):
+            llm_config, chains, tokenizer, timings = load_pipeline_components(llms)
+            timings = {'gpu_lock_wait_time': gpu_lock_wait_time, 'llm_model_load_time': llm_model_load_time, **timings}
+            budgets = get_token_budgets()
+
+            documents = [tokenize_text(tokenizer, entry[2]['document']) for entry in pending]
+            packs = pack_documents([len(document) for document in documents], min(budgets.pack_max_tokens, budgets.max_chunk_token_length(options['mode'])), get_batch_max_pack_documents())
+            logger.info("Summarizing batch of %d documents in %d packs...", len(pending), len(packs))
+
+            def summarize_entry(entry: tuple, document: TokenizedText) -> dict:
+                _, _, item_options, context, _ = entry
+                try:
+                    return summarize_document(
+                        document,
+                        chains,
+                        tokenizer,
+                        budgets.max_chunk_token_length(item_options['mode']),
+                        budgets.max_final_summary_context_tokens,
+                        logger,
+                        chunk_boundary_slack=get_chunk_boundary_slack_tokens(),
+                        mode=item_options['mode'],
+                        context=context,
+                        reduce=item_options['reduce'],
+                        tree_fan_in=get_summarizer_tree_fan_in(),
+                        tree_max_depth=get_summarizer_tree_max_depth()
+                    )
+                except PipelineCancelled as e:
+                    return build_cancelled_summary(e)
+
+            def run_pack(pack: list) -> list:
+                entries = [pending[i] for i in pack]
+                record_contexts = [entry[3] for entry in entries]
+                try:
+                    summaries = None
+                    if len(entries) > 1:
+                        pack_context = new_context(entries[0][2])
+                        try:
+                            summaries = summarize_packed_documents([entry[2]['document'] for entry in entries], chains, logger, pack_context)
+                        except PipelineCancelled as e:
+                            summaries = [build_cancelled_summary(e) for _ in entries]
+                        if summaries is not None:
+                            record_contexts = [pack_context] * len(entries)
+                    if summaries is None:
+                        summaries = [summarize_entry(pending[i], documents[i]) for i in pack]
+                except Exception as e:
+                    logger.exception("Batch pack failed.")
+                    summaries = [{'error': str(e)} for _ in entries]
+
+                results = []
+                for (index, item, item_options, _, cache_key), context, summary in zip(entries, record_contexts, summaries):
+                    summary, _ = record_summary(summary, item_options, request_start, context, cache_key, llm_config, len(llms), slot, timings)
+                    results.append(build_batch_result(index, item, summary))
+                return results
+
+            with ThreadPoolExecutor(max_workers=chains.size, thread_name_prefix='tyrell-batch') as executor:
+                futures = [executor.submit(run_pack, pack) for pack in packs]
+                for future in as_completed(futures):
+                    yield from future.result()
+    except PipelineCancelled as e:
+        # Only raised while waiting for the slot; cancellations once running are reported per document.
+        for index, item, item_options, context, _ in pending:
+            summary, _ = finish_summarization(build_cancelled_summary(e), item_options, request_start, context, None, False)
+            yield build_batch_result(index, item, summary)
+
+def lookup_summary_cache(options: dict) -> tuple:
+    """Looks up a request in the summary cache.
+
+    Args:
+        options (dict): The summarization options, including the document.
+
+    Returns:
+        tuple: The summary cache key, or None if the cache is disabled, and the cached summary, or None if there is none.
+    """
+    if summary_cache is None:
+        return None, None
+    cache_key = build_summary_cache_key(options)
+    if options['bypass_cache']:
+        return cache_key, None
+    return cache_key, summary_cache.get(cache_key)
+
+def prepare_context(context: PipelineContext, options: dict, request_start: float) -> None:
+    """Points a pipeline context at the chunk cache and metrics, and sets its deadline from the request timeout.
+
+    Args:
+        context (PipelineContext): The pipeline context.
+        options (dict): The summarization options.
+        request_start (float): The timestamp the request was received.
+    """
+    if chunk_cache is not None:
+        context.chunk_cache = chunk_cache
+        context.cache_namespace = build_llm_cache_namespace()
+        context.read_cache = not options['bypass_cache']
+    if options['timeout'] is not None:
+        context.deadline = request_start + options['timeout']
+    context.on_llm_call = record_llm_call
+
+def record_llm_call(chain_name: str, inputs: dict, response: str, timings: dict) -> None:
+    """Records the metrics of an LLM call.
+
+    Args:
+        chain_name (str): The name of the chain.
+        inputs (dict): The prompt inputs.
+        response (str): The LLM response.
+        timings (dict): The call timings.
+    """
+    if timings['prompt_tokens'] is None:
+        tokenizer = registry.get_tokenizer(model_manager.config['tokenizer_repo'])
+        timings = dict(timings, prompt_tokens=sum(len(tokenize_offsets(tokenizer, str(value))) for value in inputs.values()))
+    observe_llm_call(chain_name, timings)
+
+def build_cancelled_summary(e: PipelineCancelled) -> dict:
+    """Builds the response data of a cancelled summarization, reporting how far it got.
+
+    Args:
+        e (PipelineCancelled): The cancellation.
+
+    Returns:
+        dict: The response data.
+    """
+    return {
+        'error': str(e),
+        'cancelled': {
+            'reason': e.reason,
+            'progress': e.progress,
+        },
+    }
+
+def load_pipeline_components(llms: list) -> tuple:
+    """Gets the chains and tokenizer for the resident LLM. Must be called while using the model.
+
+    Args:
+        llms (list): The LLM workers, as borrowed from the model manager.
+
+    Returns:
+        tuple: The LLM configuration, the chains, the tokenizer, and the time spent getting them.
+    """
+    llm_config = model_manager.config
+
+    chain_build_start = cur_timestamp()
+    chains = registry.get_chains(llm_config, llms, get_api_llm_prefix_cache())
+    chain_build_time = time_since(chain_build_start)
+
+    tokenizer_load_start = cur_timestamp()
+    tokenizer = registry.get_tokenizer(llm_config['tokenizer_repo'])
+    tokenizer_load_time = time_since(tokenizer_load_start)
+
+    return llm_config, chains, tokenizer, {
+        'chain_build_time': chain_build_time,
+        'tokenizer_load_time': tokenizer_load_time,
+    }
+
+def get_token_budgets() -> TokenBudgets:
+    """Gets the token budgets derived for the resident LLM configuration and the configured limits.
+
+    Returns:
+        TokenBudgets: The token budgets.
+    """
+    return registry.get_budgets(
+        model_manager.config,
+        get_max_chunk_token_length(),
+        get_max_final_summary_context_tokens(),
+        get_batch_pack_max_tokens(),
+        get_batch_max_pack_documents(),
+    )
+
+def record_summary(summary: dict, options: dict, request_start: float, context: PipelineContext, cache_key: str, llm_config: dict, workers: int, slot: Slot, timings: dict) -> tuple:
+    """Adds the generation metadata to a newly generated summary, caches it and records the response.
+
+    Args:
+        summary (dict): The response data.
+        options (dict): The summarization options.
+        request_start (float): The timestamp the request was received.
+        context (PipelineContext): The context to report progress to.
+        cache_key (str): The summary cache key, or None if the cache is disabled.
+        llm_config (dict): The configuration of the LLM that generated the summary.
+        workers (int): The number of LLM workers.
+        slot (Slot): The scheduler slot the summary was generated on.
+        timings (dict): The time spent waiting for the slot, loading the model, chains and tokenizer.
+
+    Returns:
+        tuple: The response data, and its ID in the response store.
+    """
     summary['llm'] = {}
-    summary['llm']['config'] = get_api_llm_config()
-    summary['gpu_lock_wait_time'] = gpu_lock_wait_time
-    summary['llm_model_load_time'] = llm_model_load_time
-    summary['chain_build_time'] = chain_build_time
-    summary['tokenizer_load_time'] = tokenizer_load_time
-    summary['total_request_time'] = time_since(g.start)
+    summary['llm']['config'] = {key: value for key, value in llm_config.items() if key not in REDACTED_LLM_CONFIG}
+    summary['llm']['workers'] = workers
+    summary['mode'] = options['mode']
+    summary['reduce'] = options['reduce']
+    summary['scheduler'] = {
+        'slot': slot.name,
+        'priority': options['priority'],
+    }
+    summary.update(timings)
+    summary['llm_usage'] = context.usage_report()
 
     summary['generated_at'] = cur_timestamp()
     summary['agent'] = 'tyrell'
     summary['version'] = '1.0.0'
 
-    if not debug:
+    if cache_key is not None and 'error' not in summary:
+        summary_cache.put(cache_key, summary)
+    return finish_summarization(summary, options, request_start, context, cache_key, False)
+
+def finish_summarization(summary: dict, options: dict, request_start: float, context: PipelineContext, cache_key: str, cache_hit: bool) -> tuple:
+    """Adds the request metadata to a summary and records the response.
+
+    Args:
+        summary (dict): The response data.
+        options (dict): The summarization options.
+        request_start (float): The timestamp the request was received.
+        context (PipelineContext): The context to report progress to.
+        cache_key (str): The summary cache key, or None if the cache is disabled.
+        cache_hit (bool): Whether the summary was served from the cache.
+
+    Returns:
+        tuple: The response data, and its ID in the response store.
+    """
+    if cache_hit:
+        summary['gpu_lock_wait_time'] = 0.0
+        summary['llm_model_load_time'] = 0.0
+        summary['chain_build_time'] = 0.0
+        summary['tokenizer_load_time'] = 0.0
+    if cache_key is not None:
+        summary['cache'] = summary_cache.stats()
+        summary['cache']['key'] = cache_key
+        summary['cache']['hit'] = cache_hit
+        summary['cache']['bypassed'] = options['bypass_cache']
+    if context.chunk_cache is not None and not cache_hit:
+        summary.setdefault('cache', {})
+        summary['cache']['chunk_hits'] = context.cache_hits
+        summary['cache']['chunk_misses'] = context.cache_misses
+    summary['total_request_time'] = time_since(request_start)
+
+    if not options['debug']:
         summary.pop('results', None)
 
-    write_response_data(summary)
+    summary['response_id'] = response_store.put(summary, get_document_hash(options.get('document')), options['client'])
+    observe_summary(summary, summary_status(summary), cache_hit)
+    if 'cancelled' in summary:
+        context.report("cancelled")
+    else:
+        context.report("failed" if 'error' in summary else "complete")
+    return summary, summary['response_id']
+
+def build_llm_cache_namespace() -> str:
+    """Builds a hash of the model, sampling and prompt configuration that cached responses depend on.
+
+    Returns:
+        str: The cache namespace.
+    """
+    llm_config = {
+        key: value for key, value in model_manager.config.items()
+        if key not in CACHE_IGNORED_LLM_CONFIG
+    }
+    return hash_dict({
+        "llm": llm_config,
+        "prompts": get_prompt_template_versions(),
+    })
+
+def build_summary_cache_key(options: dict) -> str:
+    """Builds the summary cache key for a request.
+
+    The key covers everything that changes the generated summary: the document, the model and its
+    sampling parameters, the prompt templates, the summarization mode and reduce strategy, and the
+    token budgets.
+
+    Args:
+        options (dict): The summarization options, including the document.
+
+    Returns:
+        str: The summary cache key.
+    """
+    budgets = get_token_budgets()
+    return hash_dict({
+        "document": get_document_hash(options['document']),
+        "llm": build_llm_cache_namespace(),
+        "mode": options['mode'],
+        "reduce": options['reduce'],
+        "tree_fan_in": get_summarizer_tree_fan_in(),
+        "tree_max_depth": get_summarizer_tree_max_depth(),
+        "max_chunk_token_length": budgets.max_chunk_token_length(options['mode']),
+        "chunk_boundary_slack": get_chunk_boundary_slack_tokens(),
+        "max_final_summary_context_tokens": budgets.max_final_summary_context_tokens,
+    })
+
+def build_batch_result(index: int, item: dict, summary: dict) -> dict:
+    """Builds the result line of a document in a batch.
+
+    Args:
+        index (int): The index of the document in the batch.
+        item (dict): The document, with its ID.
+        summary (dict): The response data.
+
+    Returns:
+        dict: The result line.
+    """
+    return {
+        'index': index,
+        'id': item['id'],
+        'status': summary_status(summary),
+        'result': summary,
+    }
+
+def summary_status(summary: dict) -> int:
+    """Gets the HTTP status of a summary.
 
+    Args:
+        summary (dict): The response data.
+
+    Returns:
+        int: The HTTP status.
+    """
+    if 'cancelled' in summary:
+        return 504 if summary['cancelled']['reason'] == CANCEL_REASON_DEADLINE_EXCEEDED else 499
     if 'error' in summary:
         if "Empty document." in summary['error']:
-            logger.error("Empty document.")
-            return Response(json_dumper(summary, pretty=False), status=400, mimetype='application/json')
-        else:
-            logger.error("Error summarizing document:")
-            logger.error(summary['error'])
-            return Response(json_dumper(summary, pretty=False), status=500, mimetype='application/json')    
+            return 400
+        return 500
+    return 200
+
+def summary_response(summary: dict) -> Response:
+    """Builds the HTTP response for a summary.
+
+    Args:
+        summary (dict): The response data.
+
+    Returns:
+        Response: The HTTP response.
+    """
+    status = summary_status(summary)
+    if status == 400:
+        logger.error("Empty document.")
+    elif status >= 500 and 'cancelled' not in summary:
+        logger.error("Error summarizing document:")
+        logger.error(summary['error'])
+    return Response(json_dumper(summary, pretty=False), status=status, mimetype='application/json')
+
+def scheduler_full_response(e: SchedulerFull) -> Response:
+    """Builds the HTTP response for a request rejected by the scheduler's admission control.
+
+    Args:
+        e (SchedulerFull): The rejection.
+
+    Returns:
+        Response: The HTTP response.
+    """
+    return Response(json_dumper({'error': str(e), 'retry_after': e.retry_after}, pretty=False), status=429, mimetype='application/json', headers={'Retry-After': str(e.retry_after)})
 
-    return Response(json_dumper(summary, pretty=False), status=200, mimetype='application/json')
+@app.route('/models', methods=['GET'])
+def models_status():
+    """Reports the state of the resident model."""
+    return Response(json_dumper(model_manager.status(), pretty=False), status=200, mimetype='application/json')
+
+@app.route('/models/reload', methods=['POST'])
+def models_reload():
+    """Reloads the configuration, then the resident model, tokenizer and chains from it."""
+    reload_settings()
+    load_time = reload_llm()
+    response = model_manager.status()
+    response['reload_time'] = load_time
+    return Response(json_dumper(response, pretty=False), status=200, mimetype='application/json')
+
+@app.route('/models/evict', methods=['POST'])
+def models_evict():
+    """Evicts the resident model, handing the GPU back until the next request."""
+    with scheduler.exclusive():
+        model_manager.evict()
+    return Response(json_dumper(model_manager.status(), pretty=False), status=200, mimetype='application/json')
+
+def reload_llm() -> float:
+    """Reloads the resident model, tokenizer and chains from the current configuration.
+
+    Returns:
+        float: The time spent loading the model.
+    """
+    with scheduler.exclusive():
+        model_manager.set_idle_timeout(get_api_llm_idle_timeout())
+        load_time = model_manager.reload(get_api_llm_config(), get_api_llm_workers())
+        registry.invalidate()
+        registry.get_tokenizer(model_manager.config['tokenizer_repo'])
+        get_token_budgets()
+    return load_time
+
+def apply_reloaded_settings(settings: Settings) -> None:
+    """Applies the idle timeout, and reloads the resident model in the background if its configuration changed on SIGHUP.
+
+    Args:
+        settings (Settings): The reloaded settings.
+    """
+    model_manager.set_idle_timeout(settings.api.llm.idle_timeout)
+    if settings.api.llm.model.as_dict() == model_manager.config and settings.api.llm.workers == model_manager.workers:
+        logger.info("Configuration reloaded.")
+        return
+    logger.info("Configuration reloaded, LLM configuration changed. Reloading LLM...")
+    threading.Thread(target=reload_llm, name='tyrell-model-reload', daemon=True).start()
 
 def start() -> None:
     """Starts the API server."""
-    report_memory_use(logger)
+    logger.info("Loading resident LLM...")
+    with scheduler.exclusive():
+        load_time = model_manager.load()
+    logger.info("Loaded resident LLM in %s seconds.", load_time)
+    registry.get_tokenizer(model_manager.config['tokenizer_repo'])
+    get_token_budgets()
+    model_manager.set_idle_timeout(get_api_llm_idle_timeout())
+    job_queue.start()
+    atexit.register(response_store.flush)
+    install_reload_signal_handler(apply_reloaded_settings)
     logger.info("Starting API server...")
-    waitress_serve(app, host=get_api_host(), port=get_api_port())
+    waitress_serve(app, host=get_api_host(), port=get_api_port(), channel_request_lookahead=CHANNEL_REQUEST_LOOKAHEAD)
 
 def check_api_server_exit(log: Logger):
     """Exits if the API server is not running."""
@@ -132,12 +1003,3 @@ def api_server_up() -> bool:
     a_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     location = (get_api_host(), get_api_port())
     return a_socket.connect_ex(location) == 0
-
-def write_response_data(data: dict) -> None:
-    """Writes the response data to a file."""
-    data_dir = get_data_dir()
-    summary_response_dir = f"{data_dir}/tyrell_responses"
-    makedirs(summary_response_dir, exist_ok=True)
-    final_filepath = f"{summary_response_dir}/response_{cur_timestamp()}.json"
-    with open(final_filepath, 'w') as f:
-        f.write(json_dumper(data, pretty=True))
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""Provides a command to import legacy response files into the response store."""
+import glob
+import json
+import os
+import sys
+import time
+
+from tyrell.core import get_logger
+from tyrell.core.config import get_data_dir, get_response_compress, get_response_max_bytes, get_response_retention, get_response_store_filepath
+from tyrell.core.store import ResponseStore, WRITE_BATCH_SIZE
+
+CMD_STRING = 'responses:import'
+LEGACY_RESPONSE_PREFIX = 'response_'
+
+def import_responses(args: list=sys.argv) -> None:
+    """Imports the response files written before the response store into it, leaving the files in place.
+
+    Each file is stored under an ID derived from its name, so that running the import again skips
+    the files already imported. Files older than the retention period are skipped, since the store
+    would delete them as soon as they were written.
+
+    Args:
+        args (list, optional): The arguments for the command, optionally the directory of the files. Defaults to sys.argv.
+    """
+    log = get_logger()
+    directory = args[1] if len(args) > 1 else os.path.join(get_data_dir(), 'tyrell_responses')
+    paths = sorted(glob.glob(os.path.join(directory, f"{LEGACY_RESPONSE_PREFIX}*.json")))
+    if not paths:
+        log.warning("No response files found in %s.", directory)
+        log.warning("Usage: poetry run %s [directory]", CMD_STRING)
+        sys.exit(1)
+
+    store = ResponseStore(log, get_response_store_filepath(), get_response_retention(), get_response_max_bytes(), get_response_compress())
+    oldest = time.time() - store.retention if store.retention else 0
+    imported, skipped, expired = 0, 0, 0
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        response_id = f"legacy-{name[len(LEGACY_RESPONSE_PREFIX):]}"
+        if store.get(response_id) is not None:
+            skipped += 1
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                response = json.load(f)
+        except (OSError, ValueError):
+            log.exception("Failed to read %s.", path)
+            continue
+        created_at = response.get('generated_at') or os.path.getmtime(path)
+        if created_at < oldest:
+            expired += 1
+            continue
+        store.put(response, response_id=response_id, created_at=created_at)
+        imported += 1
+        if imported % WRITE_BATCH_SIZE == 0:
+            store.flush()
+            log.info("Imported %d of %d response files...", imported, len(paths))
+    store.flush()
+    log.info("Imported %d response files, skipped %d already imported and %d past the retention period.", imported, skipped, expired)
@@ -1,16 +1,21 @@
 """Provides a command to summarize a document."""
+import glob
+import json
 import os
 import sys
 
 import requests
 from logging import Logger
 
-from tyrell.core.config import get_client_uri, get_client_timeout, get_client_keypair, get_client_user_agent
+from tyrell.core.config import get_client_uri, get_client_timeout, get_client_keypair, get_client_user_agent, get_client_compression
 from tyrell.core import get_logger
 from tyrell.interfaces.api import check_api_server_exit
+from tyrell.interfaces.sse import EVENT_ERROR, EVENT_RESULT, EVENT_TOKEN, iter_events
+from tyrell.interfaces.uploads import ENCODING_IDENTITY, iter_compressed, iter_file_blocks, iter_multipart_files, normalize_encoding, TEXT_MIMETYPE
 from tyrell.core import json_dumper
 
 CMD_STRING = 'summarize'
+FLAG_STREAM = '--stream'
 
 def summarize(args: list=sys.argv) -> None:
     """Summarizes the provided document.
@@ -20,11 +25,10 @@ def summarize(args: list=sys.argv) -> None:
     """
     log = get_logger()
     check_api_server_exit(log)
+    stream = FLAG_STREAM in args
+    args = [arg for arg in args if arg != FLAG_STREAM]
     validate_args(args, log)
 
-    with open(args[1], 'r') as f:
-        document = f.read()
-
     uri = get_client_uri()
     log.info("Querying %s...", uri)
 
@@ -34,15 +38,29 @@ def summarize(args: list=sys.argv) -> None:
         "x-pub-key": keypair[0],
         "x-api-key": keypair[1],
     }
+    encoding = normalize_encoding(get_client_compression())
+    if encoding != ENCODING_IDENTITY:
+        headers["Content-Encoding"] = encoding
+
+    if is_batch_path(args[1]):
+        summarize_batch(uri, collect_batch_paths(args[1]), encoding, headers, log)
+        return
 
-    json_query = {
+    params = {
         "client": get_client_user_agent(),
-        "document": document
+        "timeout": get_client_timeout()
     }
+    headers["Content-Type"] = f"{TEXT_MIMETYPE}; charset=utf-8"
+    body = iter_compressed(iter_file_blocks(args[1]), encoding)
+
+    if stream:
+        summarize_streaming(uri, body, params, headers, log)
+        return
 
     r = requests.post(
         uri,
-        json=json_query,
+        data=body,
+        params=params,
         headers=headers,
         timeout=get_client_timeout()
     )
@@ -56,6 +74,156 @@ def summarize(args: list=sys.argv) -> None:
         json_dumper(r.json())
     )
 
+def summarize_streaming(uri: str, body, params: dict, headers: dict, log: Logger) -> None:
+    """Summarizes a document on the streaming endpoint, rendering progress and the final summary as it is generated.
+
+    Progress is logged, and the final summary text is written to stderr as it arrives, leaving the
+    response data on stdout.
+
+    Args:
+        uri (str): The summarize endpoint URI.
+        body (Iterator[bytes]): The document upload.
+        params (dict): The request options.
+        headers (dict): The request headers.
+        log (Logger): The logger to use.
+    """
+    with requests.post(
+        f"{uri}/stream",
+        data=body,
+        params=params,
+        headers=headers,
+        timeout=get_client_timeout(),
+        stream=True
+    ) as r:
+        if r.status_code != 200:
+            log.error("Failed to summarize document:")
+            log.error(r.text)
+            sys.exit(1)
+
+        for event, data in iter_events(r.iter_lines(decode_unicode=True)):
+            if event == EVENT_TOKEN:
+                sys.stderr.write(data['text'])
+                sys.stderr.flush()
+            elif event == EVENT_RESULT:
+                sys.stderr.write("\n")
+                if 'error' in data:
+                    log.error("Failed to summarize document: %s", data['error'])
+                    sys.exit(1)
+                print(json_dumper(data))
+                return
+            elif event == EVENT_ERROR:
+                log.error("Failed to summarize document: %s", data['error'])
+                sys.exit(1)
+            else:
+                log_progress(event, data, log)
+
+    log.error("Stream ended without a result.")
+    sys.exit(1)
+
+def summarize_batch(uri: str, paths: list, encoding: str, headers: dict, log: Logger) -> None:
+    """Summarizes many documents on the batch endpoint, writing each result to stdout as a line of NDJSON.
+
+    The documents are uploaded as a multipart form, each file read and compressed block by block
+    as it is sent.
+
+    Args:
+        uri (str): The summarize endpoint URI.
+        paths (list): The paths of the documents.
+        encoding (str): The compression of the upload.
+        headers (dict): The request headers.
+        log (Logger): The logger to use.
+    """
+    log.info("Summarizing %d documents...", len(paths))
+    content_type, body = iter_multipart_files(paths, 'document', encoding)
+    # Each file part carries its own compression, rather than the body as a whole.
+    headers = {name: value for name, value in headers.items() if name != "Content-Encoding"}
+    headers["Content-Type"] = content_type
+    completed, failed = 0, 0
+    with requests.post(
+        f"{uri}/batch",
+        data=body,
+        params={"client": get_client_user_agent()},
+        headers=headers,
+        timeout=get_client_timeout(),
+        stream=True
+    ) as r:
+        if r.status_code != 200:
+            log.error("Failed to summarize documents:")
+            log.error(r.text)
+            sys.exit(1)
+
+        # NDJSON has no default charset, so requests would otherwise yield the lines as bytes.
+        r.encoding = 'utf-8'
+        for line in r.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            result = json.loads(line)
+            completed += 1
+            if result['status'] != 200:
+                failed += 1
+                log.error("Failed to summarize %s: %s", result['id'], result['result'].get('error'))
+            else:
+                log.info("Summarized %s (%d/%d).", result['id'], completed, len(paths))
+            print(line, flush=True)
+
+    if completed < len(paths):
+        log.error("Batch ended after %d of %d documents.", completed, len(paths))
+        sys.exit(1)
+    if failed:
+        log.error("Failed to summarize %d of %d documents.", failed, len(paths))
+        sys.exit(1)
+
+def is_batch_path(path: str) -> bool:
+    """Checks whether a path names many documents, as a directory or glob pattern.
+
+    Args:
+        path (str): The path.
+
+    Returns:
+        bool: Whether the path names many documents.
+    """
+    return os.path.isdir(path) or glob.has_magic(path)
+
+def collect_batch_paths(path: str) -> list:
+    """Gets the documents named by a directory or glob pattern.
+
+    Args:
+        path (str): The directory or glob pattern.
+
+    Returns:
+        list: The paths of the documents, sorted.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, '*')
+    return sorted(p for p in glob.glob(path, recursive=True) if os.path.isfile(p))
+
+def log_progress(event: str, progress: dict, log: Logger) -> None:
+    """Logs a pipeline progress event.
+
+    Args:
+        event (str): The event name.
+        progress (dict): The pipeline progress.
+        log (Logger): The logger to use.
+    """
+    if event == 'chunked':
+        log.info("Chunked document into %d chunks.", progress['chunks_total'])
+    elif event == 'chunk_completed':
+        log.info(
+            "Pass %d: %d/%d chunks %s.",
+            progress['pass'],
+            progress['chunks_completed'],
+            progress['chunks_total'],
+            "compressed" if progress['stage'] == 'compressing' else "summarized"
+        )
+    elif event == 'resummarizing':
+        log.info("Summary too long, resummarizing (pass %d)...", progress['pass'])
+    elif event == 'compressing':
+        log.info("Summary slightly too long, compressing %d sections...", progress['chunks_total'])
+    elif event == 'finalizing':
+        log.info("Writing final summary...")
+    else:
+        log.info("%s...", event.capitalize())
+
 def validate_args(args: list, log: Logger) -> None:
     """Validates the arguments for the command and exits if invalid.
 
@@ -75,6 +243,13 @@ def validate_args(args: list, log: Logger) -> None:
         log_usage(log)
         sys.exit(1)
     
+    if is_batch_path(args[1]):
+        if not collect_batch_paths(args[1]):
+            log.warning("No files match the provided path")
+            log_usage(log)
+            sys.exit(1)
+        return
+
     # does the file exist at the provided path?
     if not os.path.exists(args[1]):
         log.warning("File does not exist")
@@ -87,4 +262,4 @@ def log_usage(log: Logger) -> None:
     Args:
         log (Logger): The logger to use.
     """
-    log.warning("Usage: poetry run %s <filepath>", CMD_STRING)
+    log.warning("Usage: poetry run %s <filepath|directory|glob> [%s]", CMD_STRING, FLAG_STREAM)
@@ -0,0 +1,249 @@
+"""Provides an in-process queue of summarization jobs for the API server."""
+import queue
+import threading
+
+from logging import Logger
+from typing import Callable
+
+from tyrell.core.store import ResponseStore
+from tyrell.core.time import cur_timestamp
+from tyrell.core.utils import gen_uuid
+from tyrell.llm.context import PipelineContext
+
+JOB_STATUS_QUEUED = 'queued'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_COMPLETE = 'complete'
+JOB_STATUS_FAILED = 'failed'
+JOB_STATUS_CANCELLED = 'cancelled'
+JOB_FINISHED_STATUSES = (JOB_STATUS_COMPLETE, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED)
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted to a queue that is already at its maximum depth."""
+
+class Job:
+    """A document waiting for, or undergoing, summarization.
+
+    Args:
+        document (str): The document to summarize, as text or a SpooledDocument upload.
+        options (dict): The summarization options of the request.
+
+    Attributes:
+        context (PipelineContext): The context tracking the progress of the job.
+        document (str): The document to summarize, as text or a SpooledDocument upload, released once the job has run.
+        error (str): The error the job failed with, if any.
+        finished_at (float): The timestamp the job finished.
+        id (str): The job ID.
+        options (dict): The summarization options of the request.
+        response_id (str): The ID of the response in the response store.
+        response_store (ResponseStore): The store the response was written to.
+        result (dict): The response data, once the job has finished, if it is not in the response store.
+        started_at (float): The timestamp the job started running.
+        status (str): The job status.
+        submitted_at (float): The timestamp the job was submitted.
+    """
+
+    def __init__(self, document: str, options: dict) -> None:
+        self.context = PipelineContext()
+        self.document = document
+        self.error = None
+        self.finished_at = None
+        self.id = gen_uuid()
+        self.options = options
+        self.response_id = None
+        self.response_store = None
+        self.result = None
+        self.started_at = None
+        self.status = JOB_STATUS_QUEUED
+        self.submitted_at = cur_timestamp()
+
+    def to_dict(self) -> dict:
+        """Describes the job, including its result if it has finished.
+
+        Returns:
+            dict: The job description.
+        """
+        job = {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.context.snapshot(),
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error is not None:
+            job['error'] = self.error
+        if self.status in JOB_FINISHED_STATUSES:
+            job['result'] = self.load_result()
+        return job
+
+    def load_result(self) -> dict:
+        """Gets the response data, reading it back from the response store if it is not held in memory.
+
+        Returns:
+            dict: The response data.
+        """
+        if self.result is None and self.response_id is not None:
+            return self.response_store.get(self.response_id)
+        return self.result
+
+class JobQueue:
+    """Runs submitted jobs on background workers.
+
+    Args:
+        log (Logger): The logger for the queue.
+        runner (Callable): Runs a job, returning its response data and its ID in the response store.
+        max_depth (int): The maximum number of jobs waiting to run.
+        retention (int): Seconds to keep finished jobs before forgetting them.
+        workers (int): The number of jobs to run at once.
+        response_store (ResponseStore): The store the runner writes responses to, if any.
+
+    Attributes:
+        log (Logger): The logger for the queue.
+        max_depth (int): The maximum number of jobs waiting to run.
+        response_store (ResponseStore): The store the runner writes responses to, if any.
+        retention (int): Seconds to keep finished jobs before forgetting them.
+        workers (int): The number of jobs to run at once.
+    """
+
+    def __init__(self, log: Logger, runner: Callable[[Job], tuple], max_depth: int, retention: int, workers: int=1, response_store: ResponseStore=None) -> None:
+        self.log = log
+        self.max_depth = max_depth
+        self.response_store = response_store
+        self.retention = retention
+        self.runner = runner
+        self.workers = workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._workers = []
+
+    def start(self) -> None:
+        """Starts the background workers."""
+        if self._workers:
+            return
+        for i in range(self.workers):
+            worker = threading.Thread(target=self._work, name=f'tyrell-job-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, document: str, options: dict) -> Job:
+        """Queues a document for summarization.
+
+        Args:
+            document (str): The document to summarize, as text or a SpooledDocument upload.
+            options (dict): The summarization options of the request.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            JobQueueFull: If the queue is at its maximum depth.
+        """
+        self._forget_expired()
+        job = Job(document, options)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full as e:
+                raise JobQueueFull(f"Job queue is full ({self.max_depth} jobs waiting).") from e
+            self._jobs[job.id] = job
+        self.log.info("Queued job %s.", job.id)
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """Gets a job by its ID.
+
+        Args:
+            job_id (str): The job ID.
+
+        Returns:
+            Job: The job, or None if it is unknown or has expired.
+        """
+        self._forget_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self) -> dict:
+        """Reports the depth of the queue.
+
+        Returns:
+            dict: The queue status.
+        """
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "max_depth": self.max_depth,
+            "queued": statuses.count(JOB_STATUS_QUEUED),
+            "running": statuses.count(JOB_STATUS_RUNNING),
+            "complete": statuses.count(JOB_STATUS_COMPLETE),
+            "failed": statuses.count(JOB_STATUS_FAILED),
+            "cancelled": statuses.count(JOB_STATUS_CANCELLED),
+        }
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancels a job. A queued job is dropped, a running job stops at its next cancellation check.
+
+        Args:
+            job_id (str): The job ID.
+
+        Returns:
+            Job: The job, or None if it is unknown or has expired.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            if job.status == JOB_STATUS_QUEUED:
+                job.status = JOB_STATUS_CANCELLED
+                job.document = None
+                job.finished_at = cur_timestamp()
+                self.log.info("Cancelled queued job %s.", job.id)
+        if job.status == JOB_STATUS_RUNNING:
+            job.context.cancel()
+            self.log.info("Cancelling running job %s...", job.id)
+        return job
+
+    def _work(self) -> None:
+        """Runs queued jobs, one after another, forever."""
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.status == JOB_STATUS_CANCELLED:
+                    self._queue.task_done()
+                    continue
+                job.status = JOB_STATUS_RUNNING
+            job.started_at = cur_timestamp()
+            self.log.info("Running job %s...", job.id)
+            try:
+                result, response_id = self.runner(job)
+                if response_id is None or self.response_store is None:
+                    job.result = result
+                else:
+                    job.response_store = self.response_store
+                job.response_id = response_id
+                job.error = result.get('error')
+                if 'cancelled' in result:
+                    status = JOB_STATUS_CANCELLED
+                else:
+                    status = JOB_STATUS_FAILED if job.error is not None else JOB_STATUS_COMPLETE
+            except Exception as e:
+                self.log.exception("Job %s failed.", job.id)
+                job.error = str(e)
+                status = JOB_STATUS_FAILED
+            job.document = None
+            job.finished_at = cur_timestamp()
+            # The status is published last, so that a finished job can always load its result.
+            with self._lock:
+                job.status = status
+            self._queue.task_done()
+
+    def _forget_expired(self) -> None:
+        """Forgets finished jobs older than the retention period."""
+        now = cur_timestamp()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and now - job.finished_at > self.retention
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,167 @@
+"""Provides the Prometheus metrics of the API server.
+
+Process metrics, including resident memory, are exported by the default collectors of the client library.
+"""
+import torch
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+from tyrell.interfaces.jobs import JobQueue, JOB_STATUS_QUEUED, JOB_STATUS_RUNNING
+from tyrell.interfaces.scheduler import PRIORITIES, Scheduler
+from tyrell.llm.timings import rate
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+LOAD_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+INFERENCE_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200)
+REQUEST_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+GPU_LOCK_WAIT = Histogram(
+    'tyrell_gpu_lock_wait_seconds',
+    'Time requests spent waiting for a scheduler slot.',
+    buckets=WAIT_BUCKETS
+)
+MODEL_LOAD = Histogram(
+    'tyrell_llm_model_load_seconds',
+    'Time spent loading the resident LLM for a request, when it was not already loaded.',
+    buckets=LOAD_BUCKETS
+)
+REQUEST_TIME = Histogram(
+    'tyrell_request_seconds',
+    'Total time taken to answer summarization requests.',
+    buckets=REQUEST_BUCKETS
+)
+INFERENCE_TIME = Histogram(
+    'tyrell_llm_inference_seconds',
+    'Latency of individual LLM calls.',
+    ['chain'],
+    buckets=INFERENCE_BUCKETS
+)
+PROMPT_EVAL_TIME = Histogram(
+    'tyrell_llm_prompt_eval_seconds',
+    'Time individual LLM calls spent evaluating the prompt, as reported by llama.cpp.',
+    ['chain'],
+    buckets=INFERENCE_BUCKETS
+)
+GENERATION_TIME = Histogram(
+    'tyrell_llm_generation_seconds',
+    'Time individual LLM calls spent generating the response, as reported by llama.cpp.',
+    ['chain'],
+    buckets=INFERENCE_BUCKETS
+)
+TOKEN_RATE = Histogram(
+    'tyrell_llm_tokens_per_second',
+    'Prompt tokens read and response tokens generated per second of each LLM call.',
+    ['chain', 'direction'],
+    buckets=TOKEN_RATE_BUCKETS
+)
+TOKENS = Counter(
+    'tyrell_llm_tokens',
+    'Prompt tokens read and response tokens generated by LLM calls.',
+    ['chain', 'direction']
+)
+REQUESTS = Counter(
+    'tyrell_requests',
+    'Summarization requests answered, by HTTP status and whether they were served from the summary cache.',
+    ['status', 'cached']
+)
+PASSES = Counter(
+    'tyrell_summary_passes',
+    'Extra passes run to shrink oversized summaries, by method.',
+    ['method']
+)
+QUEUE_DEPTH = Gauge(
+    'tyrell_scheduler_queue_depth',
+    'Requests waiting for a scheduler slot, by priority class.',
+    ['priority']
+)
+BUSY_SLOTS = Gauge(
+    'tyrell_scheduler_busy_slots',
+    'Scheduler slots currently granted to a request.'
+)
+JOBS = Gauge(
+    'tyrell_jobs',
+    'Jobs in the job queue, by status.',
+    ['status']
+)
+VRAM_USED = Gauge(
+    'tyrell_gpu_memory_used_bytes',
+    'Memory in use on each GPU, by any process.',
+    ['device']
+)
+VRAM_TOTAL = Gauge(
+    'tyrell_gpu_memory_total_bytes',
+    'Total memory of each GPU.',
+    ['device']
+)
+
+PASS_METHODS = ('full-resummary', 'compression', 'tree-reduce')
+
+def install_gauges(scheduler: Scheduler, job_queue: JobQueue) -> None:
+    """Points the gauges at the live state they report, read whenever the metrics are collected.
+
+    Args:
+        scheduler (Scheduler): The scheduler.
+        job_queue (JobQueue): The job queue.
+    """
+    for priority in PRIORITIES:
+        QUEUE_DEPTH.labels(priority).set_function(lambda priority=priority: scheduler.queue_depth(priority))
+    BUSY_SLOTS.set_function(lambda: sum(slot.busy for slot in scheduler.slots))
+    for status in (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING):
+        JOBS.labels(status).set_function(lambda status=status: job_queue.status()[status])
+
+def observe_llm_call(chain_name: str, timings: dict) -> None:
+    """Records the latency and token throughput of an LLM call.
+
+    Args:
+        chain_name (str): The name of the chain.
+        timings (dict): The call timings, with the number of prompt tokens filled in.
+    """
+    INFERENCE_TIME.labels(chain_name).observe(timings['total_time'])
+    TOKENS.labels(chain_name, 'in').inc(timings['prompt_tokens'])
+    TOKENS.labels(chain_name, 'out').inc(timings['generated_tokens'])
+    if timings['prompt_eval_time'] is not None:
+        PROMPT_EVAL_TIME.labels(chain_name).observe(timings['prompt_eval_time'])
+        GENERATION_TIME.labels(chain_name).observe(timings['generation_time'])
+    prompt_rate = rate(timings['prompt_tokens'], timings['prompt_eval_time'] or timings['total_time'])
+    generated_rate = rate(timings['generated_tokens'], timings['generation_time'] or timings['total_time'])
+    if prompt_rate is not None:
+        TOKEN_RATE.labels(chain_name, 'in').observe(prompt_rate)
+    if generated_rate is not None:
+        TOKEN_RATE.labels(chain_name, 'out').observe(generated_rate)
+
+def observe_summary(summary: dict, status: int, cache_hit: bool) -> None:
+    """Records the stage timings and passes of an answered summarization request.
+
+    Args:
+        summary (dict): The response data.
+        status (int): The HTTP status of the response.
+        cache_hit (bool): Whether the summary was served from the cache.
+    """
+    REQUESTS.labels(str(status), str(cache_hit).lower()).inc()
+    if 'total_request_time' in summary:
+        REQUEST_TIME.observe(summary['total_request_time'])
+    if cache_hit:
+        return
+    if 'gpu_lock_wait_time' in summary:
+        GPU_LOCK_WAIT.observe(summary['gpu_lock_wait_time'])
+    if summary.get('llm_model_load_time'):
+        MODEL_LOAD.observe(summary['llm_model_load_time'])
+    for method in summary.get('inference_methods', []):
+        if method in PASS_METHODS:
+            PASSES.labels(method).inc()
+
+def render_metrics() -> bytes:
+    """Renders the metrics in the Prometheus text exposition format, refreshing the GPU memory gauges.
+
+    Returns:
+        bytes: The metrics.
+    """
+    if torch.cuda.is_available():
+        for device in range(torch.cuda.device_count()):
+            free, total = torch.cuda.mem_get_info(device)
+            VRAM_USED.labels(str(device)).set(total - free)
+            VRAM_TOTAL.labels(str(device)).set(total)
+    return generate_latest()
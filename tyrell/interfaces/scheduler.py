@@ -0,0 +1,311 @@
+"""Provides a priority-aware scheduler that hands out GPU/CPU slots to summarization requests."""
+import math
+import threading
+
+from collections import deque
+from contextlib import contextmanager
+from logging import Logger
+from typing import Callable
+
+from filelock import FileLock
+
+from tyrell.core.time import cur_timestamp, time_since
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BATCH = 'batch'
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+
+SERVICE_TIME_SMOOTHING = 0.2
+CANCELLATION_POLL_INTERVAL = 1.0
+
+class SchedulerFull(Exception):
+    """Raised when a request arrives while the scheduler queue is already at its maximum depth.
+
+    Args:
+        message (str): The error message.
+        retry_after (int): The suggested number of seconds to wait before retrying.
+    """
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class Slot:
+    """A unit of inference capacity, such as a GPU, that runs one request at a time.
+
+    Args:
+        name (str): The name of the slot.
+        lock_file (str): The path of a lockfile shared with other processes using the same device, if any.
+
+    Attributes:
+        busy (bool): Whether the slot has been granted to a request.
+        lock (FileLock): The lock shared with other processes, if any.
+        name (str): The name of the slot.
+    """
+
+    def __init__(self, name: str, lock_file: str=None) -> None:
+        self.busy = False
+        self.lock = FileLock(lock_file) if lock_file else None
+        self.name = name
+
+class Ticket:
+    """A request waiting for a slot.
+
+    Args:
+        client (str): The client that made the request.
+        priority (str): The priority class of the request.
+
+    Attributes:
+        client (str): The client that made the request.
+        priority (str): The priority class of the request.
+        slot (Slot): The slot granted to the request, once granted.
+        submitted_at (float): The timestamp the request started waiting.
+    """
+
+    def __init__(self, client: str, priority: str) -> None:
+        self.client = client
+        self.priority = priority
+        self.slot = None
+        self.submitted_at = cur_timestamp()
+
+class Scheduler:
+    """Grants slots to waiting requests by priority class, then round-robin between clients.
+
+    Args:
+        log (Logger): The logger for the scheduler.
+        slots (list): The slots to schedule requests on.
+        max_queue_depth (int): The maximum number of requests waiting for a slot.
+        interactive_max_chars (int): The longest document, in characters, treated as interactive by default.
+        min_retry_after (int): The smallest retry hint, in seconds, given to rejected requests.
+
+    Attributes:
+        interactive_max_chars (int): The longest document, in characters, treated as interactive by default.
+        log (Logger): The logger for the scheduler.
+        max_queue_depth (int): The maximum number of requests waiting for a slot.
+        min_retry_after (int): The smallest retry hint, in seconds, given to rejected requests.
+        slots (list): The slots to schedule requests on.
+    """
+
+    def __init__(self, log: Logger, slots: list, max_queue_depth: int, interactive_max_chars: int, min_retry_after: int) -> None:
+        self.interactive_max_chars = interactive_max_chars
+        self.log = log
+        self.max_queue_depth = max_queue_depth
+        self.min_retry_after = min_retry_after
+        self.slots = slots
+        self._condition = threading.Condition()
+        self._draining = False
+        self._last_client = {priority: None for priority in PRIORITIES}
+        self._mean_service_time = None
+        self._waiting = {priority: {} for priority in PRIORITIES}
+
+    def classify(self, document: str, requested_priority: str=None) -> str:
+        """Gets the priority class of a request.
+
+        Args:
+            document (str): The document to summarize.
+            requested_priority (str): The priority class the client asked for, if any.
+
+        Returns:
+            str: The priority class.
+        """
+        if requested_priority in PRIORITIES:
+            return requested_priority
+        if len(document or '') <= self.interactive_max_chars:
+            return PRIORITY_INTERACTIVE
+        return PRIORITY_BATCH
+
+    @contextmanager
+    def acquire(self, client: str, priority: str, admit: bool=True, check: Callable[[], None]=None):
+        """Waits for a slot and holds it for the duration of the context.
+
+        Args:
+            client (str): The client that made the request.
+            priority (str): The priority class of the request.
+            admit (bool): Whether to apply admission control. Requests already admitted elsewhere, such as queued jobs, skip it.
+            check (Callable): Called periodically while waiting, raising to give up the wait, if given.
+
+        Yields:
+            tuple: The granted slot and the time spent waiting for it.
+
+        Raises:
+            SchedulerFull: If admission control is applied and the queue is full.
+        """
+        ticket = Ticket(client, priority)
+        with self._condition:
+            if admit:
+                self._check_admission()
+            self._waiting[priority].setdefault(client, deque()).append(ticket)
+            self._dispatch()
+            while ticket.slot is None:
+                self._condition.wait(CANCELLATION_POLL_INTERVAL if check is not None else None)
+                if ticket.slot is None and check is not None:
+                    try:
+                        check()
+                    except Exception:
+                        self._withdraw(ticket)
+                        raise
+
+        slot = ticket.slot
+        try:
+            if slot.lock is not None:
+                slot.lock.acquire()
+            wait_time = time_since(ticket.submitted_at)
+            self.log.info("Slot %s granted to %s %s request after %s seconds.", slot.name, priority, client, wait_time)
+            service_start = cur_timestamp()
+            try:
+                yield slot, wait_time
+            finally:
+                if slot.lock is not None:
+                    slot.lock.release()
+                self._record_service_time(time_since(service_start))
+        finally:
+            with self._condition:
+                slot.busy = False
+                self._dispatch()
+
+    def admit(self) -> None:
+        """Applies admission control ahead of a later acquire that skips it.
+
+        Raises:
+            SchedulerFull: If the queue is full.
+        """
+        with self._condition:
+            self._check_admission()
+
+    @contextmanager
+    def exclusive(self):
+        """Waits for every slot to be released, then holds them all for the duration of the context."""
+        with self._condition:
+            while self._draining:
+                self._condition.wait()
+            self._draining = True
+            while any(slot.busy for slot in self.slots):
+                self._condition.wait()
+            for slot in self.slots:
+                slot.busy = True
+        try:
+            for slot in self.slots:
+                if slot.lock is not None:
+                    slot.lock.acquire()
+            try:
+                yield
+            finally:
+                for slot in self.slots:
+                    if slot.lock is not None:
+                        slot.lock.release()
+        finally:
+            with self._condition:
+                for slot in self.slots:
+                    slot.busy = False
+                self._draining = False
+                self._dispatch()
+
+    def queue_depth(self, priority: str=None) -> int:
+        """Counts the requests waiting for a slot.
+
+        Args:
+            priority (str): Only count requests of this priority class.
+
+        Returns:
+            int: The number of waiting requests.
+        """
+        priorities = PRIORITIES if priority is None else (priority,)
+        return sum(len(tickets) for p in priorities for tickets in self._waiting[p].values())
+
+    def retry_after(self) -> int:
+        """Estimates how long a rejected request should wait before retrying.
+
+        Returns:
+            int: The suggested number of seconds to wait.
+        """
+        if self._mean_service_time is None:
+            return self.min_retry_after
+        estimate = self._mean_service_time * (self.queue_depth() + 1) / len(self.slots)
+        return max(self.min_retry_after, math.ceil(estimate))
+
+    def status(self) -> dict:
+        """Reports the state of the slots and queue.
+
+        Returns:
+            dict: The scheduler state.
+        """
+        with self._condition:
+            return {
+                "slots": [{"name": slot.name, "busy": slot.busy} for slot in self.slots],
+                "queue_depth": {priority: self.queue_depth(priority) for priority in PRIORITIES},
+                "max_queue_depth": self.max_queue_depth,
+                "mean_service_time": self._mean_service_time,
+            }
+
+    def _check_admission(self) -> None:
+        """Rejects a request if the queue is full. Must be called holding the condition.
+
+        Raises:
+            SchedulerFull: If the queue is full.
+        """
+        if self.queue_depth() >= self.max_queue_depth:
+            raise SchedulerFull(
+                f"Scheduler queue is full ({self.max_queue_depth} requests waiting).",
+                self.retry_after()
+            )
+
+    def _dispatch(self) -> None:
+        """Grants free slots to the next waiting requests. Must be called holding the condition."""
+        if self._draining:
+            return
+        for slot in self.slots:
+            if slot.busy:
+                continue
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            slot.busy = True
+            ticket.slot = slot
+        self._condition.notify_all()
+
+    def _withdraw(self, ticket: Ticket) -> None:
+        """Removes a ticket that is no longer waiting for a slot. Must be called holding the condition.
+
+        Args:
+            ticket (Ticket): The ticket.
+        """
+        tickets = self._waiting[ticket.priority].get(ticket.client)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del self._waiting[ticket.priority][ticket.client]
+
+    def _next_ticket(self) -> Ticket:
+        """Takes the next ticket, from the highest priority class with waiting requests, rotating between its clients.
+
+        Returns:
+            Ticket: The next ticket, or None if nothing is waiting.
+        """
+        for priority in PRIORITIES:
+            waiting = self._waiting[priority]
+            if not waiting:
+                continue
+            clients = list(waiting)
+            last_client = self._last_client[priority]
+            next_index = clients.index(last_client) + 1 if last_client in waiting else 0
+            client = clients[next_index % len(clients)]
+
+            tickets = waiting[client]
+            ticket = tickets.popleft()
+            if not tickets:
+                del waiting[client]
+            self._last_client[priority] = client
+            return ticket
+        return None
+
+    def _record_service_time(self, service_time: float) -> None:
+        """Updates the smoothed mean time a request holds a slot.
+
+        Args:
+            service_time (float): The time the latest request held its slot.
+        """
+        with self._condition:
+            if self._mean_service_time is None:
+                self._mean_service_time = service_time
+            else:
+                self._mean_service_time += SERVICE_TIME_SMOOTHING * (service_time - self._mean_service_time)
@@ -0,0 +1,46 @@
+"""Provides encoding and decoding of Server-Sent Events."""
+import json
+
+from typing import Iterable, Iterator
+
+from tyrell.core import json_dumper
+
+SSE_MIMETYPE = 'text/event-stream'
+
+EVENT_TOKEN = 'token'
+EVENT_RESULT = 'result'
+EVENT_ERROR = 'error'
+
+def format_event(event: str, data: dict) -> str:
+    """Encodes an event for an SSE stream.
+
+    Args:
+        event (str): The event name.
+        data (dict): The event data.
+
+    Returns:
+        str: The encoded event.
+    """
+    return f"event: {event}\ndata: {json_dumper(data, pretty=False)}\n\n"
+
+def iter_events(lines: Iterable[str]) -> Iterator[tuple]:
+    """Decodes the events of an SSE stream.
+
+    Args:
+        lines (Iterable): The lines of the stream, without line endings.
+
+    Yields:
+        tuple: The event name and the decoded event data.
+    """
+    event, data = 'message', []
+    for line in lines:
+        if line == '':
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = 'message', []
+        elif line.startswith(':'):
+            continue
+        elif line.startswith('event:'):
+            event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            data.append(line[len('data:'):].lstrip())
@@ -0,0 +1,251 @@
+"""Provides the streamed, optionally compressed, document uploads between the client and the API."""
+import codecs
+import gzip
+import hashlib
+import tempfile
+import uuid
+import zlib
+
+from typing import BinaryIO, Iterator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TEXT_MIMETYPE = 'text/plain'
+MULTIPART_MIMETYPE = 'multipart/form-data'
+ENCODING_IDENTITY = 'identity'
+ENCODING_GZIP = 'gzip'
+ENCODING_ZSTD = 'zstd'
+ENCODINGS = (ENCODING_IDENTITY, ENCODING_GZIP, ENCODING_ZSTD)
+ENCODING_MIMETYPES = {
+    'application/gzip': ENCODING_GZIP,
+    'application/x-gzip': ENCODING_GZIP,
+    'application/zstd': ENCODING_ZSTD,
+}
+READ_BLOCK_BYTES = 1048576
+SPOOL_MEMORY_BYTES = 8388608
+DECOMPRESSION_ERRORS = (EOFError, OSError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+class DocumentTooLarge(Exception):
+    """Raised when an uploaded document decompresses to more than the allowed size.
+
+    Args:
+        max_bytes (int): The allowed size of a document, in bytes.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(f"Document exceeds {max_bytes} bytes.")
+        self.max_bytes = max_bytes
+
+class SpooledDocument:
+    """An uploaded document, decoded into a temporary file as it is read.
+
+    The text is hashed and measured on the way through, so that the document can be classified and
+    looked up in the summary cache without holding its text, then read back piece by piece by the
+    chunker. Documents of up to SPOOL_MEMORY_BYTES are kept in memory.
+
+    Args:
+        pieces (Iterator[str]): The text of the document, piece by piece.
+
+    Attributes:
+        hash (str): The SHA-256 hex digest of the text, as hash_text computes it.
+        length (int): The length of the text, in characters.
+
+    Raises:
+        ValueError: If the upload is not validly compressed.
+        DocumentTooLarge: If the upload decompresses to more than its allowed size.
+    """
+
+    def __init__(self, pieces: Iterator[str]) -> None:
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+        digest = hashlib.sha256()
+        self.length = 0
+        try:
+            for piece in pieces:
+                data = piece.encode('utf-8')
+                digest.update(data)
+                self._file.write(data)
+                self.length += len(piece)
+        except BaseException:
+            self._file.close()
+            raise
+        self.hash = digest.hexdigest()
+
+    def __len__(self) -> int:
+        return self.length
+
+    def iter_text(self) -> Iterator[str]:
+        """Reads the text of the document back, piece by piece.
+
+        Yields:
+            str: The text of the document, piece by piece.
+        """
+        self._file.seek(0)
+        yield from iter_document_text(self._file)
+
+    def close(self) -> None:
+        """Deletes the temporary file."""
+        self._file.close()
+
+def normalize_encoding(encoding: str) -> str:
+    """Normalizes a Content-Encoding header or compression setting.
+
+    Args:
+        encoding (str): The encoding, or None or 'none' for no compression.
+
+    Returns:
+        str: One of ENCODINGS.
+
+    Raises:
+        ValueError: If the encoding is unknown, or zstd is requested without the zstandard package.
+    """
+    encoding = (encoding or ENCODING_IDENTITY).strip().lower()
+    if encoding in ('', 'none'):
+        encoding = ENCODING_IDENTITY
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unsupported content encoding '{encoding}'.")
+    if encoding == ENCODING_ZSTD and zstandard is None:
+        raise ValueError("zstd content encoding requires the zstandard package.")
+    return encoding
+
+def iter_document_text(stream: BinaryIO, encoding: str=None, max_bytes: int=None) -> Iterator[str]:
+    """Reads an uploaded document block by block, decompressing and decoding it as UTF-8.
+
+    Only one block of the compressed and decompressed body is held at a time, so that no copy
+    of the upload is made beyond the text itself.
+
+    Args:
+        stream (BinaryIO): The request body.
+        encoding (str): The content encoding of the body, one of ENCODINGS.
+        max_bytes (int): The maximum decompressed size of the document, or None for no limit.
+
+    Yields:
+        str: The text of the document, piece by piece.
+
+    Raises:
+        ValueError: If the encoding is unsupported, or the body is not validly compressed.
+        DocumentTooLarge: If the document decompresses to more than max_bytes.
+    """
+    encoding = normalize_encoding(encoding)
+    if encoding == ENCODING_GZIP:
+        reader = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif encoding == ENCODING_ZSTD:
+        reader = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    else:
+        reader = stream
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    total_bytes = 0
+    while True:
+        try:
+            block = reader.read(READ_BLOCK_BYTES)
+        except DECOMPRESSION_ERRORS as e:
+            raise ValueError(f"Invalid {encoding} body: {e}") from e
+        if not block:
+            break
+        total_bytes += len(block)
+        if max_bytes is not None and total_bytes > max_bytes:
+            raise DocumentTooLarge(max_bytes)
+        text = decoder.decode(block)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+def read_document(stream: BinaryIO, encoding: str=None, max_bytes: int=None) -> str:
+    """Reads an uploaded document, decompressing and decoding it as UTF-8.
+
+    Args:
+        stream (BinaryIO): The request body.
+        encoding (str): The content encoding of the body, one of ENCODINGS.
+        max_bytes (int): The maximum decompressed size of the document, or None for no limit.
+
+    Returns:
+        str: The text of the document.
+
+    Raises:
+        ValueError: If the encoding is unsupported, or the body is not validly compressed.
+        DocumentTooLarge: If the document decompresses to more than max_bytes.
+    """
+    return "".join(iter_document_text(stream, encoding, max_bytes))
+
+def iter_compressed(blocks: Iterator[bytes], encoding: str=None) -> Iterator[bytes]:
+    """Compresses a body block by block for a chunked upload.
+
+    Args:
+        blocks (Iterator[bytes]): The blocks of the body.
+        encoding (str): The content encoding to compress with, one of ENCODINGS.
+
+    Yields:
+        bytes: The compressed body, block by block.
+
+    Raises:
+        ValueError: If the encoding is unsupported.
+    """
+    encoding = normalize_encoding(encoding)
+    if encoding == ENCODING_IDENTITY:
+        yield from blocks
+        return
+    if encoding == ENCODING_GZIP:
+        compressor = zlib.compressobj(wbits=31)
+    else:
+        compressor = zstandard.ZstdCompressor().compressobj()
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def iter_file_blocks(path: str) -> Iterator[bytes]:
+    """Reads a file block by block.
+
+    Args:
+        path (str): The path of the file.
+
+    Yields:
+        bytes: The contents of the file, block by block.
+    """
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK_BYTES)
+            if not block:
+                return
+            yield block
+
+def iter_multipart_files(paths: list, field: str, encoding: str=None) -> tuple:
+    """Writes files as a multipart form body, reading and compressing each one block by block.
+
+    Each file is compressed on its own and sent with the content type of its compression, so that
+    no file is held in memory whole.
+
+    Args:
+        paths (list): The paths of the files.
+        field (str): The name of the form field of each file.
+        encoding (str): The content encoding to compress each file with, one of ENCODINGS.
+
+    Returns:
+        tuple: The content type of the body, with its boundary, and the body, as an iterator of bytes.
+
+    Raises:
+        ValueError: If the encoding is unsupported.
+    """
+    encoding = normalize_encoding(encoding)
+    mimetype = next((mimetype for mimetype, part_encoding in ENCODING_MIMETYPES.items() if part_encoding == encoding), TEXT_MIMETYPE)
+    boundary = uuid.uuid4().hex
+
+    def iter_body() -> Iterator[bytes]:
+        for path in paths:
+            # Escaped as browsers do, since form-data headers have no other escape for these characters.
+            filename = path.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+            yield (
+                f"--{boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+                f"Content-Type: {mimetype}\r\n\r\n"
+            ).encode('utf-8')
+            yield from iter_compressed(iter_file_blocks(path), encoding)
+            yield b"\r\n"
+        yield f"--{boundary}--\r\n".encode('utf-8')
+
+    return f"{MULTIPART_MIMETYPE}; boundary={boundary}", iter_body()
@@ -1,3 +1,5 @@
-from .llm import LLM
-from .prompts import get_summarize_oneshot, get_summarize_chunk, get_summarize_final, get_compress_result
-
+from .llm import LLM, BatchedLlamaLLM, LlamaLLM, RemoteLLM, get_llm_backend
+from .prompts import get_summarize_oneshot, get_summarize_chunk, get_summarize_final, get_summarize_packed, get_compress_result, get_prompt_prefixes, get_prompt_template_versions
+from .manager import ModelManager
+from .registry import ComponentRegistry
+from .workers import ChainPool
@@ -0,0 +1,109 @@
+"""Provides the packing of short documents into shared LLM calls for batch summarization."""
+import re
+
+from datetime import datetime
+
+from tyrell.core.time import cur_timestamp, time_since
+from .context import PipelineContext
+from .summarizer import empty_response, update_response_data
+
+PACKED_SUMMARY_HEADING = re.compile(r'^\s*\**\s*Summary\s+(\d+)\s*:\**', re.MULTILINE)
+
+def pack_documents(token_lengths, max_pack_tokens, max_pack_documents):
+    """Groups documents so that short ones can be summarized together in a single LLM call.
+
+    Documents are packed greedily in order, shortest first, while the pack stays within the token
+    budget. Documents too long to share a pack are left in packs of their own.
+
+    Args:
+        token_lengths (list): The token length of each document.
+        max_pack_tokens (int): The maximum total token length of a pack.
+        max_pack_documents (int): The maximum number of documents in a pack.
+
+    Returns:
+        list: The packs, each a list of document indexes.
+    """
+    packs, pack, pack_tokens = [], [], 0
+    for index in sorted(range(len(token_lengths)), key=lambda i: token_lengths[i]):
+        token_length = token_lengths[index]
+        if pack and (pack_tokens + token_length > max_pack_tokens or len(pack) >= max_pack_documents):
+            packs.append(pack)
+            pack, pack_tokens = [], 0
+        pack.append(index)
+        pack_tokens += token_length
+    if pack:
+        packs.append(pack)
+    return packs
+
+def summarize_packed_documents(documents, chains, logger, context=None):
+    """Summarizes several short documents in a single LLM call.
+
+    Args:
+        documents (list): The documents to summarize.
+        chains (dict): The chains to use.
+        logger (Logger): The logger.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
+
+    Returns:
+        list: The response data of each document, or None if the LLM response could not be split into one summary per document.
+    """
+    if context is None:
+        context = PipelineContext()
+    num_documents = len(documents)
+
+    logger.info("Querying LLM for %d packed documents...", num_documents)
+    context.report("oneshot")
+    inference_start = cur_timestamp()
+    chain_response, _, timings = context.invoke(chains, 'summarize_packed', {
+        "date": datetime.today().strftime("%Y-%m-%d"),
+        "num_documents": num_documents,
+        "documents": write_packed_documents(documents)
+    })
+    inference_time = time_since(inference_start)
+
+    summaries = split_packed_summaries(chain_response, num_documents)
+    if summaries is None:
+        logger.warning("Could not split packed response into %d summaries: %s", num_documents, chain_response)
+        return None
+
+    responses = []
+    for summary in summaries:
+        response_data = update_response_data(empty_response(), 1, inference_time / num_documents, summary, timings)
+        response_data['packed_documents'] = num_documents
+        responses.append(response_data)
+    return responses
+
+def write_packed_documents(documents):
+    """Writes the documents of a pack into a single prompt context.
+
+    Args:
+        documents (list): The documents.
+
+    Returns:
+        str: The prompt context.
+    """
+    return "\n\n".join(
+        f"Document {i + 1}:\n{document.strip()}" for i, document in enumerate(documents)
+    )
+
+def split_packed_summaries(response, num_documents):
+    """Splits the response to a packed prompt into the summary of each document.
+
+    Args:
+        response (str): The LLM response.
+        num_documents (int): The number of documents in the pack.
+
+    Returns:
+        list: The summaries, in document order, or None if the response does not hold exactly one non-empty summary per document.
+    """
+    headings = list(PACKED_SUMMARY_HEADING.finditer(response))
+    if [int(heading.group(1)) for heading in headings] != list(range(1, num_documents + 1)):
+        return None
+    summaries = []
+    for i, heading in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(response)
+        summary = response[heading.end():end].strip()
+        if not summary:
+            return None
+        summaries.append(summary)
+    return summaries
@@ -0,0 +1,158 @@
+"""Derives the token budgets of the summarization pipeline from the model context and the rendered prompt templates."""
+from dataclasses import asdict, dataclass
+from logging import Logger
+
+from .batch import write_packed_documents
+from .prompts import get_prompt_templates
+from .summarizer import SUMMARY_MODES, SUMMARY_MODE_REFINE
+
+BUDGET_MARGIN_TOKENS = 64
+CHAIN_CONTENT_INPUTS = {
+    'summarize_oneshot': 'document',
+    'summarize_chunk': 'chunk',
+    'compress': 'original',
+    'summarize_final': 'summary',
+    'summarize_packed': 'documents',
+}
+TEMPLATE_SAMPLE_INPUTS = {
+    'date': '0000-00-00',
+    'prior_summary': '',
+    'cur_chunk_no': 9999,
+    'total_chunk_no': 9999,
+}
+
+@dataclass(frozen=True)
+class TokenBudgets:
+    """The token budgets of the summarization pipeline for a model.
+
+    Attributes:
+        n_ctx (int): The context of the model, in tokens.
+        max_response_tokens (int): The maximum tokens generated by each LLM call.
+        prompt_overheads (dict): The tokens of each rendered prompt template without its content, keyed by chain name.
+        chains (dict): The largest content that fits the context of each chain, in tokens, keyed by chain name.
+        max_chunk_token_lengths (dict): The maximum token length of a chunk, keyed by summarization mode.
+        max_final_summary_context_tokens (int): The maximum token length of the final summary context.
+        pack_max_tokens (int): The maximum total token length of a pack of batch documents.
+    """
+    n_ctx: int
+    max_response_tokens: int
+    prompt_overheads: dict
+    chains: dict
+    max_chunk_token_lengths: dict
+    max_final_summary_context_tokens: int
+    pack_max_tokens: int
+
+    def max_chunk_token_length(self, mode: str) -> int:
+        """Gets the maximum token length of a chunk for a summarization mode.
+
+        Args:
+            mode (str): The summarization mode, one of SUMMARY_MODES.
+
+        Returns:
+            int: The maximum token length of a chunk.
+        """
+        return self.max_chunk_token_lengths[mode]
+
+    def as_dict(self) -> dict:
+        """Gets the budgets as a dictionary.
+
+        Returns:
+            dict: The budgets.
+        """
+        return asdict(self)
+
+def count_prompt_tokens(tokenizer, prompt: str) -> int:
+    """Counts the tokens of a prompt as the model evaluates it, including its special tokens.
+
+    Args:
+        tokenizer (PreTrainedTokenizerFast): The tokenizer of the model.
+        prompt (str): The prompt.
+
+    Returns:
+        int: The number of tokens.
+    """
+    return len(tokenizer(prompt, add_special_tokens=True, return_attention_mask=False)['input_ids'])
+
+def measure_prompt_overheads(tokenizer, max_pack_documents: int=1) -> dict:
+    """Measures the tokens of each prompt template rendered without its content.
+
+    Numbered inputs are rendered at their widest, and the packed template with the headings of a
+    full pack, so that the overhead is never undercounted.
+
+    Args:
+        tokenizer (PreTrainedTokenizerFast): The tokenizer of the model.
+        max_pack_documents (int): The maximum number of documents in a pack.
+
+    Returns:
+        dict: The prompt overheads in tokens, keyed by chain name.
+    """
+    inputs = dict(
+        TEMPLATE_SAMPLE_INPUTS,
+        num_documents=max_pack_documents,
+        **{content: '' for content in CHAIN_CONTENT_INPUTS.values()},
+    )
+    inputs['documents'] = write_packed_documents([''] * max_pack_documents)
+    return {name: count_prompt_tokens(tokenizer, template.format(**inputs)) for name, template in get_prompt_templates().items()}
+
+def compute_token_budgets(tokenizer, n_ctx: int, max_response_tokens: int, log: Logger, max_chunk_token_length: int=None, max_final_summary_context_tokens: int=None, pack_max_tokens: int=None, max_pack_documents: int=1) -> TokenBudgets:
+    """Derives the largest chunk, final summary context and pack that fit the context of the model.
+
+    Each prompt must hold its rendered template, its content and the response generated to it,
+    with a small margin for tokens merging where the content joins the template and for the
+    separators between summaries. Refine mode also carries the prior chunk summary in each chunk
+    prompt. A chunk must fit the one-shot prompt as well, since a document of one chunk is
+    summarized in one shot. Configured limits are applied as caps on the derived budgets.
+
+    Args:
+        tokenizer (PreTrainedTokenizerFast): The tokenizer of the model.
+        n_ctx (int): The context of the model, in tokens.
+        max_response_tokens (int): The maximum tokens generated by each LLM call.
+        log (Logger): The logger to warn with when a configured limit overflows the context.
+        max_chunk_token_length (int): The configured maximum token length of a chunk, or None.
+        max_final_summary_context_tokens (int): The configured maximum token length of the final summary context, or None.
+        pack_max_tokens (int): The configured maximum total token length of a pack, or None.
+        max_pack_documents (int): The maximum number of documents in a pack.
+
+    Returns:
+        TokenBudgets: The budgets.
+
+    Raises:
+        ValueError: If the context cannot hold a prompt and its response.
+    """
+    overheads = measure_prompt_overheads(tokenizer, max_pack_documents)
+    chains = {name: n_ctx - overhead - max_response_tokens - BUDGET_MARGIN_TOKENS for name, overhead in overheads.items()}
+
+    for name, budget in chains.items():
+        if budget <= 0:
+            raise ValueError(f"An n_ctx of {n_ctx} tokens cannot hold the {name} prompt and a response of {max_response_tokens} tokens.")
+
+    max_chunk_token_lengths = {}
+    for mode in SUMMARY_MODES:
+        chunk_budget = chains['summarize_chunk'] - (max_response_tokens if mode == SUMMARY_MODE_REFINE else 0)
+        if chunk_budget <= 0:
+            raise ValueError(f"An n_ctx of {n_ctx} tokens cannot hold the {mode} chunk prompt, a prior summary and a response of {max_response_tokens} tokens.")
+        max_chunk_token_lengths[mode] = min(chunk_budget, chains['summarize_oneshot'])
+
+    final_budget = chains['summarize_final']
+    pack_budget = chains['summarize_packed']
+    if max_chunk_token_length is not None:
+        for mode, budget in max_chunk_token_lengths.items():
+            if max_chunk_token_length > budget:
+                log.warning("max_chunk_token_length of %d overflows the context in %s mode, using %d.", max_chunk_token_length, mode, budget)
+            max_chunk_token_lengths[mode] = min(max_chunk_token_length, budget)
+    if max_final_summary_context_tokens is not None:
+        if max_final_summary_context_tokens > final_budget:
+            log.warning("max_final_summary_context_tokens of %d overflows the context, using %d.", max_final_summary_context_tokens, final_budget)
+        final_budget = min(max_final_summary_context_tokens, final_budget)
+    if pack_max_tokens is not None:
+        pack_budget = min(pack_max_tokens, pack_budget)
+
+    return TokenBudgets(
+        n_ctx=n_ctx,
+        max_response_tokens=max_response_tokens,
+        prompt_overheads=overheads,
+        chains=chains,
+        max_chunk_token_lengths=max_chunk_token_lengths,
+        max_final_summary_context_tokens=final_budget,
+        pack_max_tokens=pack_budget,
+    )
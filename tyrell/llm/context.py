@@ -0,0 +1,252 @@
+"""Provides the per-document context threaded through the summarization pipeline."""
+import threading
+
+from typing import Callable
+
+from tyrell.core.cache import ChunkCache
+from tyrell.core.hashing import hash_dict
+from tyrell.core.time import cur_timestamp, time_since
+from .timings import add_call_to_usage, add_token_rates, build_call_timings, empty_usage
+
+CHUNK_CACHE_IGNORED_INPUTS = ('date',)
+EVENT_CHUNK_COMPLETED = 'chunk_completed'
+
+CANCEL_REASON_REQUESTED = 'cancelled'
+CANCEL_REASON_CLIENT_DISCONNECTED = 'client_disconnected'
+CANCEL_REASON_DEADLINE_EXCEEDED = 'deadline_exceeded'
+
+class PipelineCancelled(Exception):
+    """Raised inside the pipeline once its context has been cancelled.
+
+    Args:
+        reason (str): Why the pipeline was cancelled.
+        progress (dict): The progress of the pipeline when it was cancelled.
+    """
+
+    def __init__(self, reason: str, progress: dict) -> None:
+        super().__init__(f"Summarization cancelled: {reason}.")
+        self.progress = progress
+        self.reason = reason
+
+class PipelineContext:
+    """Tracks a single document through the summarization pipeline, and makes its LLM calls.
+
+    Args:
+        on_progress (Callable): A callback to run with the event name and a copy of the progress after each update.
+        chunk_cache (ChunkCache): The cache of individual LLM call responses, if any.
+        cache_namespace (str): A hash of the model and prompt configuration, scoping the chunk cache keys.
+        read_cache (bool): Whether to use responses already in the chunk cache, rather than only storing new ones.
+        on_token (Callable): A callback to run with each piece of text generated by streamed LLM calls.
+        deadline (float): The timestamp after which the pipeline is cancelled, if any.
+        client_disconnected (Callable): Checks whether the client that made the request has gone away, if it can be checked.
+        on_llm_call (Callable): A callback to run after each LLM call not answered from the chunk cache, with the chain name, prompt inputs, response and call timings.
+
+    Attributes:
+        cache_hits (int): The number of LLM calls answered from the chunk cache.
+        cache_misses (int): The number of LLM calls not found in the chunk cache.
+        cancel_reason (str): Why the pipeline was cancelled, or None if it has not been.
+        llm_usage (dict): The roll-up of the tokens and time spent by LLM calls not answered from the chunk cache, by chain.
+        progress (dict): The latest progress of the pipeline.
+    """
+
+    def __init__(self, on_progress: Callable[[str, dict], None]=None, chunk_cache: ChunkCache=None, cache_namespace: str='', read_cache: bool=True, on_token: Callable[[str], None]=None, deadline: float=None, client_disconnected: Callable[[], bool]=None, on_llm_call: Callable[[str, dict, str, dict], None]=None) -> None:
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_namespace = cache_namespace
+        self.cancel_reason = None
+        self.chunk_cache = chunk_cache
+        self.client_disconnected = client_disconnected
+        self.deadline = deadline
+        self.llm_usage = {}
+        self.on_llm_call = on_llm_call
+        self.on_progress = on_progress
+        self.on_token = on_token
+        self.read_cache = read_cache
+        self.progress = {
+            "stage": "queued",
+            "pass": 0,
+            "chunks_completed": 0,
+            "chunks_total": 0,
+        }
+        self._lock = threading.Lock()
+
+    def cancel(self, reason: str=CANCEL_REASON_REQUESTED) -> None:
+        """Cancels the pipeline. It stops at its next check, between or during LLM calls.
+
+        Args:
+            reason (str): Why the pipeline was cancelled.
+        """
+        with self._lock:
+            if self.cancel_reason is None:
+                self.cancel_reason = reason
+
+    def check_cancelled(self) -> None:
+        """Stops the pipeline if it has been cancelled, its deadline has passed or its client has gone away.
+
+        Raises:
+            PipelineCancelled: If the pipeline should stop.
+        """
+        if self.cancel_reason is None:
+            if self.deadline is not None and cur_timestamp() > self.deadline:
+                self.cancel(CANCEL_REASON_DEADLINE_EXCEEDED)
+            elif self.client_disconnected is not None and self.client_disconnected():
+                self.cancel(CANCEL_REASON_CLIENT_DISCONNECTED)
+        if self.cancel_reason is not None:
+            raise PipelineCancelled(self.cancel_reason, self.snapshot())
+
+    def report(self, stage: str, **fields) -> None:
+        """Records that the pipeline has reached a stage.
+
+        Args:
+            stage (str): The stage of the pipeline.
+            **fields: The progress fields to update.
+        """
+        with self._lock:
+            self.progress['stage'] = stage
+            self.progress.update(fields)
+            snapshot = dict(self.progress)
+        if self.on_progress is not None:
+            self.on_progress(stage, snapshot)
+
+    def report_chunks_started(self, pass_no: int, num_chunks: int) -> None:
+        """Records the start of a chunk summarization pass.
+
+        Args:
+            pass_no (int): The summarization pass, 0 for the initial pass.
+            num_chunks (int): The number of chunks in the pass.
+        """
+        stage = "summarizing" if pass_no == 0 else "resummarizing"
+        self.report(stage, **{"pass": pass_no, "chunks_completed": 0, "chunks_total": num_chunks})
+
+    def report_chunk_completed(self, chunk_no: int=None) -> None:
+        """Records that a chunk of the current pass has been summarized.
+
+        Args:
+            chunk_no (int): The number of the completed chunk, if known.
+        """
+        with self._lock:
+            self.progress['chunks_completed'] += 1
+            snapshot = dict(self.progress)
+        if self.on_progress is not None:
+            snapshot['chunk'] = chunk_no
+            self.on_progress(EVENT_CHUNK_COMPLETED, snapshot)
+
+    def invoke(self, chains: dict, chain_name: str, inputs: dict, stream: bool=False) -> tuple:
+        """Invokes a chain, answering from the chunk cache when the same call has been made before.
+
+        Args:
+            chains (dict): The chains to use.
+            chain_name (str): The name of the chain to invoke.
+            inputs (dict): The prompt inputs.
+            stream (bool): Whether to pass the generated text to the token callback as it is generated.
+
+        Returns:
+            tuple: The LLM response, whether it came from the chunk cache, and the call timings, or None if it did.
+
+        Raises:
+            PipelineCancelled: If the pipeline is cancelled before or during the call.
+        """
+        self.check_cancelled()
+        if self.chunk_cache is None:
+            response, timings = self._generate(chains, chain_name, inputs, stream)
+            return response, False, timings
+
+        key = self.chunk_cache_key(chain_name, inputs)
+        cached = self.chunk_cache.get(key) if self.read_cache else None
+        with self._lock:
+            if cached is not None:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+        if cached is not None:
+            if stream and self.on_token is not None:
+                self.on_token(cached['response'])
+            return cached['response'], True, None
+
+        response, timings = self._generate(chains, chain_name, inputs, stream)
+        self.chunk_cache.put(key, {"response": response})
+        return response, False, timings
+
+    def _generate(self, chains: dict, chain_name: str, inputs: dict, stream: bool) -> tuple:
+        """Runs a chain on the LLM, streaming its output to the token callback if requested.
+
+        The output is always generated piece by piece, so that a cancelled pipeline stops generating
+        within a token rather than at the end of the call.
+
+        Args:
+            chains (dict): The chains to use.
+            chain_name (str): The name of the chain to invoke.
+            inputs (dict): The prompt inputs.
+            stream (bool): Whether to pass the generated text to the token callback as it is generated.
+
+        Returns:
+            tuple: The LLM response, and the call timings.
+
+        Raises:
+            PipelineCancelled: If the pipeline is cancelled during the call.
+        """
+        on_token = self.on_token if stream else None
+        pieces = []
+        inference_start = cur_timestamp()
+        chain = chains[chain_name]
+        generation = chain.stream(inputs)
+        try:
+            for piece in generation:
+                self.check_cancelled()
+                pieces.append(piece)
+                if on_token is not None:
+                    on_token(piece)
+        finally:
+            generation.close()
+        response = "".join(pieces)
+        timings = build_call_timings(getattr(chain, 'timings', None), time_since(inference_start), len(pieces))
+        with self._lock:
+            add_call_to_usage(self.llm_usage.setdefault(chain_name, empty_usage()), timings)
+        if self.on_llm_call is not None:
+            self.on_llm_call(chain_name, inputs, response, timings)
+        return response, timings
+
+    def usage_report(self) -> dict:
+        """Rolls up the tokens and time spent by LLM calls, by chain and in total, with the derived tokens per second.
+
+        Returns:
+            dict: The usage of each chain, and the total usage.
+        """
+        with self._lock:
+            by_chain = {chain_name: dict(usage) for chain_name, usage in self.llm_usage.items()}
+        total = empty_usage()
+        for usage in by_chain.values():
+            for field in total:
+                total[field] += usage[field]
+        return {
+            "chains": {chain_name: add_token_rates(usage) for chain_name, usage in by_chain.items()},
+            "total": add_token_rates(total),
+        }
+
+    def chunk_cache_key(self, chain_name: str, inputs: dict) -> str:
+        """Builds the chunk cache key of an LLM call.
+
+        Args:
+            chain_name (str): The name of the chain.
+            inputs (dict): The prompt inputs.
+
+        Returns:
+            str: The chunk cache key.
+        """
+        return hash_dict({
+            "namespace": self.cache_namespace,
+            "chain": chain_name,
+            "inputs": {
+                name: value for name, value in inputs.items()
+                if name not in CHUNK_CACHE_IGNORED_INPUTS
+            },
+        })
+
+    def snapshot(self) -> dict:
+        """Gets a copy of the latest progress.
+
+        Returns:
+            dict: The latest progress.
+        """
+        with self._lock:
+            return dict(self.progress)
@@ -0,0 +1,394 @@
+"""Provides continuous batching of concurrent LLM calls on a single llama.cpp context."""
+import codecs
+import queue
+import threading
+
+from typing import Any, Iterator
+
+import llama_cpp
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM as BaseLLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import ConfigDict, PrivateAttr
+
+from tyrell.core.time import cur_timestamp, time_since
+
+PENALTY_LAST_N = 64
+GENERATION_DONE = None
+
+class GenerationRequest:
+    """A prompt waiting for, or being generated on, a sequence of the engine.
+
+    Args:
+        tokens (list): The prompt tokens.
+        max_tokens (int): The maximum number of tokens to generate.
+        sampling (dict): The sampling parameters.
+
+    Attributes:
+        error (Exception): The error that stopped generation, if any.
+        pieces (queue.Queue): The generated text, piece by piece, ending with GENERATION_DONE.
+        timings (dict): The prompt tokens evaluated, tokens generated, and seconds spent on each, once finished.
+    """
+
+    def __init__(self, tokens: list, max_tokens: int, sampling: dict) -> None:
+        self.error = None
+        self.max_tokens = max_tokens
+        self.pieces = queue.Queue()
+        self.sampling = sampling
+        self.timings = None
+        self.tokens = tokens
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """Stops generating, freeing the request's sequence at the engine's next step."""
+        self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        """Checks whether the request has been cancelled.
+
+        Returns:
+            bool: Whether the request has been cancelled.
+        """
+        return self._cancelled.is_set()
+
+class Sequence:
+    """A request being generated on one sequence of the shared llama.cpp context.
+
+    Args:
+        seq_id (int): The sequence ID.
+        request (GenerationRequest): The request.
+        sampler (llama_sampler_p): The sampler chain of the request.
+    """
+
+    def __init__(self, seq_id: int, request: GenerationRequest, sampler) -> None:
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        self.first_token_at = None
+        self.generated = 0
+        self.n_past = 0
+        self.pending = list(request.tokens)
+        self.request = request
+        self.sampler = sampler
+        self.seq_id = seq_id
+        self.started_at = cur_timestamp()
+
+class BatchEngine:
+    """Generates many prompts at once on one llama.cpp context, one sequence per prompt.
+
+    A single thread steps every active sequence together: each llama_decode call carries the next
+    token of every generating sequence along with as much of any newly admitted prompt as fits
+    the batch. Prompts are admitted into free sequences between steps, as soon as there is room in
+    the KV cache for their prompt and maximum response, and finished or cancelled sequences are
+    freed immediately.
+
+    Args:
+        llama (Llama): The llama.cpp model, with a context of n_parallel times the per-sequence context size.
+        n_parallel (int): The maximum number of sequences generated at once.
+        n_batch (int): The maximum number of tokens evaluated per step.
+
+    Attributes:
+        n_parallel (int): The maximum number of sequences generated at once.
+    """
+
+    def __init__(self, llama: llama_cpp.Llama, n_parallel: int, n_batch: int) -> None:
+        self.n_parallel = n_parallel
+        self._active = {}
+        self._batch = llama_cpp.llama_batch_init(n_batch, 0, 1)
+        self._ctx = llama._ctx.ctx
+        self._free_seq_ids = list(range(n_parallel))
+        self._llama = llama
+        self._model = llama._model.model
+        self._n_batch = n_batch
+        self._n_ctx = llama.n_ctx()
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='tyrell-batch-engine', daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, max_tokens: int, sampling: dict) -> GenerationRequest:
+        """Queues a prompt for generation.
+
+        Args:
+            prompt (str): The prompt.
+            max_tokens (int): The maximum number of tokens to generate.
+            sampling (dict): The temperature, top_k, top_p, min_p and repeat_penalty to sample with.
+
+        Returns:
+            GenerationRequest: The request, to read the generated pieces from.
+
+        Raises:
+            ValueError: If the prompt and response could never fit in the context.
+        """
+        tokens = self._llama.tokenize(prompt.encode('utf-8'), special=True)
+        if len(tokens) + max_tokens > self._n_ctx // self.n_parallel:
+            raise ValueError(f"Prompt of {len(tokens)} tokens and {max_tokens} response tokens exceeds the context of each sequence.")
+        request = GenerationRequest(tokens, max_tokens, sampling)
+        self._queue.put(request)
+        return request
+
+    def status(self) -> dict:
+        """Reports the sequences in use and the prompts waiting for one.
+
+        Returns:
+            dict: The number of active sequences, and of queued prompts.
+        """
+        return {
+            "active": len(self._active),
+            "queued": self._queue.qsize(),
+            "n_parallel": self.n_parallel,
+        }
+
+    def close(self) -> None:
+        """Stops the engine, failing any unfinished requests, and frees its batch."""
+        self._stop.set()
+        self._queue.put(None)
+        self._thread.join()
+        llama_cpp.llama_batch_free(self._batch)
+
+    def _run(self) -> None:
+        """Steps all active sequences until the engine is stopped."""
+        waiting = []
+        while not self._stop.is_set():
+            if not self._active and not waiting:
+                request = self._queue.get()
+                if request is not None:
+                    waiting.append(request)
+            while True:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is not None:
+                    waiting.append(request)
+            waiting = self._admit(waiting)
+            if self._active:
+                try:
+                    self._step()
+                except Exception as e:
+                    for sequence in list(self._active.values()):
+                        self._finish(sequence, e)
+        for request in waiting:
+            request.error = RuntimeError("LLM engine stopped.")
+            request.pieces.put(GENERATION_DONE)
+        for sequence in list(self._active.values()):
+            self._finish(sequence, RuntimeError("LLM engine stopped."))
+
+    def _admit(self, waiting: list) -> list:
+        """Moves waiting requests into free sequences, in order, while the KV cache has room for them.
+
+        Args:
+            waiting (list): The requests waiting for a sequence.
+
+        Returns:
+            list: The requests still waiting.
+        """
+        reserved = sum(len(sequence.request.tokens) + sequence.request.max_tokens for sequence in self._active.values())
+        still_waiting = []
+        for request in waiting:
+            if request.is_cancelled():
+                request.pieces.put(GENERATION_DONE)
+                continue
+            needed = len(request.tokens) + request.max_tokens
+            if still_waiting or not self._free_seq_ids or reserved + needed > self._n_ctx:
+                still_waiting.append(request)
+                continue
+            seq_id = self._free_seq_ids.pop(0)
+            self._active[seq_id] = Sequence(seq_id, request, self._build_sampler(request.sampling))
+            reserved += needed
+        return still_waiting
+
+    def _step(self) -> None:
+        """Evaluates one batch across the active sequences and samples their next tokens."""
+        batch = self._batch
+        batch.n_tokens = 0
+        logits_rows = {}
+        budget = self._n_batch
+        # Generating sequences go first, with a single token each; prompts fill the rest of the batch.
+        for sequence in sorted(self._active.values(), key=lambda active: active.first_token_at is None):
+            if sequence.request.is_cancelled():
+                self._finish(sequence)
+                continue
+            take = sequence.pending[:budget]
+            if not take:
+                continue
+            for i, token in enumerate(take):
+                row = batch.n_tokens
+                batch.token[row] = token
+                batch.pos[row] = sequence.n_past + i
+                batch.n_seq_id[row] = 1
+                batch.seq_id[row][0] = sequence.seq_id
+                batch.logits[row] = False
+                batch.n_tokens += 1
+            sequence.pending = sequence.pending[len(take):]
+            sequence.n_past += len(take)
+            budget -= len(take)
+            if not sequence.pending:
+                batch.logits[batch.n_tokens - 1] = True
+                logits_rows[sequence.seq_id] = batch.n_tokens - 1
+            if budget <= 0:
+                break
+        if batch.n_tokens == 0:
+            return
+
+        result = llama_cpp.llama_decode(self._ctx, batch)
+        if result != 0:
+            raise RuntimeError(f"llama_decode failed with {result}.")
+
+        for seq_id, row in logits_rows.items():
+            sequence = self._active[seq_id]
+            token = llama_cpp.llama_sampler_sample(sequence.sampler, self._ctx, row)
+            if sequence.first_token_at is None:
+                sequence.first_token_at = cur_timestamp()
+            if llama_cpp.llama_token_is_eog(self._model, token):
+                self._finish(sequence)
+                continue
+            sequence.generated += 1
+            piece = sequence.decoder.decode(self._llama.detokenize([token]))
+            if piece:
+                sequence.request.pieces.put(piece)
+            if sequence.generated >= sequence.request.max_tokens:
+                self._finish(sequence)
+            else:
+                sequence.pending = [token]
+
+    def _finish(self, sequence: Sequence, error: Exception=None) -> None:
+        """Ends a sequence, freeing its KV cache cells and sampler.
+
+        Args:
+            sequence (Sequence): The sequence.
+            error (Exception): The error that stopped it, if any.
+        """
+        request = sequence.request
+        first_token_at = sequence.first_token_at or cur_timestamp()
+        request.timings = {
+            'prompt_tokens': len(request.tokens),
+            'generated_tokens': sequence.generated,
+            'prompt_eval_time': first_token_at - sequence.started_at,
+            'generation_time': time_since(first_token_at),
+        }
+        request.error = error
+        tail = sequence.decoder.decode(b'', final=True)
+        if tail:
+            request.pieces.put(tail)
+        request.pieces.put(GENERATION_DONE)
+
+        llama_cpp.llama_kv_cache_seq_rm(self._ctx, sequence.seq_id, -1, -1)
+        llama_cpp.llama_sampler_free(sequence.sampler)
+        del self._active[sequence.seq_id]
+        self._free_seq_ids.append(sequence.seq_id)
+
+    def _build_sampler(self, sampling: dict):
+        """Builds the sampler chain of a request.
+
+        Args:
+            sampling (dict): The sampling parameters.
+
+        Returns:
+            llama_sampler_p: The sampler chain.
+        """
+        sampler = llama_cpp.llama_sampler_chain_init(llama_cpp.llama_sampler_chain_default_params())
+        llama_cpp.llama_sampler_chain_add(sampler, self._build_penalties(sampling['repeat_penalty']))
+        llama_cpp.llama_sampler_chain_add(sampler, llama_cpp.llama_sampler_init_top_k(sampling['top_k']))
+        llama_cpp.llama_sampler_chain_add(sampler, llama_cpp.llama_sampler_init_top_p(sampling['top_p'], 1))
+        llama_cpp.llama_sampler_chain_add(sampler, llama_cpp.llama_sampler_init_min_p(sampling['min_p'], 1))
+        llama_cpp.llama_sampler_chain_add(sampler, llama_cpp.llama_sampler_init_temp(sampling['temperature']))
+        llama_cpp.llama_sampler_chain_add(sampler, llama_cpp.llama_sampler_init_dist(llama_cpp.LLAMA_DEFAULT_SEED))
+        return sampler
+
+    def _build_penalties(self, repeat_penalty: float):
+        """Builds the repetition penalty sampler.
+
+        Args:
+            repeat_penalty (float): The repetition penalty.
+
+        Returns:
+            llama_sampler_p: The sampler.
+        """
+        try:
+            return llama_cpp.llama_sampler_init_penalties(PENALTY_LAST_N, repeat_penalty, 0.0, 0.0)
+        except TypeError:
+            # Builds of llama.cpp before the penalties sampler was simplified also take the vocabulary.
+            return llama_cpp.llama_sampler_init_penalties(
+                llama_cpp.llama_n_vocab(self._model),
+                llama_cpp.llama_token_eos(self._model),
+                llama_cpp.llama_token_nl(self._model),
+                PENALTY_LAST_N,
+                repeat_penalty,
+                0.0,
+                0.0,
+                False,
+                False
+            )
+
+class EngineCompletionLLM(BaseLLM):
+    """An LLM worker that generates on a shared continuous batching engine."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    engine: BatchEngine
+    max_tokens: int = 256
+    temperature: float = 0.8
+    top_p: float = 0.95
+    top_k: int = 40
+    min_p: float = 0.05
+    repeat_penalty: float = 1.1
+
+    _call_timings: dict = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'llama_batched'
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {
+            'n_parallel': self.engine.n_parallel,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+            'top_p': self.top_p,
+            'top_k': self.top_k,
+            'min_p': self.min_p,
+            'repeat_penalty': self.repeat_penalty,
+        }
+
+    def _call(self, prompt: str, stop: list[str]=None, run_manager: CallbackManagerForLLMRun=None, **kwargs: Any) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    def _stream(self, prompt: str, stop: list[str]=None, run_manager: CallbackManagerForLLMRun=None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        self._call_timings = None
+        request = self.engine.submit(prompt, self.max_tokens, {
+            'temperature': self.temperature,
+            'top_p': self.top_p,
+            'top_k': self.top_k,
+            'min_p': self.min_p,
+            'repeat_penalty': self.repeat_penalty,
+        })
+        try:
+            while True:
+                piece = request.pieces.get()
+                if piece is GENERATION_DONE:
+                    break
+                chunk = GenerationChunk(text=piece)
+                if run_manager is not None:
+                    run_manager.on_llm_new_token(piece, chunk=chunk)
+                yield chunk
+        finally:
+            request.cancel()
+        if request.error is not None:
+            raise request.error
+        self._call_timings = request.timings
+
+    def reset_call_timings(self) -> None:
+        """Forgets the timings of the previous call."""
+        self._call_timings = None
+
+    def read_call_timings(self) -> dict:
+        """Gets the token counts and times of the last call.
+
+        Prompt evaluation time runs from when the prompt was queued to its first token, so it
+        includes any wait for a free sequence.
+
+        Returns:
+            dict: The prompt tokens evaluated, tokens generated, and seconds spent on each, or None if the call did not finish.
+        """
+        return self._call_timings
@@ -1,15 +1,58 @@
-"""Provides the LLM class."""
+"""Provides the LLM backends."""
 import os
+import threading
 from logging import Logger
 
+import llama_cpp
+
 from huggingface_hub import hf_hub_download
 from langchain_community.llms import LlamaCpp
+from langchain_core.language_models.llms import BaseLLM
 
 from tyrell.core import get_data_dir
+from .engine import BatchEngine, EngineCompletionLLM
+from .remote import EndpointPool, RemoteCompletionLLM
+
+LLM_TYPE_LLAMA = 'llama'
+LLM_TYPE_REMOTE = 'remote'
 
-# @TODO For nice typing, LLM should be base class, with this in LlamaLLM
 class LLM:
-    """Provides a class to build and interact with LLMs.
+    """Provides a base class to build the LLM workers the summarizer chains run on.
+
+    Args:
+        log (Logger): The logger for the LLM.
+        config (dict): The configuration for the LLM.
+
+    Attributes:
+        config (dict): The configuration for the LLM.
+        log (Logger): The logger for the LLM.
+    """
+
+    def __init__(self, log: Logger, config: dict) -> None:
+        self.config = config
+        self.log = log
+
+    def get(self) -> BaseLLM:
+        """Builds an LLM worker.
+
+        Returns:
+            BaseLLM: The LLM worker.
+        """
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        """Describes the model the workers run, for logging.
+
+        Returns:
+            str: The description.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Releases anything the workers share, once they have been evicted."""
+
+class LlamaLLM(LLM):
+    """Builds LLM workers that run a GGUF model in process with llama.cpp.
 
     Args:
         log (Logger): The logger for the LLM.
@@ -29,10 +72,8 @@ class LLM:
     )
 
     def __init__(self, log: Logger, config: dict) -> None:
-        self.config = config
-        self.log = log
+        super().__init__(log, config)
         self.model_filepath = ''
-        self.tokenizer = None
 
     def get(self) -> LlamaCpp:
         """Gets the LLM from the model details.
@@ -45,12 +86,15 @@ class LLM:
             filename=self.config['filename'],
             cache_dir=self.HUGGINGFACE_MODEL_CACHE_PATH
         )
+        return self._build_llama()
 
-        match self.config['type']:
-            case 'llama':
-                return self._build_llama()
-            case _:
-                return None
+    def describe(self) -> str:
+        """Describes the model the workers run, for logging.
+
+        Returns:
+            str: The model filename.
+        """
+        return self.config['filename']
 
     def _build_llama(self) -> LlamaCpp:
         """Builds the LlamaCpp from the model details.
@@ -75,5 +119,162 @@ class LLM:
             top_k=self.config['top_k'],
             min_p=self.config['min_p'],
             top_p=self.config['top_p'],
+            n_threads=self.config.get('n_threads'),
+            verbose=self.config['verbose']
+        )
+
+class BatchedLlamaLLM(LlamaLLM):
+    """Builds LLM workers that share one llama.cpp context through a continuous batching engine.
+
+    The context holds n_parallel sequences of n_ctx tokens each. Calls from all workers are
+    generated together, one decode step serving every active sequence.
+
+    Args:
+        log (Logger): The logger for the LLM.
+        config (dict): The configuration for the LLM.
+
+    Attributes:
+        config (dict): The configuration for the LLM.
+        engine (BatchEngine): The engine the workers generate on, once built.
+        log (Logger): The logger for the LLM.
+        model_filepath (str): The path to the model file.
+    """
+
+    def __init__(self, log: Logger, config: dict) -> None:
+        super().__init__(log, config)
+        self.engine = None
+        self._lock = threading.Lock()
+
+    def get(self) -> EngineCompletionLLM:
+        """Gets an LLM worker for the engine, loading the model on first use.
+
+        Returns:
+            EngineCompletionLLM: The LLM.
+        """
+        with self._lock:
+            if self.engine is None:
+                self.model_filepath = hf_hub_download(
+                    repo_id=self.config['repo'],
+                    filename=self.config['filename'],
+                    cache_dir=self.HUGGINGFACE_MODEL_CACHE_PATH
+                )
+                self.engine = BatchEngine(self._build_batched_llama(), self.config['n_parallel'], self.config['n_batch'])
+        return EngineCompletionLLM(
+            engine=self.engine,
+            max_tokens=self.config['max_response_tokens'],
+            temperature=self.config['temperature'],
+            top_p=self.config['top_p'],
+            top_k=self.config['top_k'],
+            min_p=self.config['min_p'],
+            repeat_penalty=self.config['repeat_penalty']
+        )
+
+    def describe(self) -> str:
+        """Describes the model the workers run, for logging.
+
+        Returns:
+            str: The model filename and number of parallel sequences.
+        """
+        return f"{self.config['filename']} ({self.config['n_parallel']} parallel sequences)"
+
+    def close(self) -> None:
+        """Stops the engine, so the model can be released."""
+        with self._lock:
+            if self.engine is not None:
+                self.engine.close()
+                self.engine = None
+
+    def _build_batched_llama(self) -> llama_cpp.Llama:
+        """Builds the llama.cpp model with a context large enough for every parallel sequence.
+
+        Returns:
+            Llama: The llama.cpp model.
+        """
+        self.log.info(f"LLM config: {self.config}")
+        return llama_cpp.Llama(
+            model_path=self.model_filepath,
+            n_ctx=self.config['n_ctx'] * self.config['n_parallel'],
+            n_batch=self.config['n_batch'],
+            rope_freq_base=float(self.config['rope_freq_base']),
+            rope_freq_scale=float(self.config['rope_freq_scale']),
+            n_gpu_layers=self.config['n_gpu_layers'],
+            n_threads=self.config.get('n_threads'),
             verbose=self.config['verbose']
         )
+
+class RemoteLLM(LLM):
+    """Builds LLM workers that generate on remote OpenAI-compatible completion endpoints.
+
+    All workers share one pool of connections, spread across the configured endpoints.
+
+    Args:
+        log (Logger): The logger for the LLM.
+        config (dict): The configuration for the LLM.
+
+    Attributes:
+        config (dict): The configuration for the LLM.
+        endpoints (EndpointPool): The endpoints the workers generate on.
+        log (Logger): The logger for the LLM.
+    """
+
+    def __init__(self, log: Logger, config: dict) -> None:
+        super().__init__(log, config)
+        self.endpoints = EndpointPool(
+            config['endpoints'],
+            config['max_connections'],
+            config.get('api_key'),
+            config['request_timeout']
+        )
+
+    def get(self) -> RemoteCompletionLLM:
+        """Gets an LLM worker for the endpoints.
+
+        Returns:
+            RemoteCompletionLLM: The LLM.
+        """
+        return RemoteCompletionLLM(
+            endpoints=self.endpoints,
+            model_name=self.config.get('model_name'),
+            max_tokens=self.config['max_response_tokens'],
+            temperature=self.config['temperature'],
+            top_p=self.config['top_p'],
+            top_k=self.config['top_k'],
+            min_p=self.config['min_p'],
+            repeat_penalty=self.config['repeat_penalty'],
+            extra_body=self.config.get('extra_body') or {}
+        )
+
+    def describe(self) -> str:
+        """Describes the model the workers run, for logging.
+
+        Returns:
+            str: The model name and endpoints.
+        """
+        return f"{self.config.get('model_name') or 'default model'} on {', '.join(self.endpoints.urls)}"
+
+LLM_BACKENDS = {
+    LLM_TYPE_LLAMA: LlamaLLM,
+    LLM_TYPE_REMOTE: RemoteLLM,
+}
+
+def get_llm_backend(log: Logger, config: dict) -> LLM:
+    """Gets the backend for the configured LLM type.
+
+    llama.cpp models with more than one parallel sequence run on a continuous batching engine.
+
+    Args:
+        log (Logger): The logger for the LLM.
+        config (dict): The configuration for the LLM.
+
+    Returns:
+        LLM: The backend.
+
+    Raises:
+        ValueError: If the LLM type is unknown.
+    """
+    backend = LLM_BACKENDS.get(config['type'])
+    if backend is LlamaLLM and config.get('n_parallel', 1) > 1:
+        backend = BatchedLlamaLLM
+    if backend is None:
+        raise ValueError(f"Unknown LLM type '{config['type']}'.")
+    return backend(log, config)
@@ -0,0 +1,198 @@
+"""Provides a manager that keeps LLMs resident between requests."""
+import threading
+
+from contextlib import contextmanager
+from logging import Logger
+from typing import Callable
+
+from tyrell.core.time import cur_timestamp, time_since
+from tyrell.core.utils import clear_gpu_memory
+from .llm import get_llm_backend
+
+IDLE_REAPER_MAX_INTERVAL = 30
+
+class ModelManager:
+    """Loads the configured model once and keeps it resident between requests.
+
+    Args:
+        log (Logger): The logger for the manager.
+        config (dict): The configuration for the LLM.
+        idle_timeout (int): Seconds of inactivity before the model is evicted. 0 disables eviction.
+        workers (int): The number of instances of the model to keep resident.
+
+    Attributes:
+        config (dict): The configuration for the LLM.
+        idle_timeout (int): Seconds of inactivity before the model is evicted.
+        last_used (float): The timestamp the model was last released.
+        load_time (float): The time taken by the most recent model load.
+        log (Logger): The logger for the manager.
+        workers (int): The number of instances of the model to keep resident.
+    """
+
+    def __init__(self, log: Logger, config: dict, idle_timeout: int=0, workers: int=1) -> None:
+        self.config = config
+        self.idle_timeout = idle_timeout
+        self.last_used = None
+        self.load_time = 0.0
+        self.log = log
+        self.workers = workers
+        self._backend = None
+        self._evict_listeners = []
+        self._in_use = 0
+        self._llms = []
+        self._lock = threading.RLock()
+        self._idle = threading.Condition(self._lock)
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def load(self) -> float:
+        """Loads the model if it is not already resident.
+
+        Returns:
+            float: The time spent loading the model, 0 if it was already resident.
+        """
+        with self._lock:
+            if self._llms:
+                return 0.0
+            self._backend = get_llm_backend(self.log, self.config)
+            self.log.info("Loading %d LLM worker(s) of %s...", self.workers, self._backend.describe())
+            load_start = cur_timestamp()
+            self._llms = [self._backend.get() for _ in range(self.workers)]
+            self.load_time = time_since(load_start)
+            self.last_used = cur_timestamp()
+            self.log.info("LLM loaded in %s seconds.", self.load_time)
+            return self.load_time
+
+    @contextmanager
+    def use(self):
+        """Borrows the resident model, loading it first if needed.
+
+        Yields:
+            tuple: The list of LlamaCpp LLM workers and the time spent loading them for this request.
+        """
+        with self._lock:
+            load_time = self.load()
+            self._in_use += 1
+            llms = self._llms
+        try:
+            yield llms, load_time
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self.last_used = cur_timestamp()
+                self._idle.notify_all()
+
+    def evict(self) -> bool:
+        """Evicts the resident model, waiting for any borrowers to release it.
+
+        Returns:
+            bool: Whether a model was evicted.
+        """
+        with self._lock:
+            while self._in_use > 0:
+                self._idle.wait()
+            if not self._llms:
+                return False
+            self.log.info("Evicting LLM %s...", self.config['filename'] or self.config['type'])
+            self._llms = []
+            self._backend.close()
+            self._backend = None
+            for listener in self._evict_listeners:
+                listener()
+        clear_gpu_memory()
+        return True
+
+    def add_evict_listener(self, listener: Callable[[], None]) -> None:
+        """Registers a callback to run whenever the model is evicted.
+
+        Callbacks should drop any references they hold to the model, so its memory can be released.
+
+        Args:
+            listener (Callable): The callback.
+        """
+        self._evict_listeners.append(listener)
+
+    def reload(self, config: dict=None, workers: int=None) -> float:
+        """Evicts and reloads the model, optionally with a new configuration.
+
+        Args:
+            config (dict): The new configuration for the LLM. Defaults to the current one.
+            workers (int): The new number of instances to keep resident. Defaults to the current one.
+
+        Returns:
+            float: The time spent loading the model.
+        """
+        with self._lock:
+            self.evict()
+            if config is not None:
+                self.config = config
+            if workers is not None:
+                self.workers = workers
+            return self.load()
+
+    def is_loaded(self) -> bool:
+        """Checks if the model is resident.
+
+        Returns:
+            bool: Whether the model is resident.
+        """
+        return bool(self._llms)
+
+    def status(self) -> dict:
+        """Reports the state of the resident model.
+
+        Returns:
+            dict: The model state.
+        """
+        with self._lock:
+            return {
+                "type": self.config['type'],
+                "repo": self.config['repo'],
+                "filename": self.config['filename'],
+                "endpoints": self.config['endpoints'],
+                "loaded": bool(self._llms),
+                "workers": self.workers,
+                "in_use": self._in_use,
+                "last_used": self.last_used,
+                "load_time": self.load_time,
+                "idle_timeout": self.idle_timeout,
+            }
+
+    def set_idle_timeout(self, idle_timeout: int) -> None:
+        """Changes the idle timeout, starting or stopping the idle reaper to match.
+
+        Args:
+            idle_timeout (int): Seconds of inactivity before the model is evicted. 0 disables eviction.
+        """
+        self.idle_timeout = idle_timeout
+        if idle_timeout <= 0:
+            self.stop_idle_reaper()
+        else:
+            self.start_idle_reaper()
+
+    def start_idle_reaper(self) -> None:
+        """Starts a background thread that evicts the model once it has been idle for idle_timeout seconds."""
+        if self.idle_timeout <= 0 or self._reaper is not None:
+            return
+        self._stop.clear()
+        self._reaper = threading.Thread(target=self._reap_idle, name='tyrell-model-reaper', daemon=True)
+        self._reaper.start()
+
+    def stop_idle_reaper(self) -> None:
+        """Stops the idle reaper thread."""
+        if self._reaper is None:
+            return
+        self._stop.set()
+        self._reaper.join()
+        self._reaper = None
+
+    def _reap_idle(self) -> None:
+        """Evicts the model whenever it has been idle for longer than the idle timeout."""
+        # The timeout is read on every poll, as it can change when the configuration is reloaded.
+        while not self._stop.wait(min(max(self.idle_timeout, 1), IDLE_REAPER_MAX_INTERVAL)):
+            with self._lock:
+                idle_timeout = self.idle_timeout
+                idle = idle_timeout > 0 and bool(self._llms) and self._in_use == 0 and time_since(self.last_used) >= idle_timeout
+                if idle:
+                    self.log.info("LLM idle for %s seconds.", self.idle_timeout)
+                    self.evict()
@@ -0,0 +1,73 @@
+"""Provides the reuse of the evaluated llama.cpp state of each prompt template's static prefix."""
+import threading
+
+from langchain_community.llms import LlamaCpp
+
+class PrefixCache:
+    """Keeps the evaluated llama.cpp state of the static prefix of each prompt template, and restores it ahead of calls.
+
+    llama.cpp already skips the tokens a prompt shares with the previous prompt evaluated on the same
+    worker. Restoring a saved prefix state extends that to calls that follow a call with another
+    template, so the fixed header of each template is evaluated once per model load rather than
+    whenever the template changes.
+
+    Args:
+        prefixes (dict): The static prefix of each chain's prompt template, keyed by chain name.
+
+    Attributes:
+        prefixes (dict): The static prefix of each chain's prompt template, keyed by chain name.
+    """
+
+    def __init__(self, prefixes: dict) -> None:
+        self.prefixes = prefixes
+        self._lock = threading.Lock()
+        self._states = {}
+        self._tokens = {}
+
+    def prepare(self, llm: LlamaCpp, chain_name: str) -> None:
+        """Makes sure the prefix of a chain's template is evaluated on a worker, ahead of a call to it.
+
+        Must be called while holding the worker.
+
+        Args:
+            llm (LlamaCpp): The LLM worker.
+            chain_name (str): The name of the chain about to be called.
+        """
+        client = getattr(llm, 'client', None)
+        prefix = self.prefixes.get(chain_name)
+        if client is None or not prefix:
+            return
+
+        with self._lock:
+            tokens = self._tokens.get(chain_name)
+            if tokens is None:
+                # The last token may merge with the text after the prefix, so it is left to the call.
+                tokens = client.tokenize(prefix.encode('utf-8'), special=True)[:-1]
+                self._tokens[chain_name] = tokens
+            state = self._states.get(chain_name)
+
+        if not tokens or has_evaluated_prefix(client, tokens):
+            return
+        if state is not None:
+            client.load_state(state)
+            return
+
+        client.reset()
+        client.eval(tokens)
+        state = client.save_state()
+        with self._lock:
+            self._states.setdefault(chain_name, state)
+
+def has_evaluated_prefix(client, tokens: list) -> bool:
+    """Checks whether a llama.cpp model has already evaluated a token prefix.
+
+    Args:
+        client (Llama): The llama.cpp model.
+        tokens (list): The prefix tokens.
+
+    Returns:
+        bool: Whether the tokens are at the start of the model's evaluated tokens.
+    """
+    if client.n_tokens < len(tokens):
+        return False
+    return client.input_ids[:len(tokens)].tolist() == tokens
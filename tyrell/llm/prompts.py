@@ -1,8 +1,40 @@
 """Provides standard prompts for the LLM."""
+from tyrell.core.hashing import hash_text
+
+def get_prompt_templates() -> dict:
+    """Gets the prompt template of each chain.
+
+    Returns:
+        dict: The prompt templates, keyed by chain name.
+    """
+    return {
+        "summarize_oneshot": get_summarize_oneshot(),
+        "summarize_chunk": get_summarize_chunk(),
+        "compress": get_compress_result(),
+        "summarize_final": get_summarize_final(),
+        "summarize_packed": get_summarize_packed(),
+    }
+
+def get_prompt_template_versions() -> dict:
+    """Gets a version for each prompt template, derived from its text.
+
+    Returns:
+        dict: The template versions, keyed by chain name.
+    """
+    return {name: hash_text(template) for name, template in get_prompt_templates().items()}
+
+def get_prompt_prefixes() -> dict:
+    """Gets the static prefix of each prompt template, the text before its first input variable.
+
+    Input variables are kept out of the instructions, so that the prefix is the same on every call.
+
+    Returns:
+        dict: The prompt prefixes, keyed by chain name.
+    """
+    return {name: template[:template.find('{')] for name, template in get_prompt_templates().items()}
 
 def get_summarize_oneshot() -> str:
     return """<#meta#>
-    - Date: {date}
     - Task: summary
     <#system#>
     Your main objective is to condense the content of the document into a concise summary, capturing the main points and themes.
@@ -22,13 +54,31 @@ def get_summarize_oneshot() -> str:
 
     Ensure that your final output is thorough, and accurately reflects the document's content and purpose.
     <#user_context#>
+    Date: {date}
+
     Original:
     {document}
     <#bot#>"""
 
+def get_summarize_packed() -> str:
+    return """<#meta#>
+    - Task: summary
+    <#system#>
+    Your main objective is to condense the content of each of several unrelated documents into its own concise summary, capturing the main points and themes.
+    <#chat#>
+    <#user#>
+    Please read each of the provided Documents to understand its context and content. Use this understanding to generate a summary of each Document on its own, without including details from any other Document. Ignore any details about sponsorships/advertisements in the text.
+
+    Summarize the Documents in order. Start the summary of each Document with "Summary X:" where X is the number of the Document.
+    <#user_context#>
+    Date: {date}
+    Number of Documents: {num_documents}
+
+    {documents}
+    <#bot#>"""
+
 def get_compress_result() -> str:
     return """<#meta#>
-    - Date: {date}
     - Task: condense
     <#system#>
     Your main objective is to condense the content of the document slightly, retaining all key points and avoiding unnecessary reductions.
@@ -36,6 +86,8 @@ def get_compress_result() -> str:
     <#user#>
     Please read the provided Original section to understand the context and content. Use this understanding to generate a slighly condensed version of the Original section, incorporating relevant details and maintaining coherence.
     <#user_context#>
+    Date: {date}
+
     Original:
     {original}
 
@@ -44,7 +96,6 @@ def get_compress_result() -> str:
 
 def get_summarize_chunk() -> str:
     return """<#meta#>
-    - Date: {date}
     - Task: summary
     <#system#>
     Your main objective is to condense the content of the document into a concise summary, capturing the main points and themes.
@@ -58,6 +109,8 @@ def get_summarize_chunk() -> str:
     - Focus on summarizing the Original section, taking into account the context provided by the Prior Summary.
     - Ignore any details about sponsorships/advertisements in the text.
     <#user_context#>
+    Date: {date}
+
     Prior Summary:
     {prior_summary}
 
@@ -69,7 +122,6 @@ def get_summarize_chunk() -> str:
 
 def get_summarize_final() -> str:
     return """<#meta#>
-    - Date: {date}
     - Task: summary
     <#system#>
     Your main objective is to condense the content of the document into a concise summary, capturing the main points and themes.
@@ -85,6 +137,8 @@ def get_summarize_final() -> str:
 
     Please remember to be thorough, and ensure that the final summary is a true reflection of the document's content and purpose.
     <#user_context#>
+    Date: {date}
+
     Summarized Sections:
     {summary}
 
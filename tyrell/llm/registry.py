@@ -0,0 +1,119 @@
+"""Provides a process-level registry of tokenizers, summarizer chains and token budgets."""
+import threading
+
+from logging import Logger
+
+from langchain_community.llms import LlamaCpp
+from transformers import AutoTokenizer, PreTrainedTokenizerBase
+
+from tyrell.core.builders import build_summarizer_chains
+from tyrell.core.hashing import hash_dict
+from .budgets import compute_token_budgets, TokenBudgets
+from .prefix import PrefixCache
+from .prompts import get_prompt_prefixes
+from .workers import ChainPool
+
+class ComponentRegistry:
+    """Builds tokenizers, summarizer chains and token budgets once and hands out the shared instances.
+
+    Tokenizers are keyed by their Huggingface repo, chains by a hash of the LLM configuration
+    they were built for, and budgets by a hash of the LLM configuration and the configured limits.
+    Chains hold a reference to their LLM, so they must be invalidated whenever that LLM is evicted.
+
+    Args:
+        log (Logger): The logger for the registry.
+
+    Attributes:
+        log (Logger): The logger for the registry.
+    """
+
+    def __init__(self, log: Logger) -> None:
+        self.log = log
+        self._budgets = {}
+        self._chains = {}
+        self._lock = threading.Lock()
+        self._tokenizers = {}
+
+    def get_tokenizer(self, tokenizer_repo: str) -> PreTrainedTokenizerBase:
+        """Gets the tokenizer for a Huggingface repo, loading it on first use.
+
+        Args:
+            tokenizer_repo (str): The Huggingface repo of the tokenizer.
+
+        Returns:
+            PreTrainedTokenizerBase: The tokenizer.
+        """
+        with self._lock:
+            if tokenizer_repo not in self._tokenizers:
+                self.log.info("Initializing Tokenizer %s...", tokenizer_repo)
+                self._tokenizers[tokenizer_repo] = AutoTokenizer.from_pretrained(tokenizer_repo)
+            return self._tokenizers[tokenizer_repo]
+
+    def get_chains(self, llm_config: dict, llms: list[LlamaCpp], prefix_cache: bool=False) -> ChainPool:
+        """Gets the summarizer chains for a set of LLM workers, building them on first use.
+
+        Args:
+            llm_config (dict): The configuration the LLM workers were built from.
+            llms (list): The LLM workers to build the chains from.
+            prefix_cache (bool): Whether newly built chains reuse the evaluated prefix of each prompt template.
+
+        Returns:
+            ChainPool: The pool of summarizer chains, one chain set per worker.
+        """
+        key = hash_dict(llm_config)
+        with self._lock:
+            cached = self._chains.get(key)
+            if cached is None or cached[0] is not llms:
+                self.log.info("Building LLM Chains...")
+                cached = (llms, ChainPool(
+                    [build_summarizer_chains(llm) for llm in llms],
+                    llms,
+                    PrefixCache(get_prompt_prefixes()) if prefix_cache else None
+                ))
+                self._chains[key] = cached
+            return cached[1]
+
+    def get_budgets(self, llm_config: dict, max_chunk_token_length: int=None, max_final_summary_context_tokens: int=None, pack_max_tokens: int=None, max_pack_documents: int=1) -> TokenBudgets:
+        """Gets the token budgets of the pipeline for an LLM configuration, deriving them on first use.
+
+        Args:
+            llm_config (dict): The configuration of the LLM.
+            max_chunk_token_length (int): The configured maximum token length of a chunk, or None.
+            max_final_summary_context_tokens (int): The configured maximum token length of the final summary context, or None.
+            pack_max_tokens (int): The configured maximum total token length of a pack, or None.
+            max_pack_documents (int): The maximum number of documents in a pack.
+
+        Returns:
+            TokenBudgets: The token budgets.
+
+        Raises:
+            ValueError: If the context of the LLM cannot hold a prompt and its response.
+        """
+        limits = (max_chunk_token_length, max_final_summary_context_tokens, pack_max_tokens, max_pack_documents)
+        key = hash_dict({'llm': llm_config, 'limits': limits})
+        with self._lock:
+            budgets = self._budgets.get(key)
+        if budgets is None:
+            budgets = compute_token_budgets(
+                self.get_tokenizer(llm_config['tokenizer_repo']),
+                llm_config['n_ctx'],
+                llm_config['max_response_tokens'],
+                self.log,
+                *limits
+            )
+            self.log.info("Derived token budgets: %s", budgets.as_dict())
+            with self._lock:
+                self._budgets[key] = budgets
+        return budgets
+
+    def invalidate_chains(self) -> None:
+        """Drops all built chains, releasing their references to the LLM."""
+        with self._lock:
+            self._chains.clear()
+
+    def invalidate(self) -> None:
+        """Drops all tokenizers, chains and budgets so they are rebuilt from the current configuration."""
+        with self._lock:
+            self._budgets.clear()
+            self._chains.clear()
+            self._tokenizers.clear()
@@ -0,0 +1,209 @@
+"""Provides an LLM that runs on remote OpenAI-compatible completion endpoints."""
+import json
+import threading
+
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import requests
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM as BaseLLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import ConfigDict, PrivateAttr
+from requests.adapters import HTTPAdapter
+
+STREAM_DONE = '[DONE]'
+
+class EndpointPool:
+    """Spreads completion requests across OpenAI-compatible endpoints over pooled HTTP connections.
+
+    Each request goes to the endpoint with the fewest requests in flight, taking turns between
+    endpoints that are equally busy.
+
+    Args:
+        urls (list): The base URL of each endpoint, including the API version, such as 'http://gpu1:8080/v1'.
+        max_connections (int): The maximum number of pooled connections to each endpoint.
+        api_key (str): The bearer token to send, if the endpoints require one.
+        timeout (int): The seconds to wait for a connection or for the next piece of a response.
+
+    Attributes:
+        timeout (int): The seconds to wait for a connection or for the next piece of a response.
+        urls (list): The base URL of each endpoint.
+    """
+
+    def __init__(self, urls: list, max_connections: int=8, api_key: str=None, timeout: int=600) -> None:
+        if not urls:
+            raise ValueError("At least one LLM endpoint is required.")
+        self.timeout = timeout
+        self.urls = [url.rstrip('/') for url in urls]
+        self._in_flight = {url: 0 for url in self.urls}
+        self._lock = threading.Lock()
+        self._next = 0
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.urls), pool_maxsize=max_connections)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        if api_key:
+            self._session.headers['Authorization'] = f"Bearer {api_key}"
+
+    @contextmanager
+    def acquire(self):
+        """Picks the least busy endpoint for a request.
+
+        Yields:
+            str: The base URL of the endpoint.
+        """
+        with self._lock:
+            order = self.urls[self._next:] + self.urls[:self._next]
+            url = min(order, key=lambda candidate: self._in_flight[candidate])
+            self._next = (self.urls.index(url) + 1) % len(self.urls)
+            self._in_flight[url] += 1
+        try:
+            yield url
+        finally:
+            with self._lock:
+                self._in_flight[url] -= 1
+
+    def stream_completion(self, body: dict) -> Iterator[dict]:
+        """Requests a streamed completion from the least busy endpoint.
+
+        Closing the iterator closes the connection, which stops the endpoint generating.
+
+        Args:
+            body (dict): The completion request body.
+
+        Yields:
+            dict: Each decoded chunk of the response stream.
+
+        Raises:
+            requests.HTTPError: If the endpoint rejects the request.
+        """
+        with self.acquire() as url:
+            with self._session.post(f"{url}/completions", json=body, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                # Endpoints send UTF-8 without a charset, which requests would decode as ISO-8859-1.
+                response.encoding = 'utf-8'
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = line[len('data:'):].strip()
+                    if data == STREAM_DONE:
+                        break
+                    yield json.loads(data)
+
+    def status(self) -> dict:
+        """Reports the requests in flight to each endpoint.
+
+        Returns:
+            dict: The number of requests in flight, keyed by endpoint URL.
+        """
+        with self._lock:
+            return dict(self._in_flight)
+
+class RemoteCompletionLLM(BaseLLM):
+    """An LLM that generates on remote OpenAI-compatible completion endpoints, such as a llama.cpp server or vLLM.
+
+    Prompts are sent as raw completions, so that the prompt templates reach the model unchanged.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    endpoints: EndpointPool
+    model_name: str = None
+    max_tokens: int = 256
+    temperature: float = 0.8
+    top_p: float = 0.95
+    top_k: int = 40
+    min_p: float = 0.05
+    repeat_penalty: float = 1.1
+    extra_body: dict = {}
+
+    _call_timings: dict = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'remote_completion'
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {
+            'endpoints': self.endpoints.urls,
+            'model_name': self.model_name,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+            'top_p': self.top_p,
+            'top_k': self.top_k,
+            'min_p': self.min_p,
+            'repeat_penalty': self.repeat_penalty,
+        }
+
+    def _call(self, prompt: str, stop: list[str]=None, run_manager: CallbackManagerForLLMRun=None, **kwargs: Any) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    def _stream(self, prompt: str, stop: list[str]=None, run_manager: CallbackManagerForLLMRun=None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        body = {
+            'prompt': prompt,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+            'top_p': self.top_p,
+            'top_k': self.top_k,
+            'min_p': self.min_p,
+            'repeat_penalty': self.repeat_penalty,
+            'stream': True,
+            'stream_options': {'include_usage': True},
+            **self.extra_body,
+            **kwargs,
+        }
+        if self.model_name:
+            body['model'] = self.model_name
+        if stop:
+            body['stop'] = stop
+
+        self._call_timings = None
+        for data in self.endpoints.stream_completion(body):
+            self._record_timings(data)
+            for choice in data.get('choices') or []:
+                text = choice.get('text') or ''
+                if not text:
+                    continue
+                chunk = GenerationChunk(text=text)
+                if run_manager is not None:
+                    run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
+
+    def _record_timings(self, data: dict) -> None:
+        """Keeps the token counts and times an endpoint reports for the current call.
+
+        A llama.cpp server reports its own timings; other endpoints only report token usage.
+
+        Args:
+            data (dict): A decoded chunk of the response stream.
+        """
+        if data.get('timings'):
+            timings = data['timings']
+            self._call_timings = {
+                'prompt_tokens': timings.get('prompt_n'),
+                'generated_tokens': timings.get('predicted_n'),
+                'prompt_eval_time': timings['prompt_ms'] / 1000 if timings.get('prompt_ms') is not None else None,
+                'generation_time': timings['predicted_ms'] / 1000 if timings.get('predicted_ms') is not None else None,
+            }
+        elif data.get('usage') and self._call_timings is None:
+            self._call_timings = {
+                'prompt_tokens': data['usage'].get('prompt_tokens'),
+                'generated_tokens': data['usage'].get('completion_tokens'),
+                'prompt_eval_time': None,
+                'generation_time': None,
+            }
+
+    def reset_call_timings(self) -> None:
+        """Forgets the timings of the previous call."""
+        self._call_timings = None
+
+    def read_call_timings(self) -> dict:
+        """Gets the token counts and times the endpoint reported for the last call.
+
+        Returns:
+            dict: The prompt tokens evaluated, tokens generated, and seconds spent on each, or None if the endpoint did not report them.
+        """
+        return self._call_timings
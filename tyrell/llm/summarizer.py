@@ -1,24 +1,57 @@
 from datetime import datetime
 
-from tyrell.core.chunker import chunk_document
+from tyrell.core.chunker import chunk_tokenized, count_tokens, iter_chunks, join_tokenized, tokenize_offsets, tokenize_text, truncate_tokenized, TokenizedText, DEFAULT_BOUNDARY_SLACK_TOKENS
 from tyrell.core.time import cur_timestamp, time_since
+from .context import PipelineContext
+from .workers import map_in_order
 
-def summarize_document(document, chains, tokenizer, max_chunk_token_length, max_final_summary_context_tokens, logger):
+SUMMARY_MODE_REFINE = 'refine'
+SUMMARY_MODE_MAP_REDUCE = 'map_reduce'
+SUMMARY_MODES = (SUMMARY_MODE_REFINE, SUMMARY_MODE_MAP_REDUCE)
+
+REDUCE_RESUMMARIZE = 'resummarize'
+REDUCE_TREE = 'tree'
+REDUCE_STRATEGIES = (REDUCE_RESUMMARIZE, REDUCE_TREE)
+DEFAULT_TREE_FAN_IN = 8
+DEFAULT_TREE_MAX_DEPTH = 4
+
+def summarize_document(document, chains, tokenizer, max_chunk_token_length, max_final_summary_context_tokens, logger, chunk_boundary_slack=DEFAULT_BOUNDARY_SLACK_TOKENS, mode=SUMMARY_MODE_REFINE, context=None, reduce=REDUCE_RESUMMARIZE, tree_fan_in=DEFAULT_TREE_FAN_IN, tree_max_depth=DEFAULT_TREE_MAX_DEPTH):
     """Summarizes a document.
 
     Args:
-        document (str): The document to summarize.
+        document (str): The document to summarize, a TokenizedText if it has already been tokenized, or an iterable of its text piece by piece, such as an upload being read.
         chains (dict): The chains to use.
         tokenizer (Tokenizer): The tokenizer to use.
         max_chunk_token_length (int): The maximum token length for a chunk.
         max_final_summary_context_tokens (int): The maximum token length for the final summary context.
         logger (Logger): The logger.
+        chunk_boundary_slack (int): The number of tokens around a chunk end to search for a paragraph or sentence boundary.
+        mode (str): The chunk summarization mode, one of SUMMARY_MODES.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
+        reduce (str): The strategy for reducing oversized chunk summaries, one of REDUCE_STRATEGIES.
+        tree_fan_in (int): The maximum number of summaries merged by each call of the tree strategy.
+        tree_max_depth (int): The maximum number of levels of the tree strategy.
 
     Returns:
         dict: The response data.
+
+    Raises:
+        PipelineCancelled: If the context is cancelled, its deadline passes or its client disconnects.
     """
-    chunks = chunk_document(tokenizer, document, max_chunk_token_length)
+    if context is None:
+        context = PipelineContext()
+
+    context.report("chunking")
+    if isinstance(document, TokenizedText):
+        chunks = chunk_tokenized(document, max_chunk_token_length, chunk_boundary_slack)
+    elif isinstance(document, str):
+        chunks = chunk_tokenized(tokenize_text(tokenizer, document), max_chunk_token_length, chunk_boundary_slack)
+    else:
+        # Every chunk prompt carries the total number of chunks, so the stream is chunked in full before the first call.
+        chunks = list(iter_chunks(tokenizer, document, max_chunk_token_length, chunk_boundary_slack))
     logger.info("Chunked document into %d chunks...", len(chunks))
+    context.report("chunked", chunks_total=len(chunks))
+    context.check_cancelled()
 
     if len(chunks) == 0:
         return {
@@ -26,39 +59,42 @@ def summarize_document(document, chains, tokenizer, max_chunk_token_length, max_
         }
 
     if len(chunks) == 1:
-        return summarize_single_chunk(chunks[0], chains, logger)
-    return summarize_multiple_chunks(chunks, tokenizer, chains, max_chunk_token_length, max_final_summary_context_tokens, logger)
+        return summarize_single_chunk(chunks[0], chains, logger, context)
+    return summarize_multiple_chunks(chunks, tokenizer, chains, max_chunk_token_length, max_final_summary_context_tokens, logger, chunk_boundary_slack, mode, context, reduce, tree_fan_in, tree_max_depth)
 
-def summarize_single_chunk(chunk, chains, logger):
+def summarize_single_chunk(chunk, chains, logger, context=None):
     """Summarizes a document that fits into a single chunk size.
 
     Args:
         chunk (str): The chunk to summarize.
         chains (dict): The chains to use.
         logger (Logger): The logger.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
 
     Returns:
         dict: The response data.
     """
-    chain = chains['summarize_oneshot']
+    if context is None:
+        context = PipelineContext()
     response_data = empty_response()
     total_inference_time = 0
 
     logger.info("Querying LLM Oneshot...")
+    context.report("oneshot")
     inference_start = cur_timestamp()
-    chain_response = chain.invoke({
+    chain_response, _, timings = context.invoke(chains, 'summarize_oneshot', {
         "date": datetime.today().strftime("%Y-%m-%d"),
         "document": chunk
-    })
+    }, stream=True)
     inference_time = time_since(inference_start)
     total_inference_time += inference_time
 
-    response_data = update_response_data(response_data, 1, inference_time, chain_response['text'])
+    response_data = update_response_data(response_data, 1, inference_time, chain_response.strip(), timings)
 
     logger.info("Responding with %s...", chain_response)
     return response_data
 
-def summarize_multiple_chunks(chunks, tokenizer, chains, max_chunk_token_length, max_final_summary_context_tokens, logger):
+def summarize_multiple_chunks(chunks, tokenizer, chains, max_chunk_token_length, max_final_summary_context_tokens, logger, chunk_boundary_slack=DEFAULT_BOUNDARY_SLACK_TOKENS, mode=SUMMARY_MODE_REFINE, context=None, reduce=REDUCE_RESUMMARIZE, tree_fan_in=DEFAULT_TREE_FAN_IN, tree_max_depth=DEFAULT_TREE_MAX_DEPTH):
     """Summarizes a document that was split into multiple chunks.
 
     Args:
@@ -68,60 +104,84 @@ def summarize_multiple_chunks(chunks, tokenizer, chains, max_chunk_token_length,
         max_chunk_token_length (int): The maximum token length for a chunk.
         max_final_summary_context_tokens (int): The maximum token length for the final summary context.
         logger (Logger): The logger.
+        chunk_boundary_slack (int): The number of tokens around a chunk end to search for a paragraph or sentence boundary.
+        mode (str): The chunk summarization mode, one of SUMMARY_MODES.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
+        reduce (str): The strategy for reducing oversized chunk summaries, one of REDUCE_STRATEGIES.
+        tree_fan_in (int): The maximum number of summaries merged by each call of the tree strategy.
+        tree_max_depth (int): The maximum number of levels of the tree strategy.
 
     Returns:
         dict: The response data.
     """
-    num_chunks = len(chunks)
+    if context is None:
+        context = PipelineContext()
     response_data = empty_response()
     total_inference_time = 0
-    prior_summary, raw_inference_results_len = "", 0
     raw_inference_results, assembled_summaries, inference_methods = [], [], []
     resummary_counter, resummarized, compressed = 0, False, False
 
     response_data['results'].append([])
-    for i, chunk in enumerate(chunks):
-        chunk_summary = summarize_chunk(chunk, chains, prior_summary, i + 1, num_chunks, resummary_counter, logger)
+    for chunk_summary in summarize_chunks(chunks, chains, resummary_counter, mode, logger, context):
         total_inference_time += chunk_summary['inference_time']
-
-        chunk_summary['id'] = build_summary_id(resummary_counter, i + 1)
         response_data['results'][resummary_counter].append(chunk_summary)
-        raw_inference_results.append(chunk_summary["response"])
-
-        chunk_tokens = tokenizer.tokenize(chunk_summary['response'])
-        raw_inference_results_len += len(chunk_tokens)
-        prior_summary = chunk_summary['response']
+        raw_inference_results.append(tokenize_text(tokenizer, chunk_summary["response"]))
+    raw_inference_results_len = count_context_tokens(tokenizer, raw_inference_results)
     assembled_summaries.append(write_summary_string_from_raw_inference_results(raw_inference_results))
     inference_methods.append("initial-summary")
-    
-    inference_methods, assembled_summaries, raw_inference_results, response_data, resummary_counter, total_inference_time, resummarized, compressed = resummarize(
-        raw_inference_results,
-        chains,
-        raw_inference_results_len,
-        max_final_summary_context_tokens,
-        tokenizer,
-        max_chunk_token_length,
-        assembled_summaries,
-        response_data,
-        resummary_counter,
-        total_inference_time,
-        inference_methods,
-        logger
-    )
-
-    final_summary = summarize_final(raw_inference_results, chains, logger)
+
+    if reduce == REDUCE_TREE:
+        inference_methods, assembled_summaries, raw_inference_results, response_data, resummary_counter, total_inference_time, resummarized, compressed = tree_reduce(
+            raw_inference_results,
+            chains,
+            max_final_summary_context_tokens,
+            tokenizer,
+            assembled_summaries,
+            response_data,
+            resummary_counter,
+            total_inference_time,
+            inference_methods,
+            logger,
+            tree_fan_in,
+            tree_max_depth,
+            context
+        )
+    else:
+        inference_methods, assembled_summaries, raw_inference_results, response_data, resummary_counter, total_inference_time, resummarized, compressed = resummarize(
+            raw_inference_results,
+            chains,
+            raw_inference_results_len,
+            max_final_summary_context_tokens,
+            tokenizer,
+            max_chunk_token_length,
+            assembled_summaries,
+            response_data,
+            resummary_counter,
+            total_inference_time,
+            inference_methods,
+            logger,
+            chunk_boundary_slack,
+            mode,
+            context
+        )
+
+    final_summary = summarize_final(raw_inference_results, chains, logger, context)
     inference_methods.append("final-summary")
     total_inference_time += final_summary['inference_time']
     response_data = finalize_response_data(response_data, assembled_summaries, final_summary, total_inference_time, inference_methods, resummarized, compressed)
     return response_data
 
-def resummarize(raw_inference_results, chains, raw_inference_results_len, max_final_summary_context_tokens, tokenizer, max_chunk_token_length, assembled_summaries, response_data, resummary_counter, total_inference_time, inference_methods, logger):
+def resummarize(raw_inference_results, chains, raw_inference_results_len, max_final_summary_context_tokens, tokenizer, max_chunk_token_length, assembled_summaries, response_data, resummary_counter, total_inference_time, inference_methods, logger, chunk_boundary_slack=DEFAULT_BOUNDARY_SLACK_TOKENS, mode=SUMMARY_MODE_REFINE, context=None):
     """Resummarizes the document if the summary generated in the initial pass is larger than the maximum final summary context tokens.
 
+    Sizes include the "Chunk (i of n)" heading written before each summary. Summaries well over the
+    final summary context are resummarized, and those slightly over are compressed, until they fit.
+    If a pass does not shrink them, they are truncated to fit instead.
+
     Args:
-        raw_inference_results (list): The raw inference results.
+        raw_inference_results (list): The raw inference results, as TokenizedText.
         chains (dict): The chains to use.
-        raw_inference_results_len (int): The length of the raw inference results.
+        raw_inference_results_len (int): The length of the raw inference results, including their headings.
         max_final_summary_context_tokens (int): The maximum token length for the final summary context.
         tokenizer (Tokenizer): The tokenizer to use.
         max_chunk_token_length (int): The maximum token length for a chunk.
@@ -131,14 +191,21 @@ def resummarize(raw_inference_results, chains, raw_inference_results_len, max_fi
         total_inference_time (float): The total inference time.
         inference_methods (list): The inference methods.
         logger (Logger): The logger.
+        chunk_boundary_slack (int): The number of tokens around a chunk end to search for a paragraph or sentence boundary.
+        mode (str): The chunk summarization mode, one of SUMMARY_MODES.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
 
     Returns:
-        tuple: The inference methods, assembled summaries, raw inference results, response data, resummary counter, total inference time, resummarized, compressed.
+        tuple: The inference methods, assembled summaries, raw inference results (as TokenizedText), response data, resummary counter, total inference time, resummarized, compressed.
     """
+    if context is None:
+        context = PipelineContext()
     logger.info("Checking %d tokens...", raw_inference_results_len)
     resummarized = False
     compressed = False
     while raw_inference_results_len > max_final_summary_context_tokens:
+        context.check_cancelled()
+        previous_len = raw_inference_results_len
         exceeds_factor = raw_inference_results_len / max_final_summary_context_tokens
         logger.info(
             "Length of context tokens exceeds maximum by a factor of %.2f times. Resummarizing...",
@@ -149,60 +216,240 @@ def resummarize(raw_inference_results, chains, raw_inference_results_len, max_fi
             resummary_counter += 1
             response_data['results'].append([])
 
-            resummarize_source = "\n\n".join(raw_inference_results)
+            resummarize_source = join_tokenized(tokenizer, raw_inference_results, "\n\n")
             raw_inference_results = []
-            chunks = chunk_document(tokenizer, resummarize_source, max_chunk_token_length)
-            num_chunks = len(chunks)
+            chunks = chunk_tokenized(resummarize_source, max_chunk_token_length, chunk_boundary_slack)
 
-            raw_inference_results_len = 0
-            prior_summary = ""
-
-            for i, chunk in enumerate(chunks):
-                chunk_summary = summarize_chunk(chunk, chains, prior_summary, i + 1, num_chunks, resummary_counter, logger)
+            for chunk_summary in summarize_chunks(chunks, chains, resummary_counter, mode, logger, context):
                 total_inference_time += chunk_summary['inference_time']
-
-                chunk_summary['id'] = build_summary_id(resummary_counter, i + 1)
                 response_data['results'][resummary_counter].append(chunk_summary)
-                raw_inference_results.append(chunk_summary["response"])
-
-                chunk_tokens = tokenizer.tokenize(chunk_summary['response'])
-                raw_inference_results_len += len(chunk_tokens)
-                prior_summary = chunk_summary['response']
+                raw_inference_results.append(tokenize_text(tokenizer, chunk_summary["response"]))
+            raw_inference_results_len = count_context_tokens(tokenizer, raw_inference_results)
             assembled_summaries.append(write_summary_string_from_raw_inference_results(raw_inference_results))
             inference_methods.append("full-resummary")
             resummarized = True
 
-        elif exceeds_factor > 1.10:
+        else:
             logger.info("Compressing...", raw_inference_results_len)
-            raw_inference_results_len = 0
+            context.report("compressing", chunks_completed=0, chunks_total=len(raw_inference_results))
             compression_inference_time = 0
             compressed_results = []
 
-            for i, inference_result in enumerate(raw_inference_results):
-                compressed_result = compress_result(inference_result, chains, logger)
-
+            workers = get_chain_workers(chains, mode)
+            compressed_results_data = map_in_order(
+                lambda inference_result: compress_result(inference_result.text, chains, logger, context),
+                raw_inference_results,
+                workers
+            )
+            for compressed_result in compressed_results_data:
                 compression_inference_time += compressed_result['inference_time']
                 total_inference_time += compressed_result['inference_time']
-                result_tokens = tokenizer.tokenize(compressed_result['response'])
-                raw_inference_results_len += len(result_tokens)
-
-                compressed_results.append(compressed_result['response'])
+                compressed_results.append(tokenize_text(tokenizer, compressed_result['response']))
+            raw_inference_results_len = count_context_tokens(tokenizer, compressed_results)
             compressed = True
 
             response_data['compressions'].append({
-                "source": raw_inference_results,
-                "result": compressed_results,
+                "source": [inference_result.text for inference_result in raw_inference_results],
+                "result": [compressed_result.text for compressed_result in compressed_results],
                 "inference_time": compression_inference_time,
+                "timings": [compressed_result['timings'] for compressed_result in compressed_results_data],
             })
             assembled_summaries.append(write_summary_string_from_raw_inference_results(compressed_results))
             inference_methods.append("compression")
             raw_inference_results = compressed_results
-        else:
-            logger.info("Skipping Resummarization As Threshold is Near.")
+        if raw_inference_results_len >= previous_len:
+            logger.warning("Resummarization did not shrink the summaries, %d tokens left.", raw_inference_results_len)
             break
+    if raw_inference_results_len > max_final_summary_context_tokens:
+        logger.warning("Truncating %d summaries of %d tokens to fit the final summary context.", len(raw_inference_results), raw_inference_results_len)
+        raw_inference_results = fit_to_context(tokenizer, raw_inference_results, max_final_summary_context_tokens)
     return inference_methods, assembled_summaries, raw_inference_results, response_data, resummary_counter, total_inference_time, resummarized, compressed
 
-def summarize_chunk(chunk, chains, prior_summary, cur_chunk_no, total_chunk_no, resummary_counter, logger):
+def tree_reduce(raw_inference_results, chains, max_final_summary_context_tokens, tokenizer, assembled_summaries, response_data, resummary_counter, total_inference_time, inference_methods, logger, fan_in=DEFAULT_TREE_FAN_IN, max_depth=DEFAULT_TREE_MAX_DEPTH, context=None):
+    """Reduces the chunk summaries through a tree of merges until they fit the final summary context.
+
+    At each level, consecutive summaries are grouped, up to fan_in at a time and within the final
+    summary context, and each group is merged into a single summary. The groups of a level are
+    independent and run concurrently across the workers of the chain pool. A level of n summaries
+    takes about n / fan_in LLM calls, and there are at most max_depth levels. Sizes include the
+    "Chunk (i of n)" heading written before each summary. Summaries that still overflow the final
+    summary context, such as a single oversized summary or those left at the maximum depth or when
+    no two summaries fit a group, are truncated to fit.
+
+    Args:
+        raw_inference_results (list): The raw inference results, as TokenizedText.
+        chains (dict): The chains to use.
+        max_final_summary_context_tokens (int): The maximum token length for the final summary context.
+        tokenizer (Tokenizer): The tokenizer to use.
+        assembled_summaries (list): The assembled summaries.
+        response_data (dict): The response data.
+        resummary_counter (int): The resummary counter.
+        total_inference_time (float): The total inference time.
+        inference_methods (list): The inference methods.
+        logger (Logger): The logger.
+        fan_in (int): The maximum number of summaries merged by each call.
+        max_depth (int): The maximum number of levels.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
+
+    Returns:
+        tuple: The inference methods, assembled summaries, raw inference results (as TokenizedText), response data, resummary counter, total inference time, resummarized, compressed.
+    """
+    if context is None:
+        context = PipelineContext()
+    raw_inference_results_len = count_context_tokens(tokenizer, raw_inference_results)
+    logger.info("Checking %d tokens...", raw_inference_results_len)
+    resummarized = False
+    depth = 0
+    while raw_inference_results_len > max_final_summary_context_tokens and len(raw_inference_results) > 1:
+        if depth >= max_depth:
+            logger.warning("Reached the maximum reduction depth of %d with %d tokens left.", max_depth, raw_inference_results_len)
+            break
+        context.check_cancelled()
+        heading_tokens = count_heading_tokens(tokenizer, fan_in)
+        raw_inference_results = [truncate_tokenized(inference_result, max_final_summary_context_tokens - heading_tokens) for inference_result in raw_inference_results]
+        groups = group_for_reduction(raw_inference_results, fan_in, max_final_summary_context_tokens, heading_tokens)
+        if len(groups) == len(raw_inference_results):
+            logger.warning("No two summaries fit the final summary context together, %d tokens left.", raw_inference_results_len)
+            break
+        depth += 1
+        resummary_counter += 1
+        logger.info("Reducing %d summaries of %d tokens into %d groups...", len(raw_inference_results), raw_inference_results_len, len(groups))
+        context.report_chunks_started(resummary_counter, len(groups))
+
+        group_summaries = map_in_order(
+            lambda numbered_group: reduce_group(numbered_group[1], chains, numbered_group[0] + 1, len(groups), resummary_counter, logger, context),
+            enumerate(groups),
+            getattr(chains, 'size', 1)
+        )
+        response_data['results'].append([])
+        raw_inference_results = []
+        for i, group_summary in enumerate(group_summaries):
+            group_summary['id'] = build_summary_id(resummary_counter, i + 1)
+            total_inference_time += group_summary['inference_time']
+            response_data['results'][resummary_counter].append(group_summary)
+            raw_inference_results.append(tokenize_text(tokenizer, group_summary['response']))
+        raw_inference_results_len = count_context_tokens(tokenizer, raw_inference_results)
+        assembled_summaries.append(write_summary_string_from_raw_inference_results(raw_inference_results))
+        inference_methods.append("tree-reduce")
+        resummarized = True
+    if raw_inference_results_len > max_final_summary_context_tokens:
+        logger.warning("Truncating %d summaries of %d tokens to fit the final summary context.", len(raw_inference_results), raw_inference_results_len)
+        raw_inference_results = fit_to_context(tokenizer, raw_inference_results, max_final_summary_context_tokens)
+    return inference_methods, assembled_summaries, raw_inference_results, response_data, resummary_counter, total_inference_time, resummarized, False
+
+def group_for_reduction(raw_inference_results, fan_in, max_group_tokens, heading_tokens=0):
+    """Groups consecutive summaries to be merged by a level of the tree strategy.
+
+    Args:
+        raw_inference_results (list): The raw inference results, as TokenizedText.
+        fan_in (int): The maximum number of summaries in a group, at least 2.
+        max_group_tokens (int): The maximum total token length of a group.
+        heading_tokens (int): The tokens of the heading written before each summary of a group.
+
+    Returns:
+        list: The groups, each a list of raw inference results.
+    """
+    fan_in = max(fan_in, 2)
+    groups, group, group_tokens = [], [], 0
+    for inference_result in raw_inference_results:
+        result_tokens = len(inference_result) + heading_tokens
+        if group and (len(group) >= fan_in or group_tokens + result_tokens > max_group_tokens):
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(inference_result)
+        group_tokens += result_tokens
+    if group:
+        groups.append(group)
+    return groups
+
+def reduce_group(group, chains, cur_group_no, total_group_no, resummary_counter, logger, context=None):
+    """Merges a group of consecutive summaries into a single summary.
+
+    Args:
+        group (list): The raw inference results to merge.
+        chains (dict): The chains to use.
+        cur_group_no (int): The current group number.
+        total_group_no (int): The total number of groups.
+        resummary_counter (int): The resummary counter.
+        logger (Logger): The logger.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
+
+    Returns:
+        dict: The response data.
+    """
+    if context is None:
+        context = PipelineContext()
+    logger.info("Reducing Group %d.%d/%d.%d...", resummary_counter, cur_group_no, resummary_counter, total_group_no)
+    inference_start = cur_timestamp()
+    group_response, cached, timings = context.invoke(chains, 'summarize_final', {
+        "date": datetime.today().strftime("%Y-%m-%d"),
+        "summary": write_context_from_raw_inference_results(group)
+    })
+    inference_time = time_since(inference_start)
+    formatted_response = group_response.strip()
+    logger.info("Reduced Group %d.%d into: %s", resummary_counter, cur_group_no, formatted_response)
+    context.report_chunk_completed(cur_group_no)
+    return {
+        "inference_time": inference_time,
+        "response": formatted_response,
+        "cached": cached,
+        "timings": timings
+    }
+
+def summarize_chunks(chunks, chains, resummary_counter, mode, logger, context=None):
+    """Summarizes each of a list of chunks.
+
+    In refine mode, chunks are summarized one after another with each summary passed on as the prior
+    summary of the next chunk. In map-reduce mode, chunks are summarized independently, concurrently
+    across the workers of the chain pool.
+
+    Args:
+        chunks (list): The chunks to summarize.
+        chains (dict): The chains to use.
+        resummary_counter (int): The resummary counter.
+        mode (str): The chunk summarization mode, one of SUMMARY_MODES.
+        logger (Logger): The logger.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
+
+    Returns:
+        list: The chunk summaries, in chunk order.
+    """
+    if context is None:
+        context = PipelineContext()
+    num_chunks = len(chunks)
+    context.report_chunks_started(resummary_counter, num_chunks)
+    if mode == SUMMARY_MODE_MAP_REDUCE:
+        chunk_summaries = map_in_order(
+            lambda numbered_chunk: summarize_chunk(numbered_chunk[1], chains, "", numbered_chunk[0] + 1, num_chunks, resummary_counter, logger, context),
+            enumerate(chunks),
+            get_chain_workers(chains, mode)
+        )
+    else:
+        chunk_summaries, prior_summary = [], ""
+        for i, chunk in enumerate(chunks):
+            chunk_summary = summarize_chunk(chunk, chains, prior_summary, i + 1, num_chunks, resummary_counter, logger, context)
+            chunk_summaries.append(chunk_summary)
+            prior_summary = chunk_summary['response']
+
+    for i, chunk_summary in enumerate(chunk_summaries):
+        chunk_summary['id'] = build_summary_id(resummary_counter, i + 1)
+    return chunk_summaries
+
+def get_chain_workers(chains, mode):
+    """Gets the number of LLM calls that may run concurrently on the chains in a mode.
+
+    Args:
+        chains (dict): The chains to use, or a ChainPool of them.
+        mode (str): The chunk summarization mode, one of SUMMARY_MODES.
+
+    Returns:
+        int: The number of concurrent LLM calls.
+    """
+    if mode != SUMMARY_MODE_MAP_REDUCE:
+        return 1
+    return getattr(chains, 'size', 1)
+
+def summarize_chunk(chunk, chains, prior_summary, cur_chunk_no, total_chunk_no, resummary_counter, logger, context=None):
     """Summarizes a single chunk.
     
     Args:
@@ -213,14 +460,16 @@ def summarize_chunk(chunk, chains, prior_summary, cur_chunk_no, total_chunk_no,
         total_chunk_no (int): The total number of chunks.
         resummary_counter (int): The resummary counter.
         logger (Logger): The logger.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
     
     Returns:
         dict: The response data.
     """
-    chain = chains['summarize_chunk']
+    if context is None:
+        context = PipelineContext()
     logger.info("Summarizing Chunk %d.%d/%d.%d...", resummary_counter, cur_chunk_no, resummary_counter, total_chunk_no)
     inference_start = cur_timestamp()
-    chunk_response = chain.invoke({
+    chunk_response, cached, timings = context.invoke(chains, 'summarize_chunk', {
         "date": datetime.today().strftime("%Y-%m-%d"),
         "chunk": chunk,
         "prior_summary": prior_summary,
@@ -230,70 +479,84 @@ def summarize_chunk(chunk, chains, prior_summary, cur_chunk_no, total_chunk_no,
     inference_time = time_since(inference_start)
     formatted_response = chunk_response.strip()
     logger.info("Summarized Chunk %d.%d into: %s", resummary_counter, cur_chunk_no, formatted_response)
+    context.report_chunk_completed(cur_chunk_no)
     return {
         "inference_time": inference_time,
-        "response": formatted_response
+        "response": formatted_response,
+        "cached": cached,
+        "timings": timings
     }
 
-def compress_result(raw_inference_result, chains, logger):
+def compress_result(raw_inference_result, chains, logger, context=None):
     """Compresses a slightly-oversized context.
 
     Args:
         raw_inference_result (str): The raw inference result.
         chains (dict): The chains to use.
         logger (Logger): The logger.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
 
     Returns:
         dict: The response data.
     """
-    compression_chain = chains['compress']
+    if context is None:
+        context = PipelineContext()
     logger.info("Compressing result: %s...", raw_inference_result)
     logger.info("Querying LLM for compression...")
     inference_start = cur_timestamp()
-    compressed_version = compression_chain.invoke({
+    compressed_version, cached, timings = context.invoke(chains, 'compress', {
         "date": datetime.today().strftime("%Y-%m-%d"),
         "original": raw_inference_result
     })
     inference_time = time_since(inference_start)
     logger.info("Compressed to: %s...", compressed_version)
+    context.report_chunk_completed()
     return {
         "inference_time": inference_time,
-        "response": compressed_version.strip()
+        "response": compressed_version.strip(),
+        "cached": cached,
+        "timings": timings
     }
 
 
-def summarize_final(raw_inference_results, chains, logger):
+def summarize_final(raw_inference_results, chains, logger, context=None):
     """Summarizes the final document from the section summaries.
 
     Args:
-        raw_inference_results (list): The raw inference results.
+        raw_inference_results (list): The raw inference results, as strings or TokenizedText.
         chains (dict): The chains to use.
         logger (Logger): The logger.
+        context (PipelineContext): The context to report progress to and make LLM calls through.
     
     Returns:
         dict: The response data.
     """
-    final_chain = chains['summarize_final']
+    if context is None:
+        context = PipelineContext()
     full_summary_string = write_context_from_raw_inference_results(raw_inference_results)
 
     logger.info("Finalizing Summary from section summaries %s...", full_summary_string)
+    context.report("finalizing")
     inference_start = cur_timestamp()
-    final_response = final_chain.invoke({
+    final_response, cached, timings = context.invoke(chains, 'summarize_final', {
         "date": datetime.today().strftime("%Y-%m-%d"),
         "summary": full_summary_string
-    })
+    }, stream=True)
     inference_time = time_since(inference_start)
     logger.info("Responding with %s...", final_response)
     return {
         "inference_time": inference_time,
-        "response": final_response.strip()
+        "response": final_response.strip(),
+        "cached": cached,
+        "timings": timings
     }
 
-def update_response_data(response_data, chunk_id, inference_time, response_text):
+def update_response_data(response_data, chunk_id, inference_time, response_text, timings=None):
     response_data['results'].append({
         "id": chunk_id,
         "inference_time": inference_time,
-        "response": response_text
+        "response": response_text,
+        "timings": timings
     })
     response_data['summaries'] = []
     response_data['summaries'].append({
@@ -328,15 +591,63 @@ def finalize_response_data(response_data, assembled_summaries, final_summary, to
 
     return response_data
 
+def count_heading_tokens(tokenizer, num_results):
+    """Counts the tokens of the widest heading written before a summary in a context of num_results summaries.
+
+    Args:
+        tokenizer (Tokenizer): The tokenizer to use.
+        num_results (int): The number of summaries in the context.
+
+    Returns:
+        int: The number of tokens.
+    """
+    return len(tokenize_offsets(tokenizer, write_context_heading(num_results, num_results)))
+
+def count_context_tokens(tokenizer, raw_inference_results):
+    """Counts the tokens of summaries written into a context, including their headings.
+
+    Args:
+        tokenizer (Tokenizer): The tokenizer to use.
+        raw_inference_results (list): The raw inference results, as TokenizedText.
+
+    Returns:
+        int: The number of tokens.
+    """
+    return count_tokens(raw_inference_results) + len(raw_inference_results) * count_heading_tokens(tokenizer, len(raw_inference_results))
+
+def fit_to_context(tokenizer, raw_inference_results, max_context_tokens):
+    """Truncates the longest summaries until the summaries fit a context together, with their headings.
+
+    Args:
+        tokenizer (Tokenizer): The tokenizer to use.
+        raw_inference_results (list): The raw inference results, as TokenizedText.
+        max_context_tokens (int): The maximum token length of the context.
+
+    Returns:
+        list: The raw inference results, the longest truncated to an equal share of the context.
+    """
+    num_results = len(raw_inference_results)
+    remaining = max_context_tokens - num_results * count_heading_tokens(tokenizer, num_results)
+    lengths = sorted(len(inference_result) for inference_result in raw_inference_results)
+    for i, length in enumerate(lengths):
+        share = remaining // (num_results - i)
+        if length > share:
+            return [truncate_tokenized(inference_result, share) for inference_result in raw_inference_results]
+        remaining -= length
+    return raw_inference_results
+
+def write_context_heading(cur_result_no, num_results):
+    return f"\n\nChunk ({cur_result_no} of {num_results}):\n"
+
 def write_context_from_raw_inference_results(raw_inference_results):
     summary_string = ""
     num_results = len(raw_inference_results)
     for i, inference_result in enumerate(raw_inference_results):
-        summary_string += f"\n\nChunk ({i + 1} of {num_results}):\n{inference_result}"
+        summary_string += f"{write_context_heading(i + 1, num_results)}{inference_result}"
     return summary_string
 
 def write_summary_string_from_raw_inference_results(raw_inference_results):
-    return "\n\n".join(raw_inference_results)
+    return "\n\n".join(str(inference_result) for inference_result in raw_inference_results)
 
 def empty_response() -> dict:
     """Returns an empty response."""
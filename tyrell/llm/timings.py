@@ -0,0 +1,124 @@
+"""Provides the accounting of tokens and time spent by each LLM call."""
+import llama_cpp
+
+from langchain_community.llms import LlamaCpp
+
+USAGE_FIELDS = ('calls', 'prompt_tokens', 'generated_tokens', 'prompt_eval_time', 'generation_time', 'total_time')
+
+def reset_llama_timings(llm: LlamaCpp) -> None:
+    """Resets the llama.cpp performance counters of an LLM, ahead of a call to measure.
+
+    LLMs on remote endpoints forget the timings their endpoint reported for the previous call.
+
+    Args:
+        llm (LlamaCpp): The LLM.
+    """
+    ctx = get_llama_context(llm)
+    if ctx is not None:
+        llama_cpp.llama_perf_context_reset(ctx)
+    elif hasattr(llm, 'reset_call_timings'):
+        llm.reset_call_timings()
+
+def read_llama_timings(llm: LlamaCpp) -> dict:
+    """Reads the llama.cpp performance counters of an LLM since they were last reset.
+
+    LLMs on remote endpoints report the timings their endpoint returned for the last call instead.
+
+    Args:
+        llm (LlamaCpp): The LLM.
+
+    Returns:
+        dict: The prompt tokens evaluated, tokens generated, and seconds spent on each, or None if they are not available.
+    """
+    ctx = get_llama_context(llm)
+    if ctx is None:
+        if hasattr(llm, 'read_call_timings'):
+            return llm.read_call_timings()
+        return None
+    perf = llama_cpp.llama_perf_context(ctx)
+    return {
+        'prompt_tokens': perf.n_p_eval,
+        'generated_tokens': perf.n_eval,
+        'prompt_eval_time': perf.t_p_eval_ms / 1000,
+        'generation_time': perf.t_eval_ms / 1000,
+    }
+
+def get_llama_context(llm: LlamaCpp):
+    """Gets the llama.cpp context of an LLM.
+
+    Args:
+        llm (LlamaCpp): The LLM.
+
+    Returns:
+        llama_context_p: The llama.cpp context, or None if the LLM is not backed by llama.cpp.
+    """
+    client = getattr(llm, 'client', None)
+    internal_context = getattr(client, '_ctx', None)
+    return getattr(internal_context, 'ctx', None)
+
+def build_call_timings(llama_timings: dict, total_time: float, generated_pieces: int) -> dict:
+    """Builds the token and time accounting of an LLM call.
+
+    Prompt tokens count only those evaluated by the call, excluding any prefix reused from the
+    previous call on the same worker. Without llama.cpp timings, generated tokens are estimated
+    from the number of streamed pieces and prompt tokens are unknown.
+
+    Args:
+        llama_timings (dict): The llama.cpp timings of the call, if available.
+        total_time (float): The wall-clock time of the call.
+        generated_pieces (int): The number of streamed pieces of the response.
+
+    Returns:
+        dict: The call timings.
+    """
+    if llama_timings is None:
+        llama_timings = {
+            'prompt_tokens': None,
+            'generated_tokens': generated_pieces,
+            'prompt_eval_time': None,
+            'generation_time': None,
+        }
+    timings = dict(llama_timings, total_time=total_time)
+    return add_token_rates(timings)
+
+def add_token_rates(timings: dict) -> dict:
+    """Adds the derived tokens per second to call or roll-up timings.
+
+    Args:
+        timings (dict): The timings.
+
+    Returns:
+        dict: The timings, with prompt_tokens_per_second and generated_tokens_per_second.
+    """
+    timings['prompt_tokens_per_second'] = rate(timings['prompt_tokens'], timings['prompt_eval_time'])
+    timings['generated_tokens_per_second'] = rate(timings['generated_tokens'], timings['generation_time'] or timings['total_time'])
+    return timings
+
+def rate(tokens: int, seconds: float) -> float:
+    """Divides tokens by seconds, if both are known.
+
+    Args:
+        tokens (int): The number of tokens.
+        seconds (float): The number of seconds.
+
+    Returns:
+        float: The tokens per second, or None if unknown.
+    """
+    if tokens is None or not seconds:
+        return None
+    return tokens / seconds
+
+def empty_usage() -> dict:
+    """Returns an empty roll-up of LLM call timings."""
+    return {field: 0 for field in USAGE_FIELDS}
+
+def add_call_to_usage(usage: dict, timings: dict) -> None:
+    """Adds the timings of an LLM call to a roll-up.
+
+    Args:
+        usage (dict): The roll-up.
+        timings (dict): The call timings.
+    """
+    usage['calls'] += 1
+    for field in USAGE_FIELDS[1:]:
+        usage[field] += timings[field] or 0
@@ -0,0 +1,122 @@
+"""Provides a pool of summarizer chain sets backed by separate LLM workers."""
+import queue
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+from .prefix import PrefixCache
+from .timings import read_llama_timings, reset_llama_timings
+
+class ChainPool:
+    """Hands out summarizer chain sets, each built on its own LLM worker, one borrower at a time.
+
+    The pool can be used in place of a single chains dictionary: pool['summarize_chunk'].invoke(...)
+    borrows a free worker for the duration of the call.
+
+    Args:
+        chain_sets (list): The chain sets, one per LLM worker.
+        llms (list): The LLM worker each chain set was built on, if known.
+        prefix_cache (PrefixCache): The cache of evaluated prompt prefixes to restore ahead of calls, if any.
+
+    Attributes:
+        prefix_cache (PrefixCache): The cache of evaluated prompt prefixes, if any.
+        size (int): The number of workers in the pool.
+    """
+
+    def __init__(self, chain_sets: list, llms: list=None, prefix_cache: PrefixCache=None) -> None:
+        self.prefix_cache = prefix_cache
+        self.size = len(chain_sets)
+        self._chain_sets = chain_sets
+        self._free = queue.Queue()
+        self._llms = llms if llms is not None else [None] * len(chain_sets)
+        for worker in range(len(chain_sets)):
+            self._free.put(worker)
+
+    def __getitem__(self, name: str) -> 'PooledChain':
+        return PooledChain(self, name)
+
+    @contextmanager
+    def borrow(self):
+        """Borrows a chain set, waiting until a worker is free.
+
+        Yields:
+            dict: The chain set.
+        """
+        with self.borrow_worker() as (chains, _):
+            yield chains
+
+    @contextmanager
+    def borrow_worker(self):
+        """Borrows a chain set along with the LLM worker it was built on, waiting until a worker is free.
+
+        Yields:
+            tuple: The chain set, and its LLM worker if known.
+        """
+        worker = self._free.get()
+        try:
+            yield self._chain_sets[worker], self._llms[worker]
+        finally:
+            self._free.put(worker)
+
+class PooledChain:
+    """A chain that runs on whichever worker of its pool is free.
+
+    Args:
+        pool (ChainPool): The pool to borrow workers from.
+        name (str): The name of the chain.
+
+    Attributes:
+        timings (dict): The llama.cpp timings of the last completed stream, if the worker reported them.
+    """
+
+    def __init__(self, pool: ChainPool, name: str) -> None:
+        self.name = name
+        self.pool = pool
+        self.timings = None
+
+    def invoke(self, inputs: dict, **kwargs) -> str:
+        """Invokes the chain on a free worker.
+
+        Args:
+            inputs (dict): The prompt inputs.
+
+        Returns:
+            str: The LLM response.
+        """
+        with self.pool.borrow() as chains:
+            return chains[self.name].invoke(inputs, **kwargs)
+
+    def stream(self, inputs: dict, **kwargs) -> Iterator[str]:
+        """Streams the chain output from a free worker, holding the worker until the output is exhausted.
+
+        Args:
+            inputs (dict): The prompt inputs.
+
+        Yields:
+            str: The generated text, piece by piece.
+        """
+        with self.pool.borrow_worker() as (chains, llm):
+            if llm is not None:
+                reset_llama_timings(llm)
+                if self.pool.prefix_cache is not None:
+                    self.pool.prefix_cache.prepare(llm, self.name)
+            yield from chains[self.name].stream(inputs, **kwargs)
+            if llm is not None:
+                self.timings = read_llama_timings(llm)
+
+def map_in_order(func: Callable, items: Iterable, workers: int) -> list:
+    """Applies a function to each item on up to workers threads, returning results in item order.
+
+    Args:
+        func (Callable): The function to apply.
+        items (Iterable): The items.
+        workers (int): The maximum number of concurrent calls.
+
+    Returns:
+        list: The results, in the order of the items.
+    """
+    if workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tyrell-worker') as executor:
+        return list(executor.map(func, items))